@@ -13,46 +13,118 @@ design of experiments (DOE), or statistical design of experiments
 # Standard Imports
 import os
 import sys
+import time
+import importlib
 
 # -----------------------------------------------------------------------------
 # Third Party Imports
 
 # -----------------------------------------------------------------------------
 # Module Constants
-VERBOSE_IMPORT = True
-TIMED_IMPORT = True
+VERBOSE_IMPORT = os.environ.get("EXPERIMENTAL_DESIGN_VERBOSE_IMPORT", "") not in ("", "0")
+"Constant that determines if import statements are echoed to output, set by EXPERIMENTAL_DESIGN_VERBOSE_IMPORT=1"
+TIMED_IMPORT = os.environ.get("EXPERIMENTAL_DESIGN_TIMED_IMPORT", "") not in ("", "0")
+"Constant that determines if module import times are recorded in IMPORT_TIMES, set by EXPERIMENTAL_DESIGN_TIMED_IMPORT=1"
 __version__ = "0.0.3"
-"Constant that determines if import statements are echoed to output"
 # The new module load scheme can be for module in DE_API_MODULES.keys()
 # -----------------------------------------------------------------------------
-DE_API_MODULES = {"experimental_design.experimental_designs":True}
+DE_API_MODULES = {"experimental_design.experimental_designs":True,
+                  "experimental_design.columnar_designs":True,
+                  "experimental_design.design_constraints":True,
+                  "experimental_design.fractional_factorials":True,
+                  "experimental_design.optimal_designs":True,
+                  "experimental_design.run_sheet_io":True,
+                  "experimental_design.run_ordering":True,
+                  "experimental_design.benchmarks":True,
+                  "experimental_design.design_planning":True,
+                  "experimental_design.sharded_generation":True,
+                  "experimental_design.design_cache":True,
+                  "experimental_design.effect_analysis":True,
+                  "experimental_design.space_filling_designs":True,
+                  "experimental_design.design_augmentation":True}
 "Dictionary that controls the definition of the API, this can be set to leave out any unwanted modules. Also it is" \
     "possible to discover all modules by DE_API_MODULES.keys()"
+IMPORT_TIMES = {}
+"Dictionary {module_name: seconds} of the time each API module took to import, filled in when TIMED_IMPORT is True"
+IMPORT_ERRORS = {}
+"Dictionary {module_name: exception} of the API modules that failed to import"
 
-# This makes sure this file is the one loaded
-sys.path.append(os.path.dirname(__file__))
-# To tune the imported API change the DE_API_MODULES dictionary
-if TIMED_IMPORT:
-    import datetime
-
-    first_timer = datetime.datetime.now(datetime.timezone.utc)
-    start_timer = datetime.datetime.now(datetime.timezone.utc)
-for module in sorted(DE_API_MODULES.keys()):
+# -----------------------------------------------------------------------------
+# Module Functions
+def _import_api_module(module):
+    """Imports one module of the API, recording its import time or its import error, and returns it or None"""
+    if module in sys.modules:
+        return sys.modules[module]
+    if module in IMPORT_ERRORS:
+        return None
+    if VERBOSE_IMPORT:
+        print(("Importing {0}".format(module)))
+    start_timer = time.perf_counter()
     try:
-        if DE_API_MODULES[module]:
-            if VERBOSE_IMPORT:
-                print(("Importing {0}".format(module)))
-            exec('from {0} import *'.format(module))
-            if TIMED_IMPORT:
-                end_timer = datetime.datetime.now(datetime.timezone.utc)
-                time_difference = end_timer - start_timer
-                print(("It took {0} s to import {1}".format(time_difference.total_seconds(), module)))
-                start_timer = end_timer
+        api_module = importlib.import_module(module)
     except Exception as e:
-        print(f"The {module} failed to import")
-        print(e)
-        
-if TIMED_IMPORT:
-    end_timer = datetime.datetime.now(datetime.timezone.utc)
-    time_difference = end_timer - first_timer
-    print(("It took {0} s to import all of the active modules".format(time_difference.total_seconds())))
+        IMPORT_ERRORS[module] = e
+        if VERBOSE_IMPORT:
+            print(f"The {module} failed to import")
+            print(e)
+        return None
+    if TIMED_IMPORT:
+        IMPORT_TIMES[module] = time.perf_counter() - start_timer
+        if VERBOSE_IMPORT:
+            print(("It took {0} s to import {1}".format(IMPORT_TIMES[module], module)))
+    return api_module
+
+
+def _public_names(api_module):
+    """Returns the names that from api_module import * would import"""
+    if hasattr(api_module, "__all__"):
+        return list(api_module.__all__)
+    return [name for name in vars(api_module) if not name.startswith("_")]
+
+
+def load_api():
+    """Imports every active module in DE_API_MODULES and returns the list of public names, this is what
+    from experimental_design import * and dir(experimental_design) use"""
+    names = []
+    for module in DE_API_MODULES.keys():
+        if DE_API_MODULES[module]:
+            api_module = _import_api_module(module)
+            if api_module is not None:
+                for name in _public_names(api_module):
+                    globals().setdefault(name, getattr(api_module, name))
+                    names.append(name)
+    return sorted(set(names))
+
+
+def import_times():
+    """Returns a copy of IMPORT_TIMES, which is empty unless EXPERIMENTAL_DESIGN_TIMED_IMPORT=1 was set before the
+    first import"""
+    return dict(IMPORT_TIMES)
+
+
+def __getattr__(name):
+    """Loads the API lazily (PEP 562), the first access to a name imports the active modules of DE_API_MODULES in
+    order, modules that are already imported first, until one of them defines it"""
+    if name == "__all__":
+        return load_api()
+    if name.startswith("__"):
+        raise AttributeError(name)
+    active_modules = [module for module in DE_API_MODULES.keys() if DE_API_MODULES[module]]
+    active_modules.sort(key=lambda module: module not in sys.modules)
+    for module in active_modules:
+        api_module = _import_api_module(module)
+        if api_module is not None and not name.startswith("_") and hasattr(api_module, name):
+            value = getattr(api_module, name)
+            globals()[name] = value
+            return value
+    if name in globals():
+        # importing a module of the package sets it as an attribute of the package
+        return globals()[name]
+    message = "module {0!r} has no attribute {1!r}".format(__name__, name)
+    if IMPORT_ERRORS:
+        message += ", these modules failed to import: {0}".format(", ".join(IMPORT_ERRORS.keys()))
+    raise AttributeError(message)
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(load_api()))
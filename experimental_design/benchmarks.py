@@ -0,0 +1,348 @@
+#-----------------------------------------------------------------------------
+# Name:        benchmarks
+# Purpose:    To measure the time and memory of design generation and catch regressions.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""benchmarks records the time and peak memory of fully_factorial, fully_factorial_default, the three split plot
+generators, filter_rows and create_factor_table over sweeps of the number of factors, the number of levels and the
+number of exclusions, from 10^2 to 10^7 runs. Results are written as JSON, and two result files can be compared to
+flag the cases that got slower. From the command line
+
+    python -m experimental_design.benchmarks run --output results.json --max-runs 1000000
+    python -m experimental_design.benchmarks compare baseline.json results.json
+
+compare exits with status 1 when a slowdown is found, so it can gate a build.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import gc
+import json
+import math
+import time
+import datetime
+import platform
+import argparse
+import tracemalloc
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (fully_factorial, fully_factorial_default,
+                                                      fully_factorial_split_plot, fully_factorial_split_plot_default,
+                                                      fully_factorial_split_plot_interleaved, filter_rows,
+                                                      create_factor_table)
+
+#-----------------------------------------------------------------------------
+# Module Constants
+BENCHMARK_EXPONENTS = [2, 3, 4, 5, 6, 7]
+"The sweeps target 10**exponent runs for each of these exponents"
+BENCHMARK_SWEEPS = ["factors", "levels", "exclusions"]
+"factors uses 10 levels and exponent factors, levels uses 2 factors and exclusions adds exclusions to factors"
+BENCHMARK_GENERATORS = ["fully_factorial", "fully_factorial_default", "fully_factorial_split_plot",
+                        "fully_factorial_split_plot_default", "fully_factorial_split_plot_interleaved",
+                        "filter_rows", "create_factor_table"]
+"Names of the functions that are benchmarked"
+EXCLUSION_COUNTS = [1, 10, 50]
+"Number of exclusions in the exclusions sweep, each one removes 1% of the runs"
+LIST_OUTPUT_MAX_RUNS = 10**6
+"Largest design benchmarked with the list of dictionaries output, larger lists need gigabytes"
+DEFAULT_REPEATS = 3
+"Number of timed repeats of each case, the best time is compared"
+SLOWDOWN_TOLERANCE = 0.2
+"A case is flagged when it is more than this fraction slower than the baseline"
+MINIMUM_TIME_DIFFERENCE = 1e-3
+"Slowdowns smaller than this many seconds are timer noise and are not flagged"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def benchmark_design(number_factors, number_levels, prefix="factor"):
+    """Returns a design dictionary with number_factors factors of number_levels levels each"""
+    return {"{0}_{1}".format(prefix, factor_index): {level: level * 10 for level in range(number_levels)}
+            for factor_index in range(number_factors)}
+
+
+def benchmark_exclusions(design_dictionary, number_exclusions):
+    """Returns number_exclusions exclusions on the first two factors of design_dictionary, each excludes one pair of
+    levels"""
+    factors = list(design_dictionary.keys())[0:2]
+    level_pairs = [(first, second) for first in design_dictionary[factors[0]].values()
+                   for second in design_dictionary[factors[1]].values()]
+    return [{factors[0]: first, factors[1]: second} for first, second in level_pairs[0:number_exclusions]]
+
+
+def _split_design(design_dictionary):
+    """Splits a design dictionary into whole plot and split plot dictionaries"""
+    factors = list(design_dictionary.keys())
+    number_whole_plot = max(len(factors) // 2, 1)
+    return ({factor: design_dictionary[factor] for factor in factors[0:number_whole_plot]},
+            {factor: design_dictionary[factor] for factor in factors[number_whole_plot:]})
+
+
+def _generator_case(generator, design_dictionary, exclusions, output):
+    """Returns (setup, run) for one of the generators, setup builds the inputs and is not timed"""
+    whole_plot, split_plot = _split_design(design_dictionary)
+    default = {factor: {-1: -1} for factor in design_dictionary.keys()}
+    whole_plot_default = {factor: {-1: -1} for factor in whole_plot.keys()}
+    split_plot_interleaved = {factor: {-1: -1} for factor in split_plot.keys()}
+    generators = {
+        "fully_factorial": lambda inputs: fully_factorial(design_dictionary, exclusions=exclusions, output=output),
+        "fully_factorial_default": lambda inputs: fully_factorial_default(design_dictionary, default,
+                                                                           exclusions=exclusions, output=output),
+        "fully_factorial_split_plot": lambda inputs: fully_factorial_split_plot(whole_plot, split_plot,
+                                                                                 output=output),
+        "fully_factorial_split_plot_default": lambda inputs: fully_factorial_split_plot_default(
+            whole_plot, split_plot, whole_plot_default, output=output),
+        "fully_factorial_split_plot_interleaved": lambda inputs: fully_factorial_split_plot_interleaved(
+            whole_plot, split_plot, whole_plot_default, split_plot_interleaved, output=output)}
+    if generator in generators:
+        return (lambda: None), generators[generator]
+    elif generator == "filter_rows":
+        return (lambda: fully_factorial(design_dictionary, randomized=False, output=output),
+                lambda inputs: filter_rows(inputs, exclusions))
+    elif generator == "create_factor_table":
+        if output == "dataframe":
+            return (lambda: fully_factorial(design_dictionary, randomized=False, output="design").to_dataframe(),
+                    create_factor_table)
+        return (lambda: fully_factorial(design_dictionary, randomized=False, output=output), create_factor_table)
+    raise ValueError("generator must be one of {0}, not {1!r}".format(BENCHMARK_GENERATORS, generator))
+
+
+def benchmark_cases(exponents=None, sweeps=None, generators=None, max_runs=None):
+    """Returns the list of BenchmarkCase for the exponents, sweeps and generators (all by default) with at most
+    max_runs runs. Generators are run with the list and design outputs, filter_rows gets a list or a Design and
+    create_factor_table a DataFrame or a Design."""
+    exponents = BENCHMARK_EXPONENTS if exponents is None else exponents
+    sweeps = BENCHMARK_SWEEPS if sweeps is None else sweeps
+    generators = BENCHMARK_GENERATORS if generators is None else generators
+    cases = []
+    for sweep in sweeps:
+        for exponent in exponents:
+            if sweep == "levels":
+                number_factors, number_levels = 2, int(round(10 ** (exponent / 2.0)))
+            else:
+                number_factors, number_levels = exponent, 10
+            exclusion_counts = EXCLUSION_COUNTS if sweep == "exclusions" else [0]
+            number_runs = number_levels ** number_factors
+            if max_runs is not None and number_runs > max_runs:
+                continue
+            for number_exclusions in exclusion_counts:
+                for generator in generators:
+                    if number_exclusions and generator not in ["fully_factorial", "fully_factorial_default",
+                                                               "filter_rows"]:
+                        continue
+                    if generator == "filter_rows" and not number_exclusions and sweep != "exclusions":
+                        # filter_rows without exclusions only copies, it is measured with one exclusion
+                        number_case_exclusions = 1
+                    else:
+                        number_case_exclusions = number_exclusions
+                    outputs = ["dataframe", "design"] if generator == "create_factor_table" else ["list", "design"]
+                    for output in outputs:
+                        if output in ["list", "dataframe"] and number_runs > LIST_OUTPUT_MAX_RUNS:
+                            continue
+                        cases.append(BenchmarkCase(generator, sweep, number_factors, number_levels,
+                                                   number_case_exclusions, output))
+    return cases
+
+
+def run_benchmarks(cases=None, repeats=DEFAULT_REPEATS, measure_memory=True, callback=None):
+    """Runs the cases (benchmark_cases() by default) and returns the results dictionary that write_benchmarks
+    saves. callback(case, result) is called after each case, the command line uses it to print progress."""
+    cases = benchmark_cases() if cases is None else cases
+    results = []
+    for case in cases:
+        result = case.run(repeats=repeats, measure_memory=measure_memory)
+        results.append(result)
+        if callback is not None:
+            callback(case, result)
+    return {"metadata": benchmark_metadata(), "results": results}
+
+
+def benchmark_metadata():
+    """Returns a dictionary describing the machine and versions the benchmarks ran with"""
+    from experimental_design import __version__
+    return {"experimental_design_version": __version__,
+            "python_version": platform.python_version(),
+            "numpy_version": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+
+
+def write_benchmarks(results, path):
+    """Writes the results of run_benchmarks to a JSON file"""
+    with open(path, "w") as json_file:
+        json.dump(results, json_file, indent=2)
+
+
+def read_benchmarks(path):
+    """Reads a JSON file written by write_benchmarks"""
+    with open(path, "r") as json_file:
+        return json.load(json_file)
+
+
+def compare_benchmarks(baseline, current, tolerance=SLOWDOWN_TOLERANCE,
+                       minimum_time_difference=MINIMUM_TIME_DIFFERENCE):
+    """Compares two benchmark results (dictionaries or paths to JSON files) case by case on the best time and
+    returns a list of comparison dictionaries. A case is a slowdown when it is more than tolerance slower and more
+    than minimum_time_difference seconds slower. Cases that are only in one of the results have status "missing"
+    or "new"."""
+    if not isinstance(baseline, dict):
+        baseline = read_benchmarks(baseline)
+    if not isinstance(current, dict):
+        current = read_benchmarks(current)
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    current_results = {result["name"]: result for result in current["results"]}
+    comparisons = []
+    for name in list(baseline_results.keys()) + [name for name in current_results if name not in baseline_results]:
+        baseline_result = baseline_results.get(name)
+        current_result = current_results.get(name)
+        comparison = {"name": name,
+                      "baseline_time": baseline_result["best_time"] if baseline_result else None,
+                      "current_time": current_result["best_time"] if current_result else None,
+                      "baseline_peak_memory": baseline_result.get("peak_memory") if baseline_result else None,
+                      "current_peak_memory": current_result.get("peak_memory") if current_result else None}
+        if baseline_result is None:
+            comparison.update({"ratio": None, "status": "new"})
+        elif current_result is None:
+            comparison.update({"ratio": None, "status": "missing"})
+        else:
+            ratio = comparison["current_time"] / max(comparison["baseline_time"], 1e-12)
+            slower = comparison["current_time"] - comparison["baseline_time"]
+            if ratio > 1 + tolerance and slower > minimum_time_difference:
+                status = "slowdown"
+            elif ratio < 1 / (1 + tolerance) and -slower > minimum_time_difference:
+                status = "speedup"
+            else:
+                status = "unchanged"
+            comparison.update({"ratio": ratio, "status": status})
+        comparisons.append(comparison)
+    return comparisons
+
+
+def _format_bytes(number_bytes):
+    """Returns number_bytes as a short human readable string"""
+    if number_bytes is None:
+        return "-"
+    for unit in ["B", "kB", "MB", "GB"]:
+        if number_bytes < 1024 or unit == "GB":
+            return "{0:.1f} {1}".format(number_bytes, unit)
+        number_bytes = number_bytes / 1024.0
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class BenchmarkCase(object):
+    """One benchmark, a generator called on a design with number_factors factors of number_levels levels and
+    number_exclusions exclusions. output is the output keyword of a generator, or the kind of input for
+    filter_rows and create_factor_table."""
+    def __init__(self, generator, sweep, number_factors, number_levels, number_exclusions=0, output="design"):
+        self.generator = generator
+        self.sweep = sweep
+        self.number_factors = number_factors
+        self.number_levels = number_levels
+        self.number_exclusions = number_exclusions
+        self.output = output
+        self.design_dictionary = benchmark_design(number_factors, number_levels)
+        self.exclusions = benchmark_exclusions(self.design_dictionary, number_exclusions) or None
+        self.name = "{0}[sweep={1},factors={2},levels={3},exclusions={4},output={5}]".format(
+            generator, sweep, number_factors, number_levels, number_exclusions, output)
+
+    @property
+    def number_runs(self):
+        """Number of runs of the fully factorial design the case starts from"""
+        return self.number_levels ** self.number_factors
+
+    def run(self, repeats=DEFAULT_REPEATS, measure_memory=True):
+        """Times repeats calls and, in one more call under tracemalloc, measures the peak memory. Returns the
+        result dictionary."""
+        setup, function = _generator_case(self.generator, self.design_dictionary, self.exclusions, self.output)
+        inputs = setup()
+        times = []
+        number_output_runs = None
+        for repeat in range(repeats):
+            gc.collect()
+            start = time.perf_counter()
+            output = function(inputs)
+            times.append(time.perf_counter() - start)
+            number_output_runs = len(output) if hasattr(output, "__len__") else None
+            del output
+        peak_memory = None
+        if measure_memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                output = function(inputs)
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                del output
+            finally:
+                tracemalloc.stop()
+        best_time = min(times)
+        return {"name": self.name,
+                "generator": self.generator,
+                "sweep": self.sweep,
+                "number_factors": self.number_factors,
+                "number_levels": self.number_levels,
+                "number_exclusions": self.number_exclusions,
+                "output": self.output,
+                "number_runs": self.number_runs,
+                "number_output_runs": number_output_runs,
+                "times": times,
+                "best_time": best_time,
+                "runs_per_second": self.number_runs / best_time if best_time > 0 else math.inf,
+                "peak_memory": peak_memory}
+
+    def __repr__(self):
+        return "BenchmarkCase({0})".format(self.name)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def benchmark_main(arguments=None):
+    """Command line entry point, see the module docstring. Returns the exit status."""
+    parser = argparse.ArgumentParser(prog="python -m experimental_design.benchmarks",
+                                     description="Benchmarks the experimental_design generators")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON result file")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write")
+    run_parser.add_argument("--max-runs", type=int, default=None, help="skip designs with more runs than this")
+    run_parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="timed repeats of each case")
+    run_parser.add_argument("--sweeps", nargs="+", choices=BENCHMARK_SWEEPS, default=None)
+    run_parser.add_argument("--generators", nargs="+", choices=BENCHMARK_GENERATORS, default=None)
+    run_parser.add_argument("--no-memory", action="store_true", help="do not measure peak memory")
+    compare_parser = commands.add_parser("compare", help="compare two JSON result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=SLOWDOWN_TOLERANCE,
+                                help="fraction slower that is flagged as a slowdown")
+    options = parser.parse_args(arguments)
+    if options.command == "run":
+        cases = benchmark_cases(sweeps=options.sweeps, generators=options.generators, max_runs=options.max_runs)
+
+        def print_progress(case, result):
+            print("{0:<110} {1:>10.4f} s {2:>10}".format(case.name, result["best_time"],
+                                                         _format_bytes(result["peak_memory"])))
+
+        results = run_benchmarks(cases, repeats=options.repeats, measure_memory=not options.no_memory,
+                                 callback=print_progress)
+        write_benchmarks(results, options.output)
+        print("Wrote {0} results to {1}".format(len(results["results"]), options.output))
+        return 0
+    comparisons = compare_benchmarks(options.baseline, options.current, tolerance=options.tolerance)
+    for comparison in comparisons:
+        if comparison["status"] in ["new", "missing"]:
+            print("{0:<110} {1}".format(comparison["name"], comparison["status"]))
+        else:
+            print("{0:<110} {1:>10.4f} s {2:>10.4f} s {3:>6.2f}x {4}".format(
+                comparison["name"], comparison["baseline_time"], comparison["current_time"], comparison["ratio"],
+                comparison["status"]))
+    slowdowns = [comparison for comparison in comparisons if comparison["status"] == "slowdown"]
+    print("{0} of {1} cases are slower than the baseline".format(len(slowdowns), len(comparisons)))
+    return 1 if slowdowns else 0
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    sys.exit(benchmark_main())
@@ -0,0 +1,291 @@
+#-----------------------------------------------------------------------------
+# Name:        columnar_designs
+# Purpose:    To store run sheets as compact integer level codes.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""columnar_designs holds the Design class, a columnar run sheet that stores one small integer code array per
+factor and a table of levels for each factor instead of a list of dictionaries. A Design exports to a pandas
+DataFrame with Categorical columns without copying the codes, and its level tables make factor tables O(factors).
+Every generator in experimental_designs returns a Design when called with output="design".
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+
+#-----------------------------------------------------------------------------
+# Module Constants
+MISSING_CODE = -1
+"Code used for a factor that is not set in a run, it becomes NaN in a DataFrame"
+ITERATION_CHUNK_SIZE = 65536
+"Number of runs decoded at a time when iterating over a Design"
+_MISSING = object()
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def code_dtype(number_levels):
+    """Returns the smallest signed integer dtype that holds number_levels codes and MISSING_CODE. Signed codes
+    are what pandas.Categorical uses, so the arrays can be handed to pandas without a copy."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if number_levels <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def level_key(value):
+    """Returns the key a level value is stored under in a level table, (type, value), so values that compare equal
+    but differ in type such as 1, 1.0 and True stay separate levels, as they are in a list of run dictionaries."""
+    return type(value), value
+
+
+def unique_levels(level_values):
+    """Given a list of level values returns (levels, code_map), where levels has the repeated values removed and
+    code_map is an integer array that maps a position in level_values to its code in levels. Values are repeated
+    when they are equal and of the same type (see level_key)."""
+    levels = []
+    level_codes = {}
+    code_map = np.empty(len(level_values), dtype=np.int64)
+    for position, value in enumerate(level_values):
+        key = level_key(value)
+        if key not in level_codes:
+            level_codes[key] = len(levels)
+            levels.append(value)
+        code_map[position] = level_codes[key]
+    return levels, code_map
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class Design(object):
+    """A columnar run sheet. codes is a dictionary {factor_name: integer array of level codes} and levels is a
+    dictionary {factor_name: list of level values}, run i has factor_name = levels[factor_name][codes[factor_name][i]].
+    A code of MISSING_CODE means the factor is not set in that run. Indexing with an integer returns the run
+    dictionary, indexing with a slice or an index array returns a new Design. number_runs is only needed for a
+    design without factors."""
+    def __init__(self, codes, levels, number_runs=None):
+        self.factors = list(levels.keys())
+        self.levels = {factor: list(levels[factor]) for factor in self.factors}
+        self.codes = {}
+        for factor in self.factors:
+            factor_codes = np.asarray(codes[factor])
+            dtype = code_dtype(len(self.levels[factor]))
+            if factor_codes.dtype != dtype:
+                factor_codes = factor_codes.astype(dtype)
+            if number_runs is None:
+                number_runs = len(factor_codes)
+            elif len(factor_codes) != number_runs:
+                raise ValueError("The code array for {0} has {1} runs, expected {2}".format(factor,
+                                                                                        len(factor_codes),
+                                                                                        number_runs))
+            self.codes[factor] = factor_codes
+        self.number_runs = number_runs or 0
+
+    @classmethod
+    def from_codes(cls, codes, level_values):
+        """Builds a Design from codes that index level_values, level_values may repeat values (two levels with
+        the same setting), which are merged into one level."""
+        design_codes = {}
+        levels = {}
+        for factor in level_values.keys():
+            levels[factor], code_map = unique_levels(list(level_values[factor]))
+            factor_codes = np.asarray(codes[factor])
+            if len(code_map) and not np.array_equal(code_map, np.arange(len(code_map))):
+                factor_codes = code_map[factor_codes]
+            design_codes[factor] = factor_codes
+        return cls(design_codes, levels, number_runs=None if levels else 1)
+
+    @classmethod
+    def from_runs(cls, runs):
+        """Builds a Design from any iterable of run dictionaries, like the list returned by fully_factorial"""
+        level_codes = {}
+        levels = {}
+        code_lists = {}
+        number_runs = 0
+        for run in runs:
+            for factor, value in run.items():
+                if factor not in level_codes:
+                    level_codes[factor] = {}
+                    levels[factor] = []
+                    code_lists[factor] = [MISSING_CODE] * number_runs
+                factor_level_codes = level_codes[factor]
+                # level_key inlined, this loop runs once per value
+                key = (type(value), value)
+                if key not in factor_level_codes:
+                    factor_level_codes[key] = len(factor_level_codes)
+                    levels[factor].append(value)
+                code_lists[factor].append(factor_level_codes[key])
+            number_runs += 1
+            for factor, code_list in code_lists.items():
+                if len(code_list) < number_runs:
+                    code_list.append(MISSING_CODE)
+        codes = {factor: np.array(code_lists[factor], dtype=code_dtype(len(level_codes[factor])))
+                 for factor in level_codes.keys()}
+        return cls(codes, levels, number_runs=number_runs)
+
+    @classmethod
+    def concatenate(cls, designs):
+        """Stacks designs one after the other. The level tables are merged and a factor that is missing from a
+        design gets MISSING_CODE for those runs."""
+        designs = list(designs)
+        levels = {}
+        level_codes = {}
+        for design in designs:
+            for factor in design.factors:
+                if factor not in levels:
+                    levels[factor] = []
+                    level_codes[factor] = {}
+                for value in design.levels[factor]:
+                    if level_key(value) not in level_codes[factor]:
+                        level_codes[factor][level_key(value)] = len(levels[factor])
+                        levels[factor].append(value)
+        codes = {}
+        for factor in levels.keys():
+            dtype = code_dtype(len(levels[factor]))
+            pieces = []
+            for design in designs:
+                if factor in design.codes:
+                    # the extra last entry maps MISSING_CODE to itself
+                    lookup = np.array([level_codes[factor][level_key(value)] for value in design.levels[factor]] +
+                                      [MISSING_CODE], dtype=dtype)
+                    pieces.append(lookup[design.codes[factor]])
+                else:
+                    pieces.append(np.full(design.number_runs, MISSING_CODE, dtype=dtype))
+            codes[factor] = np.concatenate(pieces) if pieces else np.empty(0, dtype=dtype)
+        return cls(codes, levels, number_runs=sum(design.number_runs for design in designs))
+
+    def combine_columns(self, other):
+        """Returns a Design with the columns of self updated by the columns of other, like dict.update on each
+        run. Both designs must have the same number of runs."""
+        codes = dict(self.codes)
+        levels = dict(self.levels)
+        for factor in other.factors:
+            codes[factor] = other.codes[factor]
+            levels[factor] = other.levels[factor]
+        return Design(codes, levels, number_runs=self.number_runs)
+
+    def take(self, indices):
+        """Returns a Design with the runs at indices, in that order"""
+        return Design({factor: self.codes[factor][indices] for factor in self.factors}, self.levels,
+                      number_runs=len(np.arange(self.number_runs)[indices]) if not self.factors else None)
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a Design that shares the code arrays"""
+        return self[start:stop]
+
+    def design_chunks(self, chunk_size=ITERATION_CHUNK_SIZE):
+        """Yields the design as Designs of chunk_size runs that share the code arrays"""
+        for chunk_start in range(0, self.number_runs, chunk_size):
+            yield self[chunk_start:chunk_start + chunk_size]
+
+    def run(self, index):
+        """Returns the run dictionary at index"""
+        run = {}
+        for factor in self.factors:
+            code = self.codes[factor][index]
+            if code != MISSING_CODE:
+                run[factor] = self.levels[factor][code]
+        return run
+
+    def __len__(self):
+        return self.number_runs
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += self.number_runs
+            if index < 0 or index >= self.number_runs:
+                raise IndexError("design index out of range")
+            return self.run(index)
+        elif isinstance(index, slice):
+            return Design({factor: self.codes[factor][index] for factor in self.factors}, self.levels,
+                          number_runs=len(range(self.number_runs)[index]))
+        return self.take(np.asarray(index))
+
+    def __iter__(self):
+        if not self.factors:
+            for index in range(self.number_runs):
+                yield {}
+            return
+        for chunk_start in range(0, self.number_runs, ITERATION_CHUNK_SIZE):
+            chunk_stop = min(chunk_start + ITERATION_CHUNK_SIZE, self.number_runs)
+            value_columns = []
+            for factor in self.factors:
+                # the appended _MISSING is what a code of -1 selects
+                level_values = self.levels[factor] + [_MISSING]
+                value_columns.append([level_values[code]
+                                      for code in self.codes[factor][chunk_start:chunk_stop].tolist()])
+            for values in zip(*value_columns):
+                yield {factor: value for factor, value in zip(self.factors, values) if value is not _MISSING}
+
+    def to_list(self):
+        """Returns the run sheet as a list of dictionaries"""
+        return list(self)
+
+    def to_dataframe(self):
+        """Returns a pandas DataFrame with a Categorical column for each factor. The Categorical holds the code
+        array of the Design without a copy (dataframe[factor].array.codes, .cat.codes returns a copy). pandas
+        categories must be unique, so a factor with levels that are equal but of different types, such as 1, 1.0
+        and True, becomes an object column of the level values instead."""
+        import pandas as pd
+        columns = {}
+        for factor in self.factors:
+            categories = pd.Index(self.levels[factor], dtype=object, tupleize_cols=False)
+            if categories.is_unique:
+                columns[factor] = pd.Categorical.from_codes(self.codes[factor], categories=categories)
+            else:
+                # the last entry is what a code of MISSING_CODE selects
+                level_values = np.empty(len(self.levels[factor]) + 1, dtype=object)
+                for code, value in enumerate(self.levels[factor] + [np.nan]):
+                    level_values[code] = value
+                columns[factor] = level_values[self.codes[factor]]
+        return pd.DataFrame(columns, copy=False)
+
+    def code_matrix(self, dtype=None):
+        """Returns the codes as a (number_runs, number_factors) array, the columns in the order of factors"""
+        if dtype is None:
+            dtype = np.result_type(*[self.codes[factor].dtype for factor in self.factors]) if self.factors else np.int8
+        matrix = np.empty((self.number_runs, len(self.factors)), dtype=dtype)
+        for factor_index, factor in enumerate(self.factors):
+            matrix[:, factor_index] = self.codes[factor]
+        return matrix
+
+    def factor_table(self):
+        """Returns {factor_name: list of levels}, read from the level tables in O(factors) time"""
+        return {factor: list(self.levels[factor]) for factor in self.factors}
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the code arrays"""
+        return sum(self.codes[factor].nbytes for factor in self.factors)
+
+    def __repr__(self):
+        return "Design(number_runs={0}, factors={1})".format(self.number_runs, self.factors)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_Design():
+    """Tests the Design class built from fully_factorial_default"""
+    from experimental_design.experimental_designs import fully_factorial_default, fully_factorial
+    test_design = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}, 'two': {0: 'FAST', 1: 'SLOW'}, 'three': {0: 'ON'}}
+    default = {'one': {-1: 'default'}, 'two': {-1: 'MEDIUM'}, 'three': {-1: 'OFF'}}
+    print("*"*80)
+    print("Testing the Design class")
+    design = fully_factorial_default(test_design, default, randomized=True, output="design")
+    print(f"The design is {design} and uses {design.nbytes} bytes of codes")
+    print(f"The factor table is {design.factor_table()}")
+    print("The design as a DataFrame is:")
+    print(design.to_dataframe())
+    print(f"The design matches the list output: {design.to_list() == fully_factorial_default(test_design, default)}")
+    mixed_design = fully_factorial({'a': {0: 1, 1: 1.0, 2: True}}, randomized=False, output="design")
+    print(f"Levels 1, 1.0 and True stay apart in a DataFrame: {mixed_design.to_dataframe()['a'].tolist()}")
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_Design()
@@ -0,0 +1,286 @@
+#-----------------------------------------------------------------------------
+# Name:        design_augmentation
+# Purpose:    To add runs to a design that has already been run without regenerating it.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""design_augmentation makes only the runs that a change to a design adds, the delta, so the runs that have
+already been executed stay as they are. augmentation_runs gives the runs of a full factorial with new levels or new
+factors that the old full factorial does not have, foldover_runs mirrors the levels of two level factors of an
+executed run sheet and replicate_runs repeats a design or a run sheet. The delta is a lazy AugmentationView that
+decodes its runs from blocks of level combinations, so its cost only depends on the number of new runs, and it is
+randomized on its own with a seeded order. augmented_run_sheet puts the executed runs and the delta together.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import math
+import itertools
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (FullyFactorialView, DesignView, SeededPermutation,
+                                                      RANDOM_SEED, _design_output)
+from experimental_design.columnar_designs import Design, level_key
+from experimental_design.effect_analysis import merge_design_dictionaries, run_design, level_positions
+
+#-----------------------------------------------------------------------------
+# Module Constants
+REPLICATE_FACTOR = "replicate"
+"Default name of the factor that numbers the replicates of replicate_runs"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def _level_names(design_dictionary, factor, run_values="values"):
+    """Returns the list of levels of factor as they appear in a run, its keys or its values"""
+    if run_values not in ("keys", "values"):
+        raise ValueError("run_values must be 'keys' or 'values', not {0!r}".format(run_values))
+    return list(design_dictionary[factor].__getattribute__(run_values)())
+
+
+def delta_blocks(design_dictionary, augmented_design_dictionary, existing_levels=None, run_values="values"):
+    """Returns the blocks of the runs of the full factorial of augmented_design_dictionary that are not runs of the
+    full factorial of design_dictionary. A block is a list with the array of level positions (in
+    augmented_design_dictionary) each factor takes, the block has every combination of them and the blocks do not
+    overlap. A factor of augmented_design_dictionary that design_dictionary does not have was at one level in the
+    executed runs, existing_levels is {factor: level} and the first level is used for a factor it does not give."""
+    design_dictionary = merge_design_dictionaries(design_dictionary)
+    augmented_design_dictionary = merge_design_dictionaries(augmented_design_dictionary)
+    existing_levels = existing_levels or {}
+    removed_factors = [factor for factor in design_dictionary.keys() if factor not in augmented_design_dictionary]
+    if removed_factors:
+        raise ValueError("The factors {0} are not in augmented_design_dictionary".format(removed_factors))
+    old_positions = []
+    new_positions = []
+    for factor in augmented_design_dictionary.keys():
+        level_names = _level_names(augmented_design_dictionary, factor, run_values)
+        if factor in design_dictionary:
+            old_levels = _level_names(design_dictionary, factor, run_values)
+        else:
+            old_levels = [existing_levels.get(factor, level_names[0] if level_names else None)]
+        level_keys = {level_key(level) for level in level_names}
+        old_keys = {level_key(level) for level in old_levels}
+        missing_levels = [level for level in old_levels if level_key(level) not in level_keys]
+        if missing_levels:
+            raise ValueError("The levels {0} of {1} are not in augmented_design_dictionary".format(missing_levels,
+                                                                                                 factor))
+        is_old = np.array([level_key(level) in old_keys for level in level_names], dtype=bool)
+        old_positions.append(np.flatnonzero(is_old))
+        new_positions.append(np.flatnonzero(~is_old))
+    all_positions = [np.arange(len(old) + len(new), dtype=np.int64)
+                     for old, new in zip(old_positions, new_positions)]
+    # block i has the new levels of the i-th changed factor and only the old levels of the changed factors before it
+    blocks = []
+    changed = [factor_index for factor_index, new in enumerate(new_positions) if len(new)]
+    for block_number, factor_index in enumerate(changed):
+        block = list(all_positions)
+        for earlier_index in changed[:block_number]:
+            block[earlier_index] = old_positions[earlier_index]
+        block[factor_index] = new_positions[factor_index]
+        blocks.append(block)
+    return blocks
+
+
+def augmentation_runs(design_dictionary, augmented_design_dictionary, existing_levels=None, randomized=True,
+                      run_values="values", random_seed=RANDOM_SEED, output="list", randomization="shuffle",
+                      profiler=None):
+    """Returns the runs to add to an executed full factorial of design_dictionary so that it becomes the full
+    factorial of augmented_design_dictionary, which has new levels for some factors or new factors (see
+    delta_blocks for existing_levels). Only the new runs are made, in an order randomized with random_seed on its
+    own, the other parameters are the same as fully_factorial."""
+    augmented_design_dictionary = merge_design_dictionaries(augmented_design_dictionary)
+    blocks = delta_blocks(design_dictionary, augmented_design_dictionary, existing_levels=existing_levels,
+                          run_values=run_values)
+    delta = AugmentationView(augmented_design_dictionary, blocks=blocks, randomized=randomized,
+                             run_values=run_values, random_seed=random_seed, randomization=randomization)
+    return _design_output(delta, output, profiler)
+
+
+def executed_positions(runs, design_dictionary, run_values="values"):
+    """Returns the (number_runs, number_factors) array of level positions of the factorial runs of the run sheet
+    runs, in run order. Default runs, runs with a value that is not a level of design_dictionary and the inserted
+    runs of a lazy default view, are left out."""
+    design = run_design(runs)
+    positions = level_positions(design_dictionary, design, run_values=run_values)
+    is_default = (positions < 0).any(axis=1)
+    if hasattr(runs, "inserted_runs"):
+        is_default |= runs.inserted_runs()
+    return positions[~is_default]
+
+
+def foldover_runs(runs, design_dictionary, factors=None, randomized=True, run_values="values",
+                  random_seed=RANDOM_SEED, output="list", randomization="shuffle", profiler=None):
+    """Returns the foldover of the executed run sheet runs, every factorial run with the two levels of each of
+    factors swapped. factors is every factor by default, which separates the main effects of a resolution III
+    fractional factorial from the two factor interactions, a single factor separates that factor and its
+    interactions. The foldover is randomized with random_seed on its own, the other parameters are the same as
+    fully_factorial."""
+    design_dictionary = merge_design_dictionaries(design_dictionary)
+    factor_names = list(design_dictionary.keys())
+    if factors is None:
+        factors = factor_names
+    elif isinstance(factors, str):
+        factors = [factors]
+    code_matrix = executed_positions(runs, design_dictionary, run_values=run_values)
+    for factor in factors:
+        if factor not in design_dictionary:
+            raise ValueError("{0!r} is not a factor of design_dictionary".format(factor))
+        if len(design_dictionary[factor]) != 2:
+            raise ValueError("Only two level factors can be folded over, {0!r} has {1} levels".format(
+                factor, len(design_dictionary[factor])))
+        factor_index = factor_names.index(factor)
+        code_matrix[:, factor_index] = 1 - code_matrix[:, factor_index]
+    delta = AugmentationView(design_dictionary, code_matrix=code_matrix, randomized=randomized,
+                             run_values=run_values, random_seed=random_seed, randomization=randomization)
+    return _design_output(delta, output, profiler)
+
+
+def replicate_runs(design_dictionary, runs=None, number_replicates=1, replicate_factor=None, first_replicate=1,
+                   randomized=True, run_values="values", random_seed=RANDOM_SEED, output="list",
+                   randomization="shuffle", profiler=None):
+    """Returns number_replicates more replicates of the full factorial of design_dictionary, or of the factorial
+    runs of the executed run sheet runs when it is given. With a replicate_factor name (for example
+    REPLICATE_FACTOR) every run also gets its replicate number, counting from first_replicate. The replicates are
+    randomized together with random_seed, the other parameters are the same as fully_factorial."""
+    design_dictionary = merge_design_dictionaries(design_dictionary)
+    if runs is not None:
+        code_matrix = np.tile(executed_positions(runs, design_dictionary, run_values=run_values),
+                              (number_replicates, 1))
+    if replicate_factor is not None:
+        if replicate_factor in design_dictionary:
+            raise ValueError("{0!r} is already a factor of design_dictionary".format(replicate_factor))
+        replicates = range(first_replicate, first_replicate + number_replicates)
+        design_dictionary = dict(design_dictionary)
+        design_dictionary[replicate_factor] = {replicate: replicate for replicate in replicates}
+    if runs is None:
+        blocks = [[np.arange(len(design_dictionary[factor]), dtype=np.int64) for factor in design_dictionary]]
+        if replicate_factor is None:
+            blocks = blocks * number_replicates
+        delta = AugmentationView(design_dictionary, blocks=blocks, randomized=randomized, run_values=run_values,
+                                 random_seed=random_seed, randomization=randomization)
+    else:
+        if replicate_factor is not None:
+            replicate_codes = np.repeat(np.arange(number_replicates, dtype=np.int64),
+                                        len(code_matrix) // max(number_replicates, 1))
+            code_matrix = np.column_stack([code_matrix, replicate_codes])
+        delta = AugmentationView(design_dictionary, code_matrix=code_matrix, randomized=randomized,
+                                 run_values=run_values, random_seed=random_seed, randomization=randomization)
+    return _design_output(delta, output, profiler)
+
+
+def augmented_run_sheet(runs, delta_runs, fill=None):
+    """Returns the executed run sheet runs followed by delta_runs, the runs already made keep their place. fill is
+    {factor: value} for the factors the executed runs do not set, such as a factor added by augmentation_runs.
+    A list of dictionaries is returned for a list of runs, otherwise a columnar_designs.Design."""
+    fill = fill or {}
+    if isinstance(runs, list):
+        delta_runs = delta_runs if isinstance(delta_runs, list) else list(delta_runs)
+        filled_runs = [dict(run, **{factor: value for factor, value in fill.items() if factor not in run})
+                       for run in runs]
+        return filled_runs + delta_runs
+    design = run_design(runs)
+    for factor, value in fill.items():
+        if factor not in design.codes:
+            design = design.combine_columns(Design({factor: np.zeros(design.number_runs, dtype=np.int8)},
+                                                   {factor: [value]}, number_runs=design.number_runs))
+    return Design.concatenate([design, run_design(delta_runs)])
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class AugmentationView(FullyFactorialView):
+    """A lazy run sheet of new runs of design_dictionary. The unrandomized order is every combination of each
+    block (a list with an array of level positions per factor, the last factor changing fastest), one block after
+    the other, followed by the rows of code_matrix (level positions, one row per run). Randomization works as in
+    FullyFactorialView."""
+    def __init__(self, design_dictionary, blocks=None, code_matrix=None, randomized=True, run_values="values",
+                 random_seed=RANDOM_SEED, randomization="shuffle"):
+        FullyFactorialView.__init__(self, design_dictionary, randomized=randomized, run_values=run_values,
+                                    random_seed=random_seed, randomization=randomization)
+        self.blocks = [[np.asarray(positions, dtype=np.int64) for positions in block] for block in (blocks or [])]
+        self.block_radices = [[len(positions) for positions in block] for block in self.blocks]
+        block_sizes = [math.prod(radices) for radices in self.block_radices]
+        # block_starts ends with the first index of the code_matrix runs
+        self.block_starts = [0] + list(itertools.accumulate(block_sizes))
+        if code_matrix is None:
+            code_matrix = np.zeros((0, len(self.factors)), dtype=np.int64)
+        self.code_matrix = np.asarray(code_matrix, dtype=np.int64).reshape(-1, len(self.factors))
+        self.number_runs = self.block_starts[-1] + len(self.code_matrix)
+        if self.permutation is not None:
+            self.permutation = SeededPermutation(self.number_runs, random_seed=random_seed)
+
+    def decode(self, design_index):
+        """Returns the list of level positions for the run at design_index in the unrandomized order."""
+        if design_index >= self.block_starts[-1]:
+            return [int(code) for code in self.code_matrix[design_index - self.block_starts[-1]]]
+        block_number = int(np.searchsorted(self.block_starts, design_index, side="right")) - 1
+        design_index -= self.block_starts[block_number]
+        block = self.blocks[block_number]
+        positions = [0] * len(block)
+        for factor_index in range(len(block) - 1, -1, -1):
+            design_index, position = divmod(design_index, len(block[factor_index]))
+            positions[factor_index] = int(block[factor_index][position])
+        return positions
+
+    def decode_array(self, design_indices):
+        """Returns {factor_name: code array} for an array of design indices, each block is decoded vectorized.
+        Design indices of more than 63 bits (an object array) are decoded one at a time."""
+        if np.asarray(design_indices).dtype == object:
+            codes = np.array([self.decode(int(design_index)) for design_index in design_indices],
+                             dtype=np.int64).reshape(-1, len(self.factors))
+            return {factor: codes[:, factor_index] for factor_index, factor in enumerate(self.factors)}
+        design_indices = np.asarray(design_indices, dtype=np.int64)
+        codes = np.empty((len(design_indices), len(self.factors)), dtype=np.int64)
+        block_numbers = np.searchsorted(self.block_starts, design_indices, side="right") - 1
+        for block_number in np.unique(block_numbers).tolist():
+            in_block = block_numbers == block_number
+            block_indices = design_indices[in_block] - self.block_starts[block_number]
+            if block_number == len(self.blocks):
+                codes[in_block] = self.code_matrix[block_indices]
+                continue
+            block = self.blocks[block_number]
+            for factor_index in range(len(block) - 1, -1, -1):
+                block_indices, positions = np.divmod(block_indices, len(block[factor_index]))
+                codes[in_block, factor_index] = block[factor_index][positions]
+        return {factor: codes[:, factor_index] for factor_index, factor in enumerate(self.factors)}
+
+    def __iter__(self):
+        if self.randomized:
+            return FullyFactorialView.__iter__(self)
+        return DesignView.__iter__(self)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_design_augmentation():
+    """Tests that the deltas of augmentation_runs complete the augmented full factorial and prints a foldover"""
+    import time
+    from experimental_design.experimental_designs import fully_factorial
+    from experimental_design.fractional_factorials import fractional_factorial
+    print("*"*80)
+    print("Testing augmentation_runs, foldover_runs and replicate_runs")
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 19)}
+    augmented = dict(design, F1={"-": -1, "0": 0, "+": 1}, F19={"-": -1, "+": 1})
+    executed = fully_factorial(design, randomization="permutation", output="design")
+    start = time.time()
+    delta = augmentation_runs(design, augmented, existing_levels={"F19": -1}, output="design",
+                              randomization="permutation")
+    print(f"The {delta.number_runs} new runs took {time.time() - start:.2f} s")
+    sheet = augmented_run_sheet(executed, delta, fill={"F19": -1})
+    combinations = {tuple(row) for row in sheet.code_matrix().tolist()}
+    print(f"The {sheet.number_runs} runs of the augmented run sheet are its full factorial "
+          f"{len(combinations) == math.prod(len(levels) for levels in augmented.values()) == sheet.number_runs}")
+    screening = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 8)}
+    fraction = fractional_factorial(screening, number_runs=8, randomized=False)
+    for run in foldover_runs(fraction, screening, randomized=False)[0:4]:
+        print(run)
+    replicates = replicate_runs(screening, runs=fraction, number_replicates=2, replicate_factor=REPLICATE_FACTOR,
+                                output="lazy")
+    print(f"Two replicates of the fraction have {replicates.number_runs} runs")
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_design_augmentation()
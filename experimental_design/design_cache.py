@@ -0,0 +1,350 @@
+#-----------------------------------------------------------------------------
+# Name:        design_cache
+# Purpose:    To keep generated designs on disk and in memory so the same design is only built once.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""design_cache stores the designs made by the generators of experimental_designs in a content addressed cache.
+The key of a design is a SHA-256 hash of the generator name, its arguments with the defaults filled in (the
+design dictionaries, seeds, run_values, modulo settings ...) and the package version, so an upgrade never returns
+a stale design. A design is stored as the integer code arrays of a columnar_designs.Design in .npy files next to a
+small pickle of its level tables, and is memory mapped when it is loaded, so a hit costs the time to read the level
+tables. The disk tier is bounded in bytes and evicts the least recently used designs, and a memo tier keeps the
+designs of repeated calls in the process. Only use a cache directory that you trust, the level tables are pickles.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import inspect
+import tempfile
+import functools
+import collections
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design import __version__
+from experimental_design.columnar_designs import Design
+
+#-----------------------------------------------------------------------------
+# Module Constants
+CACHE_DIRECTORY = os.environ.get("EXPERIMENTAL_DESIGN_CACHE_DIR",
+                                 os.path.join(os.path.expanduser("~"), ".cache", "experimental_design"))
+"Directory of the default cache, set by EXPERIMENTAL_DESIGN_CACHE_DIR"
+CACHE_MAX_BYTES = 2**30
+"Default size bound of the disk tier in bytes"
+MEMO_SIZE = 16
+"Default number of designs kept in the memo tier"
+MEMO_MAX_BYTES = 2**28
+"Designs with code arrays larger than this many bytes are not kept in the memo tier"
+CACHE_FORMAT = 1
+"Version of the stored layout, it is part of every key"
+METADATA_FILE = "design.pickle"
+"File of a cache entry that holds the factors, level tables and number of runs"
+UNCACHED_ARGUMENTS = ["output", "profiler"]
+"Generator arguments that do not change the design and are left out of the key"
+SEED_ARGUMENTS = ["random_seed", "random_seed_base"]
+"Generator arguments that make the design irreproducible when they are None"
+_DEFAULT_CACHE = None
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def canonical_form(value):
+    """Returns value as nested lists of JSON types tagged with the type name, so 1, 1.0, True and "1" differ.
+    Dictionaries keep their order (it sets the factor and run order), sets are sorted. Raises TypeError for
+    values without a stable form, like functions."""
+    if value is None or isinstance(value, (bool, int, str)):
+        return [type(value).__name__, value]
+    if isinstance(value, float):
+        return ["float", repr(value)]
+    if isinstance(value, np.generic):
+        return [type(value).__name__, canonical_form(value.item())]
+    if isinstance(value, np.ndarray):
+        return ["ndarray", value.dtype.str, list(value.shape), canonical_form(value.tolist())]
+    if isinstance(value, dict):
+        return [type(value).__name__, [[canonical_form(key), canonical_form(item)] for key, item in value.items()]]
+    if isinstance(value, (list, tuple, range)):
+        return [type(value).__name__, [canonical_form(item) for item in value]]
+    if isinstance(value, (set, frozenset)):
+        return [type(value).__name__, sorted((canonical_form(item) for item in value), key=json.dumps)]
+    if hasattr(value, "__dict__") and not callable(value):
+        value_type = type(value)
+        return [value_type.__module__ + "." + value_type.__qualname__, canonical_form(vars(value))]
+    raise TypeError("{0!r} has no stable form for a cache key".format(value))
+
+
+def generator_arguments(generator, *arguments, **keywords):
+    """Returns the ordered dictionary of the arguments of generator(*arguments, **keywords), defaults included"""
+    bound_arguments = inspect.signature(generator).bind(*arguments, **keywords)
+    bound_arguments.apply_defaults()
+    return bound_arguments.arguments
+
+
+def design_cache_key(generator, *arguments, **keywords):
+    """Returns the hex SHA-256 key of the design generator(*arguments, **keywords). Raises TypeError if an argument
+    has no stable form, and ValueError if a seed is None, since the design is then different every time."""
+    generator_keywords = generator_arguments(generator, *arguments, **keywords)
+    for name in SEED_ARGUMENTS:
+        if name in generator_keywords and generator_keywords[name] is None:
+            raise ValueError("{0} is None, the design is not reproducible".format(name))
+    key_arguments = [[name, canonical_form(value)] for name, value in generator_keywords.items()
+                     if name not in UNCACHED_ARGUMENTS]
+    key_data = ["experimental_design", __version__, CACHE_FORMAT,
+                generator.__module__ + "." + generator.__qualname__, key_arguments]
+    return hashlib.sha256(json.dumps(key_data, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def get_design_cache():
+    """Returns the default DesignCache, made in CACHE_DIRECTORY the first time it is used"""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = DesignCache()
+    return _DEFAULT_CACHE
+
+
+def set_design_cache(cache=None, **options):
+    """Sets the default cache to cache, or to DesignCache(**options), and returns it"""
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = cache if cache is not None else DesignCache(**options)
+    return _DEFAULT_CACHE
+
+
+def cached_generator(generator, cache=None):
+    """Returns generator wrapped so the "list" and "design" outputs come from cache (the default cache if None),
+    for example fully_factorial = cached_generator(fully_factorial)"""
+    @functools.wraps(generator)
+    def cached_design_generator(*arguments, **keywords):
+        design_cache = cache if cache is not None else get_design_cache()
+        return design_cache.generate(generator, *arguments, **keywords)
+    return cached_design_generator
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class DesignCache(object):
+    """A cache of designs in directory, with at most max_bytes on disk and memo_size designs in memory. The
+    least recently used designs are evicted first. statistics counts the memo hits, disk hits, misses, stores,
+    evictions and the calls that bypassed the cache (lazy output, unstable arguments, no seed or unhashable
+    levels). With memory_map=False a design is read into memory instead of memory mapped."""
+    def __init__(self, directory=None, max_bytes=CACHE_MAX_BYTES, memo_size=MEMO_SIZE,
+                 memo_max_bytes=MEMO_MAX_BYTES, memory_map=True):
+        self.directory = os.path.abspath(directory or CACHE_DIRECTORY)
+        self.max_bytes = max_bytes
+        self.memo_size = memo_size
+        self.memo_max_bytes = memo_max_bytes
+        self.memory_map = memory_map
+        self.memo = collections.OrderedDict()
+        self.statistics = {"memo_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                           "bypassed": 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def generate(self, generator, *arguments, **keywords):
+        """Returns generator(*arguments, **keywords) from the memo tier, the disk tier or by calling the generator
+        with output="design" and storing the result. A profiler is only used when the design is generated. A design
+        whose levels can not be encoded as a Design (unhashable values) bypasses the cache and is generated with
+        the output asked for."""
+        bound_arguments = inspect.signature(generator).bind(*arguments, **keywords)
+        bound_arguments.apply_defaults()
+        output = bound_arguments.arguments.get("output", "list")
+        if output not in ("list", "design"):
+            self.statistics["bypassed"] += 1
+            return generator(*arguments, **keywords)
+        try:
+            key = design_cache_key(generator, *arguments, **keywords)
+        except (TypeError, ValueError):
+            self.statistics["bypassed"] += 1
+            return generator(*arguments, **keywords)
+        design = self.get(key)
+        if design is None:
+            bound_arguments.arguments["output"] = "design"
+            try:
+                design = generator(*bound_arguments.args, **bound_arguments.kwargs)
+            except TypeError:
+                # levels that are not hashable, like lists, can not be encoded as a Design
+                self.statistics["bypassed"] += 1
+                return generator(*arguments, **keywords)
+            self.statistics["misses"] += 1
+            self.put(key, design)
+        return design if output == "design" else design.to_list()
+
+    def get(self, key):
+        """Returns the Design stored under key, or None"""
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            self.statistics["memo_hits"] += 1
+            self._touch(key)
+            return self.memo[key]
+        design = self.load(key)
+        if design is not None:
+            self.statistics["disk_hits"] += 1
+            self._touch(key)
+            self._memoize(key, design)
+        return design
+
+    def put(self, key, design):
+        """Stores design under key in both tiers, then evicts least recently used designs over max_bytes"""
+        self._memoize(key, design)
+        if design.nbytes > self.max_bytes:
+            return
+        self.save(key, design)
+        self.statistics["stores"] += 1
+        self.evict(keep=key)
+
+    def entry_path(self, key):
+        """Returns the directory of the cache entry of key"""
+        return os.path.join(self.directory, key)
+
+    def save(self, key, design):
+        """Writes design to the entry of key, the code arrays of each dtype as one Fortran ordered .npy matrix so a
+        factor is a contiguous column, written to a temporary directory first so readers never see a partial entry"""
+        groups = {}
+        for factor in design.factors:
+            groups.setdefault(design.codes[factor].dtype.name, []).append(factor)
+        metadata = {"factors": design.factors, "levels": design.levels, "number_runs": design.number_runs,
+                    "columns": {}}
+        temporary_path = tempfile.mkdtemp(prefix=".entry-", dir=self.directory)
+        try:
+            for dtype_name, factors in groups.items():
+                codes = np.lib.format.open_memmap(os.path.join(temporary_path, dtype_name + ".npy"), mode="w+",
+                                                  dtype=dtype_name, shape=(design.number_runs, len(factors)),
+                                                  fortran_order=True)
+                for column, factor in enumerate(factors):
+                    codes[:, column] = design.codes[factor]
+                    metadata["columns"][factor] = (dtype_name, column)
+                codes.flush()
+                del codes
+            with open(os.path.join(temporary_path, METADATA_FILE), "wb") as metadata_file:
+                pickle.dump(metadata, metadata_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.entry_path(key))
+        except OSError:
+            # another process stored the same design first
+            pass
+        finally:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+    def load(self, key):
+        """Returns the Design of the entry of key, with memory mapped code arrays, or None"""
+        entry_path = self.entry_path(key)
+        try:
+            with open(os.path.join(entry_path, METADATA_FILE), "rb") as metadata_file:
+                metadata = pickle.load(metadata_file)
+            matrices = {}
+            codes = {}
+            for factor in metadata["factors"]:
+                dtype_name, column = metadata["columns"][factor]
+                if dtype_name not in matrices:
+                    matrices[dtype_name] = np.load(os.path.join(entry_path, dtype_name + ".npy"),
+                                                   mmap_mode="r" if self.memory_map else None)
+                codes[factor] = matrices[dtype_name][:, column]
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, ValueError):
+            return None
+        return Design(codes, metadata["levels"], number_runs=metadata["number_runs"])
+
+    def entries(self):
+        """Returns [(key, bytes, last use time), ...] of the entries on disk, least recently used first"""
+        entries = []
+        for key in os.listdir(self.directory):
+            entry_path = self.entry_path(key)
+            if key.startswith(".") or not os.path.isdir(entry_path):
+                continue
+            try:
+                last_used = os.stat(os.path.join(entry_path, METADATA_FILE)).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+            except OSError:
+                continue
+            entries.append((key, size, last_used))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        """Removes the least recently used entries until the disk tier is at most max_bytes, except keep"""
+        entries = self.entries()
+        total_bytes = sum(entry[1] for entry in entries)
+        for key, size, last_used in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            self.memo.pop(key, None)
+            total_bytes -= size
+            self.statistics["evictions"] += 1
+
+    def clear(self):
+        """Removes every design from both tiers"""
+        self.memo.clear()
+        for key, size, last_used in self.entries():
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+
+    def stats(self):
+        """Returns the statistics with the hit rate, the number of entries and the bytes on disk"""
+        entries = self.entries()
+        statistics = dict(self.statistics)
+        calls = statistics["memo_hits"] + statistics["disk_hits"] + statistics["misses"]
+        statistics["hit_rate"] = (statistics["memo_hits"] + statistics["disk_hits"]) / calls if calls else 0.0
+        statistics["entries"] = len(entries)
+        statistics["disk_bytes"] = sum(entry[1] for entry in entries)
+        statistics["memo_entries"] = len(self.memo)
+        return statistics
+
+    def _touch(self, key):
+        """Marks the entry of key as used now, the modification time of its metadata file is its LRU time"""
+        try:
+            os.utime(os.path.join(self.entry_path(key), METADATA_FILE))
+        except OSError:
+            pass
+
+    def _memoize(self, key, design):
+        """Keeps design in the memo tier, dropping the least recently used designs over memo_size"""
+        if self.memo_size <= 0 or design.nbytes > self.memo_max_bytes:
+            return
+        self.memo[key] = design
+        self.memo.move_to_end(key)
+        while len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
+    def __repr__(self):
+        return "DesignCache(directory={0!r}, max_bytes={1})".format(self.directory, self.max_bytes)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_design_cache(n_factors=16):
+    """Tests that cached designs are the generated designs and prints the time of a miss, a disk hit and a memo
+    hit"""
+    import time
+    from experimental_design.experimental_designs import fully_factorial, fully_factorial_split_plot_interleaved
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors + 1)}
+    whole_plot = {"temperature": {0: 20, 1: 40, 2: 60}}
+    print("*"*80)
+    print(f"Testing DesignCache with {2**n_factors} runs")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DesignCache(directory)
+        for generator, arguments in [(fully_factorial, (design,)),
+                                     (fully_factorial_split_plot_interleaved, (whole_plot, design, whole_plot,
+                                                                               {"F1": {"-": -1, "+": 1}}))]:
+            generated = generator(*arguments, output="design")
+            times = []
+            for call in range(3):
+                if call == 2:
+                    # a new cache on the same directory has an empty memo tier
+                    cache = DesignCache(directory)
+                start = time.time()
+                cached = cache.generate(generator, *arguments, output="design")
+                times.append(time.time() - start)
+            same = all(np.array_equal(cached.codes[f], generated.codes[f]) for f in generated.factors)
+            print(f"{generator.__name__}: miss {times[0]:.3f} s, memo hit {times[1]:.6f} s, "
+                  f"disk hit {times[2]:.6f} s, the cached design is the generated design {same}")
+        unhashable = {"c": {0: (1, 2), 1: [3, 4]}}
+        assert cache.generate(fully_factorial, unhashable) == fully_factorial(unhashable)
+        print(f"A design with unhashable levels bypassed the cache {cache.statistics['bypassed']} time")
+        print(cache.stats())
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_design_cache()
@@ -0,0 +1,262 @@
+#-----------------------------------------------------------------------------
+# Name:        design_constraints
+# Purpose:    To remove disallowed factor combinations from designs efficiently.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""design_constraints compiles exclusions, given in the same [{factor_name: value, ...}, ...] form that
+filter_rows uses, into boolean masks over the level codes of each factor. The masks are applied vectorized to a
+columnar Design, or pushed into generation so that the sub-product below a disallowed partial combination is
+never enumerated. An exclusion value can also be a list or set of values, which disallows any of them, so one
+exclusion can describe a whole block of interlocked settings. The number of allowed runs is found from the
+constrained factors alone, without enumerating the full product.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import math
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (FullyFactorialView, DesignView, SeededPermutation,
+                                                      RANDOM_SEED, INDEX_LIMIT)
+from experimental_design.columnar_designs import code_dtype
+
+#-----------------------------------------------------------------------------
+# Module Constants
+EXCLUSION_VALUE_SETS = (list, set, frozenset)
+"Types of exclusion value that mean any of the contained values"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def count_feasible_runs(design_dictionary, exclusions, run_values="values"):
+    """Given a design_dictionary and exclusions returns the number of runs of the fully factorial design that
+    are not excluded, without building the design."""
+    return ExclusionConstraints(exclusions).count_runs(design_dictionary, run_values=run_values)
+
+
+def constrained_fully_factorial(design_dictionary, exclusions, randomized=True, run_values="values",
+                                random_seed=RANDOM_SEED, output="list", randomization="shuffle", profiler=None):
+    """Given a design_dictionary and exclusions returns the fully factorial run sheet without the excluded runs.
+    The unrandomized order is the same as filter_rows(fully_factorial(design_dictionary, randomized=False),
+    exclusions). When randomized the allowed runs are shuffled, so the order differs from shuffling the full
+    design and then filtering. Optional parameters, including profiler, are the same as fully_factorial."""
+    from experimental_design.experimental_designs import _design_output
+    test_conditions = ConstrainedFactorialView(design_dictionary, exclusions,
+                                               randomized=randomized,
+                                               run_values=run_values,
+                                               random_seed=random_seed,
+                                               randomization=randomization)
+    return _design_output(test_conditions, output, profiler)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class ExclusionConstraints(object):
+    """A set of exclusions [{factor_name: value, ...}, ...]. A run is disallowed if it matches every entry of any
+    one exclusion. An entry value that is a list or set matches any of its values."""
+    def __init__(self, exclusions):
+        self.exclusions = []
+        for excluded in exclusions:
+            normalized = {}
+            for factor, value in excluded.items():
+                if isinstance(value, EXCLUSION_VALUE_SETS):
+                    normalized[factor] = list(value)
+                else:
+                    normalized[factor] = [value]
+            self.exclusions.append(normalized)
+
+    def constrained_factors(self):
+        """Returns the list of factors named in any exclusion"""
+        factors = []
+        for excluded in self.exclusions:
+            for factor in excluded.keys():
+                if factor not in factors:
+                    factors.append(factor)
+        return factors
+
+    def level_masks(self, level_tables):
+        """Given {factor_name: list of levels} returns one {factor_name: boolean array over the levels} per
+        exclusion. Exclusions that can never match (a value that is not a level) are left out."""
+        compiled = []
+        for excluded in self.exclusions:
+            masks = {}
+            for factor, values in excluded.items():
+                if factor not in level_tables:
+                    raise KeyError("The excluded factor {0!r} is not in the design".format(factor))
+                masks[factor] = np.array([any(level == value for value in values)
+                                          for level in level_tables[factor]], dtype=bool)
+            if all(mask.any() for mask in masks.values()):
+                compiled.append(masks)
+        return compiled
+
+    def allowed(self, design):
+        """Given a columnar_designs.Design returns a boolean array that is True for the runs that are allowed.
+        Each exclusion is one vectorized lookup per factor it names."""
+        allowed = np.ones(design.number_runs, dtype=bool)
+        for masks in self.level_masks(design.levels):
+            matched = np.ones(design.number_runs, dtype=bool)
+            for factor, mask in masks.items():
+                # the appended False is what a missing code of -1 selects
+                matched &= np.append(mask, False)[design.codes[factor]]
+            allowed &= ~matched
+        return allowed
+
+    def feasible_codes(self, factors, level_tables):
+        """Returns (constrained_factors, codes), where codes is an array with one row for every allowed
+        combination of the constrained factors, in lexicographic order of the factors. The combinations are
+        grown one factor at a time and each exclusion is applied as soon as all of its factors are set, so
+        disallowed partial combinations are never expanded. An empty exclusion matches every run, no combination
+        is allowed."""
+        compiled = self.level_masks(level_tables)
+        if any(not masks for masks in compiled):
+            return [], np.zeros((0, 0), dtype=np.int8)
+        constrained = [factor for factor in factors if any(factor in masks for masks in compiled)]
+        depth_of = {factor: depth for depth, factor in enumerate(constrained)}
+        exclusions_at_depth = [[] for factor in constrained]
+        for masks in compiled:
+            exclusions_at_depth[max(depth_of[factor] for factor in masks.keys())].append(masks)
+        dtype = code_dtype(max([len(level_tables[factor]) for factor in constrained], default=1))
+        codes = np.zeros((1, 0), dtype=dtype)
+        for depth, factor in enumerate(constrained):
+            number_levels = len(level_tables[factor])
+            codes = np.column_stack([np.repeat(codes, number_levels, axis=0),
+                                     np.tile(np.arange(number_levels, dtype=dtype), len(codes))])
+            for masks in exclusions_at_depth[depth]:
+                matched = np.ones(len(codes), dtype=bool)
+                for masked_factor, mask in masks.items():
+                    matched &= mask[codes[:, depth_of[masked_factor]]]
+                codes = codes[~matched]
+        return constrained, codes
+
+    def count_runs(self, design_dictionary, run_values="values"):
+        """Returns the number of allowed runs of the fully factorial design of design_dictionary"""
+        level_tables = {factor: list(design_dictionary[factor].__getattribute__(run_values)())
+                        for factor in design_dictionary.keys()}
+        constrained, codes = self.feasible_codes(list(level_tables.keys()), level_tables)
+        free_runs = math.prod(len(level_tables[factor]) for factor in level_tables.keys()
+                              if factor not in constrained)
+        return len(codes) * free_runs
+
+    def __repr__(self):
+        return "ExclusionConstraints({0!r})".format(self.exclusions)
+
+
+class ConstrainedFactorialView(FullyFactorialView):
+    """A lazy fully factorial run sheet without the runs disallowed by exclusions. The allowed combinations of the
+    constrained factors are enumerated once (with pruning), the other factors are never enumerated. Run N of the
+    unrandomized order is found by walking the factors and counting the allowed completions of each level, which
+    takes O(factors * log(allowed combinations)) time, decode_array does the same walk vectorized. Randomization
+    works as in FullyFactorialView on the allowed runs."""
+    def __init__(self, design_dictionary, exclusions, randomized=True, run_values="values",
+                 random_seed=RANDOM_SEED, randomization="shuffle"):
+        FullyFactorialView.__init__(self, design_dictionary, randomized=randomized, run_values=run_values,
+                                    random_seed=random_seed, randomization=randomization)
+        if not isinstance(exclusions, ExclusionConstraints):
+            exclusions = ExclusionConstraints(exclusions)
+        self.constraints = exclusions
+        level_tables = dict(zip(self.factors, self.factor_values))
+        constrained, self.feasible = self.constraints.feasible_codes(self.factors, level_tables)
+        self.constrained_column = [constrained.index(factor) if factor in constrained else None
+                                   for factor in self.factors]
+        # free_products[j] is the number of combinations of the unconstrained factors after factor j
+        self.free_products = [1] * len(self.factors)
+        free_product = 1
+        for factor_index in range(len(self.factors) - 1, -1, -1):
+            self.free_products[factor_index] = free_product
+            if self.constrained_column[factor_index] is None:
+                free_product *= self.radices[factor_index]
+        self.number_runs = len(self.feasible) * free_product
+        # group_starts[c] holds the first feasible row of every run of rows that share constrained columns 0 to c,
+        # followed by the number of feasible rows
+        self.group_starts = []
+        changed = np.zeros(max(len(self.feasible) - 1, 0), dtype=bool)
+        for column in range(self.feasible.shape[1]):
+            changed |= self.feasible[1:, column] != self.feasible[:-1, column]
+            self.group_starts.append(np.concatenate([[0], np.flatnonzero(changed) + 1,
+                                                     [len(self.feasible)]]).astype(np.int64))
+        if self.permutation is not None:
+            self.permutation = SeededPermutation(self.number_runs, random_seed=random_seed)
+
+    def decode(self, design_index):
+        """Returns the list of level positions for the allowed run at design_index in the unrandomized order."""
+        positions = [0] * len(self.radices)
+        low, high = 0, len(self.feasible)
+        for factor_index, column in enumerate(self.constrained_column):
+            free_product = self.free_products[factor_index]
+            if column is None:
+                positions[factor_index], design_index = divmod(design_index, (high - low) * free_product)
+                continue
+            level_starts = low + np.searchsorted(self.feasible[low:high, column],
+                                                 np.arange(self.radices[factor_index] + 1))
+            for level in range(self.radices[factor_index]):
+                block = int(level_starts[level + 1] - level_starts[level]) * free_product
+                if design_index < block:
+                    positions[factor_index] = level
+                    low, high = int(level_starts[level]), int(level_starts[level + 1])
+                    break
+                design_index -= block
+        return positions
+
+    def __iter__(self):
+        if self.randomized:
+            return FullyFactorialView.__iter__(self)
+        return DesignView.__iter__(self)
+
+    def decode_array(self, design_indices):
+        """Returns {factor_name: code array} for an array of design indices, the vectorized form of decode. Every
+        index keeps its range of feasible rows, a constrained factor reads the level of the row its offset falls
+        in and narrows the range to that row's group with searchsorted, so only the requested runs are decoded.
+        Designs of more than 2**63 runs are divided as Python integers."""
+        big = self.number_runs > INDEX_LIMIT
+        offsets = np.asarray(design_indices, dtype=object if big else np.int64).reshape(-1)
+        low = np.zeros(len(offsets), dtype=np.int64)
+        high = np.full(len(offsets), len(self.feasible), dtype=np.int64)
+        codes = {}
+        for factor_index, column in enumerate(self.constrained_column):
+            free_product = self.free_products[factor_index]
+            if column is None:
+                block = (high - low).astype(object) * free_product if big else (high - low) * free_product
+                positions, offsets = offsets // block, offsets % block
+                codes[self.factors[factor_index]] = positions.astype(np.int64)
+                continue
+            rows = low + (offsets // free_product).astype(np.int64)
+            codes[self.factors[factor_index]] = self.feasible[rows, column].astype(np.int64)
+            group_starts = self.group_starts[column]
+            groups = np.searchsorted(group_starts, rows, side="right") - 1
+            group_low = group_starts[groups]
+            skipped = (group_low - low).astype(object) if big else group_low - low
+            offsets = offsets - skipped * free_product
+            low, high = group_low, group_starts[groups + 1]
+        return codes
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_constrained_fully_factorial():
+    """Tests constrained_fully_factorial against filter_rows"""
+    from experimental_design.experimental_designs import fully_factorial, filter_rows
+    amt_main = {"Modulation Type": {0: "PCM/FM", 1: "SOQPSK", 2: "SOQPSK-FEC", 3: "ARTM-CPM"},
+                "Data Rate": {0: 1, 1: 5, 2: 10, 3: 20},
+                "ABE Type": {0: 'None', 1: 'AWGN 20', 2: 'AWGN 18', 3: 'AWGN 16.5'},
+                "AMT Signal Level": {i: i for i in range(11)}}
+    exclusions = [{'Modulation Type': "PCM/FM", "Data Rate": 20}, {'Modulation Type': "ARTM-CPM", "Data Rate": 1},
+                  {'ABE Type': ['AWGN 18', 'AWGN 16.5'], "AMT Signal Level": [9, 10]}]
+    print("*"*80)
+    print("Testing the constrained_fully_factorial function")
+    print(f"The exclusions are {exclusions}")
+    print(f"The number of allowed runs is {count_feasible_runs(amt_main, exclusions)}")
+    constrained = constrained_fully_factorial(amt_main, exclusions, randomized=False)
+    filtered = filter_rows(fully_factorial(amt_main, randomized=False), exclusions)
+    print(f"The constrained design has {len(constrained)} runs and matches filter_rows: {constrained == filtered}")
+    design = fully_factorial(amt_main, randomized=True, output="design")
+    print(f"filter_rows on a Design leaves {len(filter_rows(design, exclusions))} runs")
+    print(f"An empty exclusion leaves no runs: {constrained_fully_factorial(amt_main, [{}]) == []}, "
+          f"{count_feasible_runs(amt_main, [{}]) == 0 and len(filter_rows(design, [{}])) == 0}")
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_constrained_fully_factorial()
@@ -0,0 +1,446 @@
+#-----------------------------------------------------------------------------
+# Name:        design_planning
+# Purpose:    To estimate the size, memory and time of a design before it is generated.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""design_planning answers how big a design is before it is built. plan_design calls a generator with
+output="lazy", which costs nothing, and returns a DesignPlan with the number of runs, the memory of each output
+type and, from a short calibration run on this machine, the expected generation time. GENERATION_LIMITS (set with
+set_generation_limits) makes every generator refuse to build a list or a Design that is over a limit, and a
+GenerationProfiler passed as profiler= to a generator reports the time of each stage (product, shuffle, default
+insertion, interleaving) and the progress in runs per second while the design is built, and can cancel it.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import time
+import random
+import copy
+import itertools
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (DesignView, FullyFactorialView, InsertedDesignView,
+                                                      SlicedDesignView, NestedBlockView, CHUNK_SIZE, INDEX_LIMIT)
+
+#-----------------------------------------------------------------------------
+# Module Constants
+GENERATION_LIMITS = {"max_runs": None, "max_memory": None, "max_time": None}
+"Limits on the list and design outputs of the generators, in runs, bytes of peak memory and seconds. None is no limit"
+CALIBRATION_RUNS = 8192
+"Number of runs generated to measure the time per run"
+CALIBRATION_VALUES = 2**20
+"Largest number of factor values generated to measure the time per run, designs with many factors use fewer runs"
+SHUFFLE_CALIBRATION_RUNS = 2**18
+"Largest run order shuffled to measure the time per run of random.shuffle, which grows with the size of the order"
+CALIBRATION_CACHE = {}
+"Calibrated times by the structure of the calibrated view and shuffle times by order size, so none is measured twice"
+CALIBRATION_CACHE_SIZE = 256
+"Number of calibrations CALIBRATION_CACHE keeps before it is cleared"
+LIST_BYTES_PER_RUN = 8
+"Bytes a list uses for each run, on top of the run dictionary"
+SHUFFLE_BYTES_PER_RUN = 36
+"Bytes per run of a shuffled run order, a list of Python integers"
+DECODE_BYTES_PER_FACTOR = 8
+"Bytes per run and factor of the int64 arrays used while decoding a Design"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def set_generation_limits(max_runs=None, max_memory=None, max_time=None):
+    """Sets GENERATION_LIMITS, the largest number of runs, bytes of peak memory and seconds a generator may use
+    for a list or Design output. A generator over a limit raises a GenerationLimitError before it starts. None
+    removes a limit."""
+    GENERATION_LIMITS.update({"max_runs": max_runs, "max_memory": max_memory, "max_time": max_time})
+
+
+def shuffled_runs(design_view):
+    """Returns the number of run indices design_view stores for random.shuffle orders once it is generated,
+    block orders of nested designs are small and are not counted"""
+    if isinstance(design_view, FullyFactorialView):
+        return design_view.number_runs if design_view.randomized and design_view.permutation is None else 0
+    if isinstance(design_view, (InsertedDesignView, SlicedDesignView)):
+        return sum(shuffled_runs(child_view) for child_view in design_view.child_views())
+    return 0
+
+
+def shuffle_work(design_view):
+    """Returns the number of run indices that random.shuffle orders while design_view is built, the full run
+    orders counted by shuffled_runs and the block orders of nested designs, one for every block of a stage that
+    does not share its order. An inserted view that is a new view for every insert is counted for every insert."""
+    if isinstance(design_view, FullyFactorialView):
+        return shuffled_runs(design_view)
+    if isinstance(design_view, NestedBlockView):
+        work = 0
+        if design_view.randomized and design_view.randomization == "shuffle":
+            number_blocks = 1
+            for stage_size, shared in zip(design_view.stage_sizes, design_view.shared_randomization):
+                work += stage_size * (1 if shared else number_blocks)
+                number_blocks *= stage_size
+        return work + sum(shuffle_work(stage_view) for stage_view in design_view.stage_views)
+    if isinstance(design_view, InsertedDesignView):
+        work = shuffle_work(design_view.base_view)
+        if design_view.base_view.number_runs:
+            insert_block = design_view.insert_factory(0)
+            if isinstance(insert_block, DesignView):
+                number_inserts = 1
+                if design_view.insert_factory(design_view.modulo) is not insert_block:
+                    number_inserts = (design_view.base_view.number_runs + design_view.modulo - 1) // design_view.modulo
+                work += number_inserts * shuffle_work(insert_block)
+        return work
+    return sum(shuffle_work(child_view) for child_view in design_view.child_views())
+
+
+def plan_design(generator, *arguments, calibrate=True, **keywords):
+    """Returns the DesignPlan of generator(*arguments, **keywords), for example
+    plan_design(fully_factorial_default, design_dictionary, default_state, default_modulo=3). The generator is
+    called with output="lazy", so nothing is generated. With calibrate=True the list and design outputs are timed
+    on the first CALIBRATION_RUNS runs of the design itself, see calibration_view."""
+    keywords = dict(keywords)
+    keywords.pop("output", None)
+    design_view = generator(*arguments, output="lazy", **keywords)
+    return DesignPlan(design_view, calibration_view=calibration_view(design_view) if calibrate else None)
+
+
+def calibration_view(design_view, number_runs=CALIBRATION_RUNS):
+    """Returns a view that makes its first number_runs runs the way design_view does, to time them. A view
+    randomized with random.shuffle gets number_runs random design indices as its run order, so the runs
+    are decoded as in the real design without building the full order, whose shuffle DesignPlan times on its own.
+    The views a default or slice is built from are replaced the same way, other views are returned as they are."""
+    if isinstance(design_view, FullyFactorialView) and shuffled_runs(design_view):
+        view = copy.copy(design_view)
+        generator = random.Random(design_view.random_seed)
+        # a run order only holds int64 indices, a shuffled design past INDEX_LIMIT is never built
+        view._run_order = [generator.randrange(min(design_view.number_runs, INDEX_LIMIT + 1))
+                           for _ in range(min(number_runs, design_view.number_runs))]
+        return view
+    if isinstance(design_view, InsertedDesignView) and shuffled_runs(design_view):
+        view = copy.copy(design_view)
+        view.base_view = calibration_view(design_view.base_view, number_runs)
+        return view
+    if isinstance(design_view, SlicedDesignView) and shuffled_runs(design_view):
+        view = copy.copy(design_view)
+        # the sampled run order of the parent only holds number_runs runs
+        view.parent_view = calibration_view(design_view.parent_view, number_runs)
+        view.index_range = range(min(number_runs, design_view.number_runs))
+        return view
+    return design_view
+
+
+def check_generation_limits(design_view, output, limits=None):
+    """Raises a GenerationLimitError if building design_view as output ("list" or "design") is over limits
+    (GENERATION_LIMITS by default). The time is only estimated when there is a time limit."""
+    limits = GENERATION_LIMITS if limits is None else limits
+    if all(limit is None for limit in limits.values()):
+        return
+    if limits.get("max_runs") is not None and design_view.number_runs > limits["max_runs"]:
+        raise GenerationLimitError("The design has {0} runs, the limit is {1}".format(design_view.number_runs,
+                                                                                  limits["max_runs"]))
+    view = calibration_view(design_view) if limits.get("max_time") is not None else None
+    DesignPlan(design_view, calibration_view=view).check(output, limits)
+
+
+def _time_per_run(run_function, number_runs, max_runs=None):
+    """Returns (setup seconds, seconds per run) of run_function(runs). The setup is the time of a first call on a
+    few runs, which builds what is cached, and the time per run is the slope between a second call on those runs
+    and a call on number_runs runs, so the work every call repeats is not counted as time per run. While that work
+    takes longer than the runs, the call is made again on four times the runs, up to max_runs."""
+    few_runs = min(16, number_runs)
+    start = time.perf_counter()
+    run_function(few_runs)
+    setup_time = time.perf_counter() - start
+    start = time.perf_counter()
+    run_function(few_runs)
+    few_time = time.perf_counter() - start
+    max_runs = number_runs if max_runs is None else max(max_runs, number_runs)
+    while True:
+        start = time.perf_counter()
+        run_function(number_runs)
+        runs_time = time.perf_counter() - start - few_time
+        if runs_time >= few_time or number_runs >= max_runs:
+            break
+        number_runs = min(4 * number_runs, max_runs)
+    return setup_time, max(runs_time, 0.0) / max(number_runs - few_runs, 1)
+
+
+def _view_signature(design_view):
+    """Returns a hashable description of the structure of design_view, the key of CALIBRATION_CACHE"""
+    return (type(design_view).__name__, design_view.number_runs, len(design_view.factor_names()),
+            getattr(design_view, "randomized", None), getattr(design_view, "randomization", None),
+            getattr(design_view, "modulo", None), getattr(design_view, "insert_length", None),
+            tuple(_view_signature(child_view) for child_view in design_view.child_views()))
+
+
+def _format_count(count):
+    """Returns an integer as a string, in scientific notation when it has more than 15 digits"""
+    digits = str(count)
+    if len(digits) <= 15:
+        return digits
+    return "{0}.{1}e+{2}".format(digits[0], digits[1:4], len(digits) - 1)
+
+
+def as_profiler(profiler):
+    """Returns profiler as a GenerationProfiler, a callable becomes the callback of a new one"""
+    if profiler is None or hasattr(profiler, "generate"):
+        return profiler
+    return GenerationProfiler(callback=profiler)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class GenerationLimitError(ValueError):
+    """Raised when a design is over the GENERATION_LIMITS"""
+    pass
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised when a GenerationProfiler callback returns False"""
+    pass
+
+
+class DesignPlan(object):
+    """The size of a design before it is built. number_runs and factors describe the design, memory has the bytes
+    each output ("lazy", "list", "design", "dataframe") holds when done and peak_memory the bytes needed while it
+    is built. When a calibration_view is given, time has the expected seconds to build the "list" and "design"
+    outputs, found by generating the first runs of calibration_view and scaling up."""
+    def __init__(self, design_view, calibration_view=None):
+        self.number_runs = design_view.number_runs
+        self.factors = design_view.factor_names()
+        self.shuffled_runs = shuffled_runs(design_view)
+        # the sizes are Python integers, the designs these plans refuse have more runs than a float holds
+        code_bytes = len(self.factors)
+        if isinstance(design_view, FullyFactorialView):
+            from experimental_design.columnar_designs import code_dtype
+            code_bytes = sum(code_dtype(radix).itemsize for radix in design_view.radices)
+        run_bytes = sys.getsizeof(dict.fromkeys(self.factors))
+        scaled_runs = float(self.number_runs) if self.number_runs < sys.float_info.max else float("inf")
+        self.time = None
+        self.shuffle_work = shuffle_work(design_view)
+        if calibration_view is not None and calibration_view.number_runs:
+            sample_runs = min(CALIBRATION_RUNS, calibration_view.number_runs,
+                              max(16, CALIBRATION_VALUES // max(len(calibration_view.factor_names()), 1)))
+            sample = calibration_view.design_range(0, min(sample_runs, 64))
+            if sample.factors:
+                code_bytes = sum(sample.codes[factor].itemsize for factor in sample.factors)
+            run_bytes = int(np.mean([sys.getsizeof(run) for run in itertools.islice(iter(calibration_view), 64)]))
+            signature = _view_signature(design_view)
+            if signature not in CALIBRATION_CACHE:
+                if len(CALIBRATION_CACHE) >= CALIBRATION_CACHE_SIZE:
+                    CALIBRATION_CACHE.clear()
+                CALIBRATION_CACHE[signature] = self.calibrate(calibration_view, sample_runs, self.shuffle_work)
+            run_times = CALIBRATION_CACHE[signature]
+            self.time = {"lazy": 0.0}
+            for output in ["list", "design"]:
+                setup_time, run_time = run_times[output]
+                self.time[output] = setup_time + run_time * scaled_runs
+            self.time["dataframe"] = self.time["design"]
+            if self.shuffle_work:
+                shuffle_time = run_times["shuffle"] * float(min(self.shuffle_work, sys.float_info.max))
+                for output in ["list", "design", "dataframe"]:
+                    self.time[output] += shuffle_time
+        number_factors = len(self.factors)
+        order_bytes = SHUFFLE_BYTES_PER_RUN * self.shuffled_runs
+        design_bytes = self.number_runs * code_bytes
+        list_bytes = self.number_runs * (LIST_BYTES_PER_RUN + run_bytes)
+        self.memory = {"lazy": order_bytes, "list": list_bytes, "design": design_bytes, "dataframe": design_bytes}
+        decode_bytes = self.number_runs * DECODE_BYTES_PER_FACTOR * (number_factors + 2)
+        self.peak_memory = {"lazy": order_bytes,
+                            "list": list_bytes + order_bytes,
+                            "design": design_bytes + decode_bytes + order_bytes,
+                            "dataframe": design_bytes + decode_bytes + order_bytes}
+
+    @staticmethod
+    def calibrate(calibration_view, sample_runs, shuffle_work=0):
+        """Returns {output: (setup seconds, seconds per run)} of the "list" and "design" outputs, timed on the
+        first sample_runs runs of calibration_view as the generators build them (see _time_per_run), and "shuffle",
+        the seconds per index of building and shuffling a run order of up to shuffle_work indices"""
+        max_runs = min(calibration_view.number_runs, 4 * sample_runs)
+        run_times = {"list": _time_per_run(lambda runs: list(itertools.islice(iter(calibration_view), runs)),
+                                           sample_runs, max_runs),
+                     "design": _time_per_run(lambda runs: calibration_view.design_range(0, runs), sample_runs,
+                                             max_runs)}
+        if shuffle_work:
+            shuffle_runs = int(min(shuffle_work, SHUFFLE_CALIBRATION_RUNS))
+            if ("shuffle", shuffle_runs) not in CALIBRATION_CACHE:
+                start = time.perf_counter()
+                random.Random(0).shuffle(list(range(shuffle_runs)))
+                CALIBRATION_CACHE["shuffle", shuffle_runs] = (time.perf_counter() - start) / shuffle_runs
+            run_times["shuffle"] = CALIBRATION_CACHE["shuffle", shuffle_runs]
+        return run_times
+
+    def limit_violations(self, output="list", limits=None):
+        """Returns a list of messages for the limits (GENERATION_LIMITS by default) that output is over"""
+        limits = GENERATION_LIMITS if limits is None else limits
+        violations = []
+        if limits.get("max_runs") is not None and self.number_runs > limits["max_runs"]:
+            violations.append("{0} runs is over the limit of {1}".format(self.number_runs, limits["max_runs"]))
+        if limits.get("max_memory") is not None and self.peak_memory[output] > limits["max_memory"]:
+            violations.append("{0} bytes of memory is over the limit of {1}".format(self.peak_memory[output],
+                                                                                    limits["max_memory"]))
+        if limits.get("max_time") is not None and self.time is not None and self.time[output] > limits["max_time"]:
+            violations.append("{0:.3g} s is over the limit of {1} s".format(self.time[output], limits["max_time"]))
+        return violations
+
+    def check(self, output="list", limits=None):
+        """Raises a GenerationLimitError if output is over limits (GENERATION_LIMITS by default)"""
+        violations = self.limit_violations(output, limits)
+        if violations:
+            raise GenerationLimitError("The {0} output of the design is too large: {1}".format(output,
+                                                                                         ", ".join(violations)))
+
+    def summary(self):
+        """Returns the plan as a dictionary"""
+        return {"number_runs": self.number_runs, "factors": list(self.factors), "shuffled_runs": self.shuffled_runs,
+                "memory": dict(self.memory), "peak_memory": dict(self.peak_memory),
+                "time": None if self.time is None else dict(self.time)}
+
+    def __repr__(self):
+        return "DesignPlan(number_runs={0}, number_factors={1}, design_bytes={2}, list_bytes={3}{4})".format(
+            _format_count(self.number_runs), len(self.factors), _format_count(self.memory["design"]),
+            _format_count(self.memory["list"]),
+            "" if self.time is None else ", list_seconds={0:.3g}, design_seconds={1:.3g}".format(self.time["list"],
+                                                                                               self.time["design"]))
+
+
+class GenerationProfiler(object):
+    """Times the stages of building a design and reports progress. callback(event) is called with a dictionary,
+    {"event": "stage", "stage": name, "seconds": s} when a stage ends, {"event": "progress", "runs": done,
+    "number_runs": total, "runs_per_second": rate, "elapsed": s} after each chunk of chunk_size runs and
+    {"event": "done", ...} with stage_times at the end. If callback returns False the build stops with a
+    GenerationCancelled. Stage times are exclusive, a stage that runs inside another is not counted twice."""
+    def __init__(self, callback=None, chunk_size=CHUNK_SIZE):
+        self.callback = callback
+        self.chunk_size = chunk_size
+        self.stage_times = {}
+        self._stage_stack = []
+        self.start_time = None
+        self.runs = 0
+        self.number_runs = 0
+
+    def _report(self, event):
+        """Sends event to the callback and stops the build if it returns False"""
+        if self.callback is not None and self.callback(event) is False:
+            raise GenerationCancelled("The design generation was cancelled after {0} runs".format(self.runs))
+
+    def stage(self, stage):
+        """Returns a context manager that times stage"""
+        return _ProfilerStage(self, stage)
+
+    def progress(self, runs, number_runs):
+        """Reports that runs of number_runs are done"""
+        self.runs = runs
+        self.number_runs = number_runs
+        elapsed = time.perf_counter() - self.start_time
+        self._report({"event": "progress", "runs": runs, "number_runs": number_runs, "elapsed": elapsed,
+                      "runs_per_second": runs / elapsed if elapsed > 0 else float("inf")})
+
+    @property
+    def runs_per_second(self):
+        """Average number of runs built per second so far"""
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0
+        return self.runs / elapsed if elapsed > 0 else float("inf")
+
+    def generate(self, design_view, output):
+        """Builds design_view as output ("list" or "design") in chunks, reporting to the callback"""
+        from experimental_design.columnar_designs import Design
+        self.start_time = time.perf_counter()
+        self.runs = 0
+        design_view.set_profiler(self)
+        try:
+            if output == "list":
+                result = []
+                runs = iter(design_view)
+                with self.stage("product"):
+                    while len(result) < design_view.number_runs:
+                        result.extend(itertools.islice(runs, self.chunk_size))
+                        self.progress(len(result), design_view.number_runs)
+            else:
+                pieces = []
+                for chunk_start in range(0, design_view.number_runs, self.chunk_size):
+                    chunk_stop = min(chunk_start + self.chunk_size, design_view.number_runs)
+                    pieces.append(design_view.design_range(chunk_start, chunk_stop))
+                    self.progress(chunk_stop, design_view.number_runs)
+                if not pieces:
+                    result = design_view.to_design()
+                elif len(pieces) == 1:
+                    result = pieces[0]
+                else:
+                    with self.stage("concatenate"):
+                        result = Design.concatenate(pieces)
+        finally:
+            design_view.set_profiler(None)
+        elapsed = time.perf_counter() - self.start_time
+        self._report({"event": "done", "runs": self.runs, "number_runs": design_view.number_runs,
+                      "elapsed": elapsed, "runs_per_second": self.runs_per_second,
+                      "stage_times": dict(self.stage_times)})
+        return result
+
+    def __repr__(self):
+        return "GenerationProfiler(stage_times={0})".format(self.stage_times)
+
+
+class _ProfilerStage(object):
+    """Context manager of one GenerationProfiler stage"""
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.inner_time = 0.0
+        self.profiler._stage_stack.append(self)
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.profiler._stage_stack.pop()
+        seconds = time.perf_counter() - self.start
+        if self.profiler._stage_stack:
+            self.profiler._stage_stack[-1].inner_time += seconds
+        own_seconds = seconds - self.inner_time
+        self.profiler.stage_times[self.stage] = self.profiler.stage_times.get(self.stage, 0.0) + own_seconds
+        if exception_type is None:
+            self.profiler._report({"event": "stage", "stage": self.stage, "seconds": own_seconds})
+        return False
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_plan_design():
+    """Tests plan_design, the generation limits and the GenerationProfiler"""
+    from experimental_design.experimental_designs import fully_factorial, fully_factorial_split_plot_interleaved
+    print("*"*80)
+    print("Testing plan_design")
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 6001)}
+    print(f"The 6000 factor design is {plan_design(fully_factorial, design)}")
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 21)}
+    plan = plan_design(fully_factorial, design)
+    print(f"The 20 factor design is {plan}")
+    calibrations = len(CALIBRATION_CACHE)
+    assert plan_design(fully_factorial, design).time == plan.time and len(CALIBRATION_CACHE) == calibrations
+    print(f"Planning it again reuses its calibration, {calibrations} calibrations are cached")
+    # the limits the generators read are the ones of the imported module, not of __main__
+    from experimental_design import design_planning
+    design_planning.set_generation_limits(max_memory=10**8)
+    try:
+        fully_factorial(design)
+    except design_planning.GenerationLimitError as e:
+        print(e)
+    design_planning.set_generation_limits()
+    wp = {"temperature": {0: 20, 1: 40, 2: 60}}
+    sp = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 13)}
+    wp_interleaved = {"temperature": {-1: 25}}
+    sp_interleaved = {"F1": {-1: 0}}
+    for output in ["list", "design"]:
+        profiler = GenerationProfiler(chunk_size=2**12,
+                                      callback=lambda event: print(event) if event["event"] == "done" else None)
+        fully_factorial_split_plot_interleaved(wp, sp, wp_interleaved, sp_interleaved, interleave_modulo=1,
+                                               output=output, profiler=profiler)
+        print(f"The {output} output timed the stages {sorted(profiler.stage_times)}")
+        assert {"product", "interleaving"} <= set(profiler.stage_times)
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_plan_design()
@@ -0,0 +1,623 @@
+#-----------------------------------------------------------------------------
+# Name:        effect_analysis
+# Purpose:    To estimate factor effects from the measured responses of a run sheet.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""effect_analysis joins measured responses back to the runs of a run sheet and estimates the factor effects.
+A run is matched to its factor levels by its values (or keys with run_values="keys"), so the randomized order of
+the run sheet does not matter, and the default runs that fully_factorial_default inserts are set apart for a
+curvature check. For two level full and fractional factorials all the main and interaction effects come from one
+fast Walsh-Hadamard (Yates) transform of the cell means in O(N log N), replicates are averaged per cell and give
+the pure error. Other designs are fitted by least squares with the DesignModel of optimal_designs, accumulated in
+batches of runs. Effects are ranked with half-normal quantiles and Lenth's pseudo standard error, which needs no
+replicates. Effects are the change of the response from the low (-1) to the high (+1) level, the first level of a
+two level factor is low unless its values are numbers in decreasing order.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import math
+import statistics
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.columnar_designs import Design, level_key
+from experimental_design.fractional_factorials import FractionalFactorialStructure, popcount, MAXIMUM_FACTORS
+
+#-----------------------------------------------------------------------------
+# Module Constants
+SIGNIFICANCE_LEVEL = 0.05
+"Default significance level of the Lenth margins of error and the t tests"
+LEAST_SQUARES_BATCH = 65536
+"Number of runs added to the normal equations at a time by the least squares fit"
+LENTH_TRIM = 2.5
+"Effects larger than LENTH_TRIM times the initial scale are left out of Lenth's pseudo standard error"
+_BETA_TOLERANCE = 1e-14
+_BETA_TINY = 1e-300
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def fast_walsh_hadamard(values):
+    """Returns the Walsh-Hadamard transform of values along the first axis, which must have a power of two length.
+    Element m of the result is the sum over i of values[i] * (-1) ** popcount(i & m), found with log2(N)
+    vectorized butterfly passes, so the columns of a 2-D array are transformed together."""
+    values = np.array(values, dtype=float)
+    number_values = len(values)
+    if number_values & (number_values - 1):
+        raise ValueError("The length must be a power of two, not {0}".format(number_values))
+    half_width = 1
+    while half_width < number_values:
+        butterflies = values.reshape((number_values // (2 * half_width), 2, half_width) + values.shape[1:])
+        low = butterflies[:, 0].copy()
+        butterflies[:, 0] += butterflies[:, 1]
+        butterflies[:, 1] = low - butterflies[:, 1]
+        half_width *= 2
+    return values
+
+
+def _beta_continued_fraction(a, b, x):
+    """Returns the continued fraction of the incomplete beta function (modified Lentz method)"""
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > _BETA_TINY else _BETA_TINY)
+    fraction = d
+    for m in range(1, 1000):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > _BETA_TINY else _BETA_TINY)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > _BETA_TINY else _BETA_TINY
+            fraction *= c * d
+        if abs(c * d - 1.0) < _BETA_TOLERANCE:
+            break
+    return fraction
+
+
+def regularized_beta(a, b, x):
+    """Returns the regularized incomplete beta function I_x(a, b)"""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _beta_continued_fraction(a, b, x) / a
+    return 1.0 - front * _beta_continued_fraction(b, a, 1.0 - x) / b
+
+
+def t_cdf(t, degrees_of_freedom):
+    """Returns the cumulative distribution function of Student's t with degrees_of_freedom (which need not be an
+    integer) at t"""
+    tail = 0.5 * regularized_beta(degrees_of_freedom / 2.0, 0.5, degrees_of_freedom / (degrees_of_freedom + t * t))
+    return 1.0 - tail if t > 0 else tail
+
+
+def t_quantile(probability, degrees_of_freedom):
+    """Returns the t with t_cdf(t, degrees_of_freedom) = probability, found by bisection"""
+    if not 0 < probability < 1:
+        raise ValueError("probability must be between 0 and 1, not {0}".format(probability))
+    low, high = -1.0, 1.0
+    while t_cdf(low, degrees_of_freedom) > probability:
+        low *= 2
+    while t_cdf(high, degrees_of_freedom) < probability:
+        high *= 2
+    for iteration in range(200):
+        middle = (low + high) / 2
+        if t_cdf(middle, degrees_of_freedom) < probability:
+            low = middle
+        else:
+            high = middle
+        if high - low <= 1e-12 * max(1.0, abs(middle)):
+            break
+    return (low + high) / 2
+
+
+def t_p_value(t, degrees_of_freedom):
+    """Returns the two sided p-value of t"""
+    return 2.0 * (1.0 - t_cdf(abs(float(t)), degrees_of_freedom))
+
+
+def half_normal_quantiles(number_effects):
+    """Returns the half-normal quantiles of the 1st to number_effects-th smallest absolute effect"""
+    normal = statistics.NormalDist()
+    return np.array([normal.inv_cdf(0.5 + 0.5 * (rank - 0.5) / number_effects)
+                     for rank in range(1, number_effects + 1)])
+
+
+def lenth_pse(effects):
+    """Returns Lenth's pseudo standard error, 1.5 times the median of the absolute effects that are less than
+    LENTH_TRIM times the initial scale 1.5 * median(|effects|)"""
+    absolute_effects = np.abs(np.asarray(effects, dtype=float))
+    initial_scale = 1.5 * np.median(absolute_effects)
+    inliers = absolute_effects[absolute_effects < LENTH_TRIM * initial_scale]
+    return float(1.5 * np.median(inliers)) if len(inliers) else float(initial_scale)
+
+
+def _effect_label(mask, factors):
+    """Returns the label of the effect with bitmask mask over factors, like "F1*F3" """
+    return "*".join(str(factors[factor_index]) for factor_index in range(len(factors)) if (mask >> factor_index) & 1)
+
+
+def _effect_labels(masks, factors):
+    """Returns the labels of the effects with bitmasks masks. When the masks fill most of their range the labels
+    are built from the label without the first factor, one string join each."""
+    if not masks or max(masks) > 4 * len(masks) + 1024:
+        return [_effect_label(mask, factors) for mask in masks]
+    names = [str(factor) for factor in factors]
+    labels = [""] * (max(masks) + 1)
+    for mask in range(1, len(labels)):
+        lowest_bit = mask & -mask
+        rest = mask ^ lowest_bit
+        name = names[lowest_bit.bit_length() - 1]
+        labels[mask] = name + "*" + labels[rest] if rest else name
+    return [labels[mask] for mask in masks]
+
+
+def _group_rows(matrix):
+    """Returns (group of each row, number of groups) for the distinct rows of a 2-D array"""
+    if len(matrix) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    matrix = np.asarray(matrix, dtype=np.int64)
+    minimums = matrix.min(axis=0)
+    radices = matrix.max(axis=0) - minimums + 1
+    if math.prod(radices.tolist()) < 2**62:
+        # a mixed radix number per row is much faster to group than the rows
+        row_keys = np.zeros(len(matrix), dtype=np.int64)
+        for column, radix in enumerate(radices.tolist()):
+            row_keys = row_keys * radix + (matrix[:, column] - minimums[column])
+        groups, inverse = np.unique(row_keys, return_inverse=True)
+    else:
+        groups, inverse = np.unique(matrix, axis=0, return_inverse=True)
+    return inverse.reshape(-1), len(groups)
+
+
+def _group_sums(groups, number_groups, values):
+    """Returns the (number_groups, number_responses) sums of the rows of values in each group"""
+    return np.stack([np.bincount(groups, weights=values[:, column], minlength=number_groups)
+                     for column in range(values.shape[1])], axis=1)
+
+
+def merge_design_dictionaries(design_dictionary):
+    """Returns design_dictionary, or one dictionary of all the factors of a list of design dictionaries such as
+    [whole_plot_design_dictionary, split_plot_design_dictionary]"""
+    if isinstance(design_dictionary, (list, tuple)):
+        return {factor: levels for dictionary in design_dictionary for factor, levels in dictionary.items()}
+    return design_dictionary
+
+
+def run_design(runs):
+    """Returns the run sheet runs, a list of dictionaries, a Design or a lazy view, as a Design"""
+    if hasattr(runs, "to_design"):
+        return runs.to_design()
+    if isinstance(runs, Design):
+        return runs
+    return Design.from_runs(runs)
+
+
+def level_positions(design_dictionary, design, run_values="values"):
+    """Returns the (number_runs, number_factors) array of the position of each run's level in design_dictionary,
+    a run is matched by its level values or by its level keys with run_values="keys". A value that is not a level
+    of design_dictionary, or a factor the run does not set, has position -1."""
+    if run_values not in ("keys", "values"):
+        raise ValueError("run_values must be 'keys' or 'values', not {0!r}".format(run_values))
+    factors = list(design_dictionary.keys())
+    positions = np.full((design.number_runs, len(factors)), -1, dtype=np.int64)
+    for factor_index, factor in enumerate(factors):
+        if factor not in design.levels:
+            continue
+        level_names = list(design_dictionary[factor].__getattribute__(run_values)())
+        level_codes = {}
+        for position, level_name in enumerate(level_names):
+            level_codes.setdefault(level_key(level_name), position)
+        # the appended -1 is what a missing code selects
+        position_table = np.array([level_codes.get(level_key(level), -1) for level in design.levels[factor]] +
+                                  [-1], dtype=np.int64)
+        positions[:, factor_index] = position_table[design.codes[factor]]
+    return positions
+
+
+def join_responses(design_dictionary, runs, responses, run_values="values", default_runs=None, structure=None):
+    """Returns a ResponseData that matches the responses (in the order of runs) to the levels of design_dictionary,
+    which can be a list of dictionaries such as [whole_plot_design_dictionary, split_plot_design_dictionary]. runs
+    is the run sheet the responses were measured on, a list of dictionaries, a Design or a lazy view, in any
+    randomized order. responses is a sequence of numbers, a {response_name: sequence} dictionary or a
+    (number_runs, number_responses) array. Runs with a value that is not a level of design_dictionary are default
+    runs, default_runs is an optional boolean array that marks more of them and the inserted runs of a lazy
+    fully_factorial_default view are marked on their own. Runs with a NaN response are left out. structure is
+    the FractionalFactorialStructure (or list of generators) of a fractional factorial, taken from a lazy
+    fractional_factorial view when it is not given."""
+    design_dictionary = merge_design_dictionaries(design_dictionary)
+    factors = list(design_dictionary.keys())
+    factor_values = [list(design_dictionary[factor].values()) for factor in factors]
+    if structure is None:
+        structure = getattr(runs, "structure", None)
+    if structure is not None and not isinstance(structure, FractionalFactorialStructure):
+        structure = FractionalFactorialStructure(factors, structure)
+    inserted = runs.inserted_runs() if hasattr(runs, "inserted_runs") else None
+    design = run_design(runs)
+    if isinstance(responses, dict):
+        response_names = [str(name) for name in responses.keys()]
+        response_matrix = np.column_stack([np.asarray(values, dtype=float) for values in responses.values()])
+    else:
+        response_matrix = np.asarray(responses, dtype=float)
+        if response_matrix.ndim == 1:
+            response_names = ["response"]
+            response_matrix = response_matrix[:, np.newaxis]
+        else:
+            response_names = ["response_{0}".format(column) for column in range(response_matrix.shape[1])]
+    if len(response_matrix) != design.number_runs:
+        raise ValueError("There are {0} responses for {1} runs".format(len(response_matrix), design.number_runs))
+    positions = level_positions(design_dictionary, design, run_values=run_values)
+    is_default = (positions < 0).any(axis=1)
+    if inserted is not None:
+        is_default |= inserted
+    if default_runs is not None:
+        is_default |= np.asarray(default_runs, dtype=bool)
+    measured = ~np.isnan(response_matrix).any(axis=1)
+    factorial_runs = np.flatnonzero(~is_default & measured)
+    default_run_indices = np.flatnonzero(is_default & measured)
+    default_groups, number_default_groups = _group_rows(design.take(default_run_indices).code_matrix()
+                                                        if design.factors else
+                                                        np.zeros((len(default_run_indices), 0)))
+    return ResponseData(factors, factor_values, positions[factorial_runs], response_matrix[factorial_runs],
+                        response_names, response_matrix[default_run_indices], default_groups, factorial_runs,
+                        default_run_indices, structure=structure)
+
+
+def estimate_effects(response_data, model="interactions", structure=None):
+    """Returns the EffectAnalysis of response_data (a ResponseData from join_responses). A two level design with
+    every cell of its full factorial (or of the base factors of structure) measured is transformed with
+    fast_walsh_hadamard and gets every effect, aliased effects are labelled by their shortest alias. Any other
+    design is fitted by least squares with the optimal_designs.DesignModel of model ("main", "interactions" or
+    "quadratic")."""
+    structure = structure if structure is not None else response_data.structure
+    if structure is not None and not isinstance(structure, FractionalFactorialStructure):
+        structure = FractionalFactorialStructure(response_data.factors, structure)
+    if len(response_data.factors) <= MAXIMUM_FACTORS and \
+            all(len(values) == 2 for values in response_data.factor_values) and len(response_data.responses):
+        analysis = _yates_effects(response_data, structure)
+        if analysis is not None:
+            return analysis
+    return _least_squares_effects(response_data, model)
+
+
+def factorial_effects(design_dictionary, runs, responses, run_values="values", default_runs=None, structure=None,
+                      model="interactions"):
+    """Returns the EffectAnalysis of responses measured on runs, see join_responses and estimate_effects. For
+    example factorial_effects(design, fully_factorial(design), yields).significance_table()"""
+    response_data = join_responses(design_dictionary, runs, responses, run_values=run_values,
+                                   default_runs=default_runs, structure=structure)
+    return estimate_effects(response_data, model=model)
+
+
+def _yates_effects(response_data, structure):
+    """Returns the EffectAnalysis of a two level design from the Walsh-Hadamard transform of its cell means, or
+    None if a cell has no runs"""
+    factors = response_data.factors
+    if structure is not None:
+        structure_positions = {factor: index for index, factor in enumerate(structure.factors)}
+        if set(structure_positions.keys()) != set(factors):
+            raise ValueError("The structure has the factors {0}, not {1}".format(structure.factors, factors))
+        factor_map = [factors.index(factor) for factor in structure.factors]
+        base_factors = [factor_map[index] for index in structure.base_factors]
+    else:
+        base_factors = list(range(len(factors)))
+    number_base = len(base_factors)
+    number_cells = 2 ** number_base
+    cells = np.zeros(len(response_data.positions), dtype=np.int64)
+    for base_position, factor_index in enumerate(base_factors):
+        cells |= response_data.positions[:, factor_index] << (number_base - 1 - base_position)
+    cell_counts = np.bincount(cells, minlength=number_cells)
+    if (cell_counts == 0).any():
+        return None
+    cell_means = _group_sums(cells, number_cells, response_data.responses) / cell_counts[:, np.newaxis]
+    # in the transform bit set means level position 1, which the -1 of the Hadamard matrix turns into a sign
+    index_masks = np.arange(number_cells, dtype=np.int64)
+    contrasts = fast_walsh_hadamard(cell_means) * np.where(popcount(index_masks) % 2, -1.0, 1.0)[:, np.newaxis]
+    intercept = contrasts[0] / number_cells
+    effects = contrasts[1:] * 2.0 / number_cells
+    factor_masks = np.zeros(number_cells, dtype=np.int64)
+    for base_position, factor_index in enumerate(base_factors):
+        factor_masks |= ((index_masks >> (number_base - 1 - base_position)) & 1) << factor_index
+    factor_masks = factor_masks[1:].tolist()
+    orientation = response_data.orientation()
+    aliases = None
+    if structure is not None and structure.generated:
+        word_masks, word_signs = structure.defining_words()
+        # the words are over structure.factors, map them to the factor order of the responses
+        words = []
+        for word_mask, word_sign in zip(word_masks.tolist(), word_signs.tolist()):
+            words.append((sum(1 << factor_map[index] for index in range(len(factor_map)) if (word_mask >> index) & 1),
+                          int(word_sign)))
+        aliases = []
+        for effect_index, effect_mask in enumerate(factor_masks):
+            chain = [(effect_mask, 1)] + [(effect_mask ^ word_mask, word_sign) for word_mask, word_sign in words]
+            chain.sort(key=lambda alias: (bin(alias[0]).count("1"), alias[0]))
+            shortest_mask, shortest_sign = chain[0]
+            effects[effect_index] *= shortest_sign
+            factor_masks[effect_index] = shortest_mask
+            aliases.append(["{0}{1}".format("-" if shortest_sign * sign * _orientation_sign(mask ^ shortest_mask,
+                                                                                            orientation) < 0 else "",
+                                            _effect_label(mask, factors))
+                            for mask, sign in chain[1:]])
+    factor_masks = np.array(factor_masks, dtype=np.int64)
+    effects *= np.where(popcount(factor_masks & _flipped_mask(orientation)) % 2, -1.0, 1.0)[:, np.newaxis]
+    # effects by order, then the effects of the first factors first, reversing the bits makes the first factor
+    # the most significant bit
+    reversed_masks = np.zeros(len(factor_masks), dtype=np.int64)
+    for factor_index in range(len(factors)):
+        reversed_masks |= ((factor_masks >> factor_index) & 1) << (len(factors) - 1 - factor_index)
+    order = np.lexsort([-reversed_masks, popcount(factor_masks)])
+    factor_masks = factor_masks.tolist()
+    pure_variance, pure_degrees_of_freedom = response_data.pure_error()
+    standard_errors = None
+    if pure_degrees_of_freedom > 0:
+        effect_standard_error = 2.0 / number_cells * np.sqrt(pure_variance * np.sum(1.0 / cell_counts))
+        standard_errors = np.tile(effect_standard_error, (len(order), 1))
+    return EffectAnalysis(_effect_labels([factor_masks[index] for index in order.tolist()], factors), effects[order],
+                          intercept, response_data.response_names, method="yates",
+                          standard_errors=standard_errors, error_degrees_of_freedom=pure_degrees_of_freedom,
+                          aliases=[aliases[index] for index in order.tolist()] if aliases is not None else None,
+                          curvature=response_data.curvature(), number_runs=len(response_data.responses),
+                          number_default_runs=len(response_data.default_responses))
+
+
+def _flipped_mask(orientation):
+    """Returns the bitmask of the factors whose first level is high"""
+    return sum(1 << factor_index for factor_index, factor_orientation in enumerate(orientation)
+               if factor_orientation < 0)
+
+
+def _orientation_sign(mask, orientation):
+    """Returns the sign that turns a column of level positions (position 1 is +1) of the effect mask into the
+    low/high coding"""
+    return -1 if bin(mask & _flipped_mask(orientation)).count("1") % 2 else 1
+
+
+def _least_squares_effects(response_data, model):
+    """Returns the EffectAnalysis of a least squares fit of model, the normal equations of all the responses are
+    accumulated LEAST_SQUARES_BATCH runs at a time"""
+    from experimental_design.optimal_designs import DesignModel
+    design_model = DesignModel(response_data.factors, response_data.factor_values, model=model)
+    number_parameters = design_model.number_parameters
+    number_responses = len(response_data.response_names)
+    information = np.zeros((number_parameters, number_parameters))
+    moments = np.zeros((number_parameters, number_responses))
+    sum_squares = np.zeros(number_responses)
+    for batch_start in range(0, len(response_data.responses), LEAST_SQUARES_BATCH):
+        batch_rows = design_model.rows(response_data.positions[batch_start:batch_start + LEAST_SQUARES_BATCH])
+        batch_responses = response_data.responses[batch_start:batch_start + LEAST_SQUARES_BATCH]
+        information += batch_rows.T @ batch_rows
+        moments += batch_rows.T @ batch_responses
+        sum_squares += np.einsum("ij,ij->j", batch_responses, batch_responses)
+    if np.linalg.matrix_rank(information) < number_parameters:
+        raise ValueError("The {0} model can not be estimated from the measured runs, try model=\"main\"".format(model))
+    coefficients = np.linalg.solve(information, moments)
+    residual_degrees_of_freedom = len(response_data.responses) - number_parameters
+    standard_errors = None
+    if residual_degrees_of_freedom > 0:
+        residual_variance = np.maximum(sum_squares - np.einsum("ij,ij->j", coefficients, moments), 0.0) / \
+                            residual_degrees_of_freedom
+        standard_errors = 2.0 * np.sqrt(np.outer(np.diag(np.linalg.inv(information)), residual_variance))[1:]
+    return EffectAnalysis(design_model.labels[1:], 2.0 * coefficients[1:], coefficients[0],
+                          response_data.response_names, method="least squares", standard_errors=standard_errors,
+                          error_degrees_of_freedom=max(residual_degrees_of_freedom, 0),
+                          curvature=response_data.curvature(), number_runs=len(response_data.responses),
+                          number_default_runs=len(response_data.default_responses))
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class ResponseData(object):
+    """Responses matched to factor levels. positions is the (number of factorial runs, number of factors) array of
+    level positions in the design dictionary and responses the matching (runs, number of responses) array,
+    run_indices are the rows of the run sheet they came from. The default runs are kept apart in
+    default_responses, default_groups numbers their distinct states."""
+    def __init__(self, factors, factor_values, positions, responses, response_names, default_responses,
+                 default_groups, run_indices, default_run_indices, structure=None):
+        self.factors = factors
+        self.factor_values = factor_values
+        self.positions = positions
+        self.responses = responses
+        self.response_names = response_names
+        self.default_responses = default_responses
+        self.default_groups = default_groups
+        self.run_indices = run_indices
+        self.default_run_indices = default_run_indices
+        self.structure = structure
+
+    def orientation(self):
+        """Returns +1 for each two level factor whose second level is high, -1 if its values are numbers in
+        decreasing order, and +1 for the other factors"""
+        orientation = []
+        for values in self.factor_values:
+            numeric = len(values) == 2 and all(isinstance(value, (int, float, np.number)) and
+                                               not isinstance(value, bool) for value in values)
+            orientation.append(-1 if numeric and values[0] > values[1] else 1)
+        return orientation
+
+    def pure_error(self):
+        """Returns (variance of each response, degrees of freedom) pooled from the replicated factorial runs and
+        the replicated default states, the degrees of freedom are 0 without replicates"""
+        factorial_groups, number_factorial_groups = _group_rows(self.positions)
+        groups = np.concatenate([factorial_groups, self.default_groups + number_factorial_groups])
+        number_groups = number_factorial_groups + (int(self.default_groups.max()) + 1 if len(self.default_groups)
+                                                   else 0)
+        responses = np.concatenate([self.responses, self.default_responses])
+        degrees_of_freedom = len(responses) - number_groups
+        if degrees_of_freedom <= 0:
+            return np.zeros(len(self.response_names)), 0
+        counts = np.bincount(groups, minlength=number_groups)
+        group_means = _group_sums(groups, number_groups, responses) / np.maximum(counts, 1)[:, np.newaxis]
+        residuals = responses - group_means[groups]
+        return np.einsum("ij,ij->j", residuals, residuals) / degrees_of_freedom, degrees_of_freedom
+
+    def curvature(self):
+        """Returns {response_name: {"difference", "standard_error", "t", "p_value"}} for the mean of the default
+        runs minus the mean of the factorial runs, a test of curvature when the default state is the center
+        point, or None without default runs. The standard error needs replicates."""
+        if not len(self.default_responses) or not len(self.responses):
+            return None
+        differences = self.default_responses.mean(axis=0) - self.responses.mean(axis=0)
+        pure_variance, degrees_of_freedom = self.pure_error()
+        curvature = {}
+        for column, response_name in enumerate(self.response_names):
+            curvature[response_name] = {"difference": float(differences[column]), "standard_error": None,
+                                        "t": None, "p_value": None}
+            if degrees_of_freedom > 0 and pure_variance[column] > 0:
+                standard_error = math.sqrt(pure_variance[column] * (1.0 / len(self.default_responses) +
+                                                                    1.0 / len(self.responses)))
+                t = differences[column] / standard_error
+                curvature[response_name].update({"standard_error": standard_error, "t": float(t),
+                                                 "p_value": t_p_value(t, degrees_of_freedom)})
+        return curvature
+
+    def __repr__(self):
+        return "ResponseData(factors={0}, responses={1}, number_runs={2}, number_default_runs={3})".format(
+            self.factors, self.response_names, len(self.responses), len(self.default_responses))
+
+
+class EffectAnalysis(object):
+    """The estimated effects of a design. effects is a (number of effects, number of responses) array in the order
+    of labels, intercept is the mean response. standard_errors is None without an error estimate. aliases lists
+    the aliases of each effect of a fractional factorial, a leading "-" marks an alias with the opposite sign.
+    method is "yates" or "least squares"."""
+    def __init__(self, labels, effects, intercept, response_names, method="yates", standard_errors=None,
+                 error_degrees_of_freedom=0, aliases=None, curvature=None, number_runs=0, number_default_runs=0):
+        self.labels = list(labels)
+        self.effects = np.asarray(effects, dtype=float).reshape(len(self.labels), len(response_names))
+        self.intercept = np.asarray(intercept, dtype=float).reshape(len(response_names))
+        self.response_names = list(response_names)
+        self.method = method
+        self.standard_errors = standard_errors
+        self.error_degrees_of_freedom = error_degrees_of_freedom
+        self.aliases = aliases
+        self.curvature = curvature
+        self.number_runs = number_runs
+        self.number_default_runs = number_default_runs
+
+    def response_index(self, response=None):
+        """Returns the column of response, a name or a column number, the first response if None"""
+        if response is None:
+            return 0
+        if isinstance(response, str):
+            return self.response_names.index(response)
+        return int(response)
+
+    def effect(self, label, response=None):
+        """Returns the estimated effect with label"""
+        return float(self.effects[self.labels.index(label), self.response_index(response)])
+
+    def effect_table(self, response=None):
+        """Returns a list of {"effect", "estimate", "standard_error", "t", "p_value", "aliases"} rows in model
+        order, the t tests use the pure error (yates) or the residual error (least squares)"""
+        column = self.response_index(response)
+        rows = []
+        for effect_index, label in enumerate(self.labels):
+            row = {"effect": label, "estimate": float(self.effects[effect_index, column]), "standard_error": None,
+                   "t": None, "p_value": None,
+                   "aliases": self.aliases[effect_index] if self.aliases is not None else []}
+            if self.standard_errors is not None and self.standard_errors[effect_index, column] > 0:
+                row["standard_error"] = float(self.standard_errors[effect_index, column])
+                row["t"] = row["estimate"] / row["standard_error"]
+                row["p_value"] = t_p_value(row["t"], self.error_degrees_of_freedom)
+            rows.append(row)
+        return rows
+
+    def lenth(self, response=None, alpha=SIGNIFICANCE_LEVEL):
+        """Returns {"pse", "degrees_of_freedom", "margin_of_error", "simultaneous_margin_of_error"} of Lenth's
+        method, an effect larger than the margin of error is active at level alpha and one larger than the
+        simultaneous margin of error is active with the family of effects at level alpha"""
+        effects = self.effects[:, self.response_index(response)]
+        pse = lenth_pse(effects)
+        degrees_of_freedom = len(effects) / 3.0
+        simultaneous_probability = (1.0 + (1.0 - alpha) ** (1.0 / len(effects))) / 2.0
+        return {"pse": pse, "degrees_of_freedom": degrees_of_freedom,
+                "margin_of_error": t_quantile(1.0 - alpha / 2.0, degrees_of_freedom) * pse,
+                "simultaneous_margin_of_error": t_quantile(simultaneous_probability, degrees_of_freedom) * pse}
+
+    def significance_table(self, response=None, alpha=SIGNIFICANCE_LEVEL):
+        """Returns the half-normal and Lenth table, a list of {"effect", "estimate", "absolute_estimate",
+        "half_normal_quantile", "lenth_t", "active", "simultaneously_active", "aliases"} rows from the largest effect
+        to the smallest. Plotting absolute_estimate against half_normal_quantile is the half-normal plot."""
+        effects = self.effects[:, self.response_index(response)]
+        lenth = self.lenth(response, alpha)
+        ranks = np.argsort(np.abs(effects), kind="stable")
+        quantiles = np.empty(len(effects))
+        quantiles[ranks] = half_normal_quantiles(len(effects))
+        rows = []
+        for effect_index in ranks[::-1].tolist():
+            estimate = float(effects[effect_index])
+            rows.append({"effect": self.labels[effect_index], "estimate": estimate,
+                         "absolute_estimate": abs(estimate),
+                         "half_normal_quantile": float(quantiles[effect_index]),
+                         "lenth_t": estimate / lenth["pse"] if lenth["pse"] > 0 else float("inf"),
+                         "active": abs(estimate) > lenth["margin_of_error"],
+                         "simultaneously_active": abs(estimate) > lenth["simultaneous_margin_of_error"],
+                         "aliases": self.aliases[effect_index] if self.aliases is not None else []})
+        return rows
+
+    def to_dataframe(self, response=None, alpha=SIGNIFICANCE_LEVEL):
+        """Returns the significance_table as a pandas DataFrame indexed by effect"""
+        import pandas as pd
+        return pd.DataFrame(self.significance_table(response, alpha)).set_index("effect")
+
+    def __repr__(self):
+        return "EffectAnalysis(method={0!r}, responses={1}, number_effects={2}, number_runs={3})".format(
+            self.method, self.response_names, len(self.labels), self.number_runs)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_factorial_effects(n_factors=5, replicates=2):
+    """Tests the effects of simulated responses of a randomized two level design with default runs, a fractional
+    factorial and a mixed level design"""
+    from experimental_design.experimental_designs import fully_factorial, fully_factorial_default
+    from experimental_design.fractional_factorials import fractional_factorial
+    random_generator = np.random.default_rng(0)
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors + 1)}
+
+    def simulate(run):
+        return 10 + 3 * run["F1"] - 2 * run["F2"] + 1.5 * run["F1"] * run["F3"] + random_generator.normal(0, 0.2)
+    print("*"*80)
+    print(f"Testing factorial_effects on a 2^{n_factors} design with {replicates} replicates and default runs")
+    default = {factor: {"center": 0} for factor in design}
+    runs = []
+    for replicate in range(replicates):
+        runs += fully_factorial_default(design, default, default_modulo=8, random_seed=replicate)
+    responses = [simulate(run) for run in runs]
+    analysis = factorial_effects(design, runs, responses)
+    print(analysis)
+    for row in analysis.significance_table()[:5]:
+        print(row)
+    print("curvature", analysis.curvature)
+    print("-"*80)
+    fraction = fractional_factorial({f"F{i}": {"-": -1, "+": 1} for i in range(1, 7)}, ["F5=F1*F2*F3",
+                                                                                         "F6=F2*F3*F4"],
+                                    run_values="keys", output="lazy")
+    runs = fraction.to_list()
+    responses = [simulate({factor: design[factor][level] if factor in design else 0 for factor, level in run.items()})
+                 for run in runs]
+    analysis = factorial_effects({f"F{i}": {"-": -1, "+": 1} for i in range(1, 7)}, fraction, responses,
+                                 run_values="keys")
+    print(analysis)
+    for row in analysis.effect_table()[:6]:
+        print(row["effect"], round(row["estimate"], 3), row["aliases"][:3])
+    print("-"*80)
+    mixed = {"temperature": {"low": 20, "mid": 40, "high": 60}, "F1": {"-": -1, "+": 1}, "F2": {"-": -1, "+": 1},
+             "F3": {"-": -1, "+": 1}}
+    runs = fully_factorial(mixed)
+    responses = [simulate(run) + 0.1 * run["temperature"] for run in runs]
+    analysis = factorial_effects(mixed, runs, responses, model="main")
+    print(analysis)
+    for row in analysis.effect_table():
+        print(row["effect"], round(row["estimate"], 3), row["p_value"])
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_factorial_effects()
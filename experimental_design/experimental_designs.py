@@ -8,7 +8,10 @@
 """experimental_designs is a module that acts as a collection point for tools to create and manage
 design of experiments (DOE), or statistical design of experiments. Currently, it has
 functions to produce fully factorial designs, with or without a center point, and in
-the whole plot /split plot methods.
+the whole plot /split plot methods, including split-split plot and strip plot designs built from sub-designs that
+are made once and shared by every block. Every generator can return either a list of dictionaries (the default) or a
+lazy design view (output="lazy") that decodes run N directly from its index, so very large run sheets can be
+streamed one run at a time with constant memory.
 """
 #-----------------------------------------------------------------------------
 # Standard Imports
@@ -16,12 +19,31 @@ import sys
 import os
 import random
 import itertools
-import yaml
-import pandas as pd
+import math
+import operator
+import hashlib
+import copy
+import contextlib
+import numpy as np
 
 #-----------------------------------------------------------------------------
 # Module Constants
 RANDOM_SEED = 42
+OUTPUT_TYPES = ["list", "lazy", "design"]
+"Valid values for the output keyword of the design generators"
+RANDOMIZATION_METHODS = ["shuffle", "permutation"]
+"Valid values for the randomization keyword of the design generators"
+PERMUTATION_ROUNDS = 6
+"Number of Feistel rounds used by SeededPermutation"
+CHUNK_SIZE = 65536
+"Default number of runs in each Design returned by design_chunks"
+ORDER_CACHE_SIZE = 1024
+"Number of block run orders a NestedBlockView keeps before the cache is cleared"
+SUB_DESIGN_LIMIT = 2**20
+"Largest nested stage or inserted block that is built once as a shared Design, larger ones are decoded per take"
+INDEX_LIMIT = np.iinfo(np.int64).max
+"Largest run index that fits in an int64 array, the indices of larger designs are object arrays of Python integers"
+_NO_STAGE = contextlib.nullcontext()
 #-----------------------------------------------------------------------------
 # Module Functions
 def pretty_print_np(array):
@@ -35,20 +57,51 @@ def pretty_print_np(array):
     return outstring
 
 
+def _present_levels(levels, codes):
+    """Returns the entries of levels that the integer codes use, in level table order. Negative (missing) codes are
+    ignored, one counting pass finds them."""
+    codes = np.asarray(codes)
+    codes = codes[codes >= 0]
+    present = np.flatnonzero(np.bincount(codes.astype(np.int64), minlength=len(levels)))
+    if len(present) == len(levels):
+        return levels
+    return [levels[code] for code in present.tolist()] if isinstance(levels, list) else levels[present]
+
+
+def factor_levels(dataframe, column):
+    """Returns the levels of column that its runs use. A Design or a Categorical column counts its level codes
+    instead of comparing values, so a filtered design only reports the levels it still has, any other column is
+    scanned with .unique()."""
+    if hasattr(dataframe, "factor_table"):
+        return _present_levels(dataframe.levels[column], dataframe.codes[column])
+    column_data = dataframe[column]
+    if hasattr(column_data, "cat"):
+        return _present_levels(column_data.cat.categories.values, column_data.cat.codes.values)
+    return column_data.unique()
+
+
+def factor_columns(dataframe):
+    """Returns the factor names of a dataframe or Design"""
+    if hasattr(dataframe, "factor_table"):
+        return dataframe.factors
+    return dataframe.columns
+
+
 def create_factor_table(dataframe):
     """Given a dataframe prints off the unique values for the column names,
-    make sure the configuration number is index."""
+    make sure the configuration number is index. A Design or a DataFrame from Design.to_dataframe()
+    is read from its level tables."""
     out_dictionary = {}
-    for column in dataframe.columns:
-        out_dictionary.update({column: dataframe[column].unique()})
+    for column in factor_columns(dataframe):
+        out_dictionary.update({column: factor_levels(dataframe, column)})
     return out_dictionary
 
 
 def print_factor_table(dataframe):
     """Given a dataframe prints off the unique values for the column names,
     make sure the configuration number is index."""
-    for column in dataframe.columns:
-        print("{0} : {1}".format(column, pretty_print_np(dataframe[column].unique())))
+    for column in factor_columns(dataframe):
+        print("{0} : {1}".format(column, pretty_print_np(factor_levels(dataframe, column))))
 
 
 def jupyter_print_factor_table(dataframe, column_names=["Factors", "Values"]):
@@ -58,9 +111,9 @@ def jupyter_print_factor_table(dataframe, column_names=["Factors", "Values"]):
     output_string = r"<table>" + "\n"
     heading = r"<TR><TH>{0}</TH><TH>{1}</TH></TR>".format(*column_names)
     output_string += heading + "\n"
-    for column in dataframe.columns:
+    for column in factor_columns(dataframe):
         output_string += r"<TR><TD>{0}</TD><TD>{1}</TD></TR>".format(column, pretty_print_np(
-            sorted(dataframe[column].unique()))) + "\n"
+            sorted(factor_levels(dataframe, column)))) + "\n"
     ending = r"</table>"
     output_string += ending
     display(Markdown(output_string))
@@ -68,7 +121,7 @@ def jupyter_print_factor_table(dataframe, column_names=["Factors", "Values"]):
 
 def get_variable_factors(dataframe):
     """Given a dataframe, returns a list of factors that vary."""
-    factors = [column for column in dataframe.columns if len(dataframe[column].unique()) > 1]
+    factors = [column for column in factor_columns(dataframe) if len(factor_levels(dataframe, column)) > 1]
     return factors
 
 def condition_in_row (row,condition):
@@ -81,124 +134,182 @@ def condition_in_row (row,condition):
 
 def filter_rows(design,exclusions):
     """Input a design of the form [{Row_1},...{RowN}] and an exclusions of the form [{exclusion_1}..
-    {exclusion_N}] and returns a filter version of design."""
-    out = design
-    for excluded in exclusions:
-        out = list(filter(lambda x: condition_in_row(x,excluded),out))
+    {exclusion_N}] and returns a filter version of design. The exclusions are checked in a single pass, and a
+    columnar Design is filtered with vectorized masks over its level codes (see design_constraints)."""
+    from experimental_design.design_constraints import ExclusionConstraints
+    constraints = ExclusionConstraints(exclusions)
+    if hasattr(design, "factor_table"):
+        return design.take(np.flatnonzero(constraints.allowed(design)))
+    exclusion_items = [list(excluded.items()) for excluded in constraints.exclusions]
+    out = [row for row in design
+           if all(any(row[condition_key] not in condition_values for condition_key, condition_values in items)
+                  for items in exclusion_items)]
     return out
 
-def fully_factorial(design_dictionary, randomized=True, run_values="values",random_seed = RANDOM_SEED):
+def _design_output(design_view, output="list", profiler=None):
+    """Returns design_view in the requested output type, "list" for a list of dictionaries, "lazy" for the
+    view itself or "design" for a columnar_designs.Design. The list and design outputs are checked against
+    design_planning.GENERATION_LIMITS first, and with a profiler (a design_planning.GenerationProfiler or a
+    callback) they are built in chunks that report stage timings and progress."""
+    if output not in OUTPUT_TYPES:
+        raise ValueError("output must be one of {0}, not {1!r}".format(OUTPUT_TYPES, output))
+    if output == "lazy":
+        return design_view
+    from experimental_design.design_planning import check_generation_limits, as_profiler
+    check_generation_limits(design_view, output)
+    profiler = as_profiler(profiler)
+    if profiler is None:
+        return design_view.to_list() if output == "list" else design_view.to_design()
+    return profiler.generate(design_view, output)
+
+
+def index_array(indices):
+    """Returns indices (a range or a sequence of non-negative run indices) as an int64 numpy array, or as an
+    object array of Python integers when an index does not fit in an int64 (designs with more than 2**63 runs)"""
+    if isinstance(indices, range):
+        if max(indices.start, indices.stop) <= INDEX_LIMIT + 1:
+            return np.arange(indices.start, indices.stop, indices.step, dtype=np.int64)
+        if indices.stop - indices.start > sys.maxsize:
+            raise OverflowError("The {0} run indices from {1} do not fit in an array".format(
+                indices.stop - indices.start, indices.start))
+        return np.array(list(indices), dtype=object).reshape(-1)
+    indices = np.asarray(indices)
+    if indices.dtype == object:
+        if indices.size and max(int(index) for index in indices.ravel()) > INDEX_LIMIT:
+            return indices
+        return indices.astype(np.int64)
+    if indices.dtype.kind == "u" and indices.size and indices.max() > INDEX_LIMIT:
+        return indices.astype(object)
+    return indices.astype(np.int64, copy=False)
+
+
+def fully_factorial(design_dictionary, randomized=True, run_values="values",random_seed = RANDOM_SEED,
+                    output="list", randomization="shuffle", exclusions=None, profiler=None):
     """Given a design_dictionary in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...
     'factor_name_N':{factor_level_N:factor_level_value_N}}
     returns a test_conditions run sheet. Optional parameters are randomized (True or False) and run_values
-    ("keys" or "values"). The randomization process sets a random_seed = RANDOM_SEED to be reproducible. """
-    factors = list(design_dictionary.keys())
-    factor_values = []
-    for factor in factors:
-        factor_values_row = list(design_dictionary[factor].__getattribute__(run_values)())
-        factor_values.append(factor_values_row)
-    test_conditions = [dict(zip(factors, state)) for state in itertools.product(*factor_values)]
-    if randomized:
-        random.seed(random_seed)
-        random.shuffle(test_conditions)
-    return test_conditions
+    ("keys" or "values"). The randomization process sets a random_seed = RANDOM_SEED to be reproducible.
+    If output="lazy" a FullyFactorialView is returned instead of a list, it decodes each run from its index.
+    randomization="shuffle" gives the classic random.shuffle order, randomization="permutation" uses a
+    SeededPermutation of the run indices so any run of the randomized order is found in O(1) time and memory.
+    exclusions in the filter_rows form are pruned during generation, the allowed runs are then randomized.
+    profiler is an optional design_planning.GenerationProfiler or callback(event) that gets the time of each stage
+    (product, shuffle, default insertion, interleaving) and progress in runs per second, it can cancel the build."""
+    if exclusions:
+        from experimental_design.design_constraints import constrained_fully_factorial
+        return constrained_fully_factorial(design_dictionary, exclusions,
+                                           randomized=randomized,
+                                           run_values=run_values,
+                                           random_seed=random_seed,
+                                           output=output,
+                                           randomization=randomization,
+                                           profiler=profiler)
+    test_conditions = FullyFactorialView(design_dictionary,
+                                         randomized=randomized,
+                                         run_values=run_values,
+                                         random_seed=random_seed,
+                                         randomization=randomization)
+    return _design_output(test_conditions, output, profiler)
 
 
 def fully_factorial_default(design_dictionary, default_state, default_modulo=2,
-                            randomized=True, run_values="values",random_seed =42):
+                            randomized=True, run_values="values",random_seed =42, output="list",
+                            randomization="shuffle", exclusions=None, profiler=None):
     """Given a design_dictionary in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...
     'factor_name_N':{factor_level_N:factor_level_value_N}} and a default state in the same format,
     returns a test_conditions run sheet. Optional parameters are default_modulo (how often do you want the state,
     randomized (True or False) and run_values.
-    ("keys" or "values"). """
+    ("keys" or "values"). If output="lazy" a lazy design view is returned instead of a list. randomization and
+    exclusions are applied to the design before the default states are added, see fully_factorial, which also
+    describes profiler."""
 
     test_conditions = fully_factorial(design_dictionary,
                                       randomized=randomized,
                                       run_values=run_values,
-                                      random_seed=random_seed)
+                                      random_seed=random_seed,
+                                      output="lazy",
+                                      randomization=randomization,
+                                      exclusions=exclusions)
     factors = list(design_dictionary.keys())
     default_condition = {}
     for factor in factors:
         default_condition[factor] = list(default_state[factor].__getattribute__(run_values)())[0]
-    defaulted_test_conditions = []
-    for test_index, test_condition in enumerate(test_conditions):
-        if test_index % default_modulo == 0:
-            defaulted_test_conditions.append(default_condition)
-            defaulted_test_conditions.append(test_condition)
-        else:
-            defaulted_test_conditions.append(test_condition)
-    return defaulted_test_conditions
+    default_conditions = [default_condition]
+    defaulted_test_conditions = InsertedDesignView(test_conditions,
+                                                   insert_factory=lambda test_index: default_conditions,
+                                                   modulo=default_modulo,
+                                                   insert_length=1)
+    return _design_output(defaulted_test_conditions, output, profiler)
 
 
 def fully_factorial_split_plot(whole_plot_design_dictionary, split_plot_design_dictionary,
-                               randomized=True, run_values="values",random_seed_base = RANDOM_SEED):
+                               randomized=True, run_values="values",random_seed_base = RANDOM_SEED, output="list",
+                               randomization="shuffle", profiler=None):
     """Given a whole_plot_design_dictionary and split_plot_design_dictionary in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...
     'factor_name_N':{factor_level_N:factor_level_value_N}} ,
     returns a test_conditions run sheet. Optional parameters are
     randomized (True or False) and run_values.
-    ("keys" or "values"). """
-    test_conditions = []
-    whole_plot_test_conditions = fully_factorial(whole_plot_design_dictionary,
-                                                 randomized=randomized,
-                                                 run_values=run_values)
-    for whole_plot_index,whole_plot in enumerate(whole_plot_test_conditions):
-        split_plot_test_condtions = fully_factorial(split_plot_design_dictionary,
-                                                    randomized=randomized,
-                                                    run_values=run_values,
-                                                    random_seed=random_seed_base+whole_plot_index)
-        for split_plot in split_plot_test_condtions:
-            new_row = dict(whole_plot)
-            new_row.update(split_plot)
-            test_conditions.append(new_row)
-    return test_conditions
+    ("keys" or "values"). If output="lazy" a lazy design view is returned instead of a list. randomization is
+    "shuffle" or "permutation" and profiler reports the generation stages, see fully_factorial."""
+    test_conditions = NestedBlockView([FullyFactorialView(whole_plot_design_dictionary, randomized=False,
+                                                          run_values=run_values),
+                                       FullyFactorialView(split_plot_design_dictionary, randomized=False,
+                                                          run_values=run_values)],
+                                      randomized=randomized,
+                                      random_seeds=[RANDOM_SEED, random_seed_base],
+                                      randomization=randomization)
+    return _design_output(test_conditions, output, profiler)
 
 
 def fully_factorial_split_plot_default(whole_plot_design_dictionary, split_plot_design_dictionary,
                                        whole_plot_default_dictionary, whole_plot_default_modulo=2,
-                                       randomized=True, run_values="values"):
+                                       randomized=True, run_values="values", output="list",
+                                       randomization="shuffle", profiler=None):
     """Given a whole_plot_design_dictionary and split_plot_design_dictionary in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...
     'factor_name_N':{factor_level_N:factor_level_value_N}} and a default state in the same format,
     returns a test_conditions run sheet. It assumes that the split plot design remains the same
     Optional parameters are default_modulo (how often do you want the state in whole plot iterations,
     randomized (True or False) and run_values.
-    ("keys" or "values"). """
+    ("keys" or "values"). If output="lazy" a lazy design view is returned instead of a list. randomization is
+    "shuffle" or "permutation" and profiler reports the generation stages, see fully_factorial."""
     # Build the fully factorial test and default conditions
     test_conditions = fully_factorial_split_plot(whole_plot_design_dictionary, split_plot_design_dictionary,
-                                                 randomized=randomized, run_values=run_values)
+                                                 randomized=randomized, run_values=run_values, output="lazy",
+                                                 randomization=randomization)
 
     default_conditions = fully_factorial_split_plot(whole_plot_default_dictionary, split_plot_design_dictionary,
-                                                    randomized=randomized, run_values=run_values)
+                                                    randomized=randomized, run_values=run_values, output="lazy",
+                                                    randomization=randomization)
 
     number_split_plot_states = 1
     for factor in split_plot_design_dictionary.keys():
         number_split_plot_states = number_split_plot_states * len(split_plot_design_dictionary[factor])
     state_modulo = int(whole_plot_default_modulo * number_split_plot_states)
 
-    defaulted_test_conditions = []
-    for test_index, test_condition in enumerate(test_conditions):
-        if test_index % state_modulo == 0:
-            for default_state in default_conditions:
-                defaulted_test_conditions.append(default_state)
-            defaulted_test_conditions.append(test_condition)
-        else:
-            defaulted_test_conditions.append(test_condition)
-    return defaulted_test_conditions
+    defaulted_test_conditions = InsertedDesignView(test_conditions,
+                                                   insert_factory=lambda test_index: default_conditions,
+                                                   modulo=state_modulo,
+                                                   insert_length=default_conditions.number_runs)
+    return _design_output(defaulted_test_conditions, output, profiler)
 
 def fully_factorial_split_plot_interleaved(whole_plot_design_dictionary, split_plot_design_dictionary,
                                        whole_plot_design_dictionary_interleaved,
                                        split_plot_design_dictionary_interleaved,
                                        interleave_modulo=2,
-                                       randomized=True, run_values="values"):
+                                       randomized=True, run_values="values", output="list",
+                                       randomization="shuffle", profiler=None):
     """Given whole_plot_design_dictionary, split_plot_design_dictionary,
     whole_plot_design_dictionary_interleaved, split_plot_design_dictionary_interleaved in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...
     'factor_name_N':{factor_level_N:factor_level_value_N}},
     returns a test_conditions run sheet. It assumes that the split plot design remains the same
     Optional parameters are interleave_modulo (how often do you want the state in whole plot iterations,
     randomized (True or False) and run_values.
-    ("keys" or "values"). """
+    ("keys" or "values"). If output="lazy" a lazy design view is returned instead of a list. randomization is
+    "shuffle" or "permutation" and profiler reports the generation stages, see fully_factorial."""
     # Build the fully factorial test and default conditions
     test_conditions = fully_factorial_split_plot(whole_plot_design_dictionary, split_plot_design_dictionary,
-                                                 randomized=randomized, run_values=run_values)
+                                                 randomized=randomized, run_values=run_values, output="lazy",
+                                                 randomization=randomization)
 
     # does this lead to a different randomization each time? -NO
 
@@ -208,25 +319,733 @@ def fully_factorial_split_plot_interleaved(whole_plot_design_dictionary, split_p
         number_split_plot_states = number_split_plot_states * len(split_plot_design_dictionary[factor])
     state_modulo = int(interleave_modulo * number_split_plot_states)
 
-    interleaved_test_conditions = []
-    for test_index, test_condition in enumerate(test_conditions):
-        if test_index % state_modulo == 0:
-            interleave_conditions = fully_factorial_split_plot(whole_plot_design_dictionary_interleaved,
-                                                               split_plot_design_dictionary_interleaved,
-                                                               randomized=randomized,
-                                                               run_values=run_values,
-                                                               random_seed_base=test_index)
-            for interleave_state in interleave_conditions:
-                interleaved_test_conditions.append(interleave_state)
-            interleaved_test_conditions.append(test_condition)
+    # the interleaved sub-designs are built once, each insert only gets its own split plot seeds
+    interleaved_conditions = fully_factorial_split_plot(whole_plot_design_dictionary_interleaved,
+                                                        split_plot_design_dictionary_interleaved,
+                                                        randomized=randomized,
+                                                        run_values=run_values,
+                                                        output="lazy",
+                                                        randomization=randomization)
+
+    def interleave_factory(test_index):
+        return interleaved_conditions.reseeded([RANDOM_SEED, test_index])
+
+    interleaved_test_conditions = InsertedDesignView(test_conditions,
+                                                     insert_factory=interleave_factory,
+                                                     modulo=state_modulo,
+                                                     insert_length=interleaved_conditions.number_runs,
+                                                     insert_stage="interleaving")
+    return _design_output(interleaved_test_conditions, output, profiler)
+
+def fully_factorial_nested(design_dictionaries, randomized=True, run_values="values", random_seed=RANDOM_SEED,
+                           output="list", randomization="shuffle", shared_randomization=None, profiler=None):
+    """Given a list of design_dictionaries [whole_plot_design_dictionary, split_plot_design_dictionary,
+    split_split_plot_design_dictionary, ...] in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...}
+    returns a nested run sheet, every run of a stage is followed by the full design of the next stage. Every block
+    is randomized on its own, the blocks get consecutive seeds after random_seed. shared_randomization is a list
+    with True for the stages that use the same run order in every block, [False, True] is a strip plot. Optional
+    parameters randomized, run_values, output, randomization and profiler are the same as fully_factorial."""
+    stage_views = [FullyFactorialView(design_dictionary, randomized=False, run_values=run_values)
+                   for design_dictionary in design_dictionaries]
+    test_conditions = NestedBlockView(stage_views,
+                                      randomized=randomized,
+                                      random_seeds=NestedBlockView.consecutive_seeds(stage_views, random_seed),
+                                      randomization=randomization,
+                                      shared_randomization=shared_randomization)
+    return _design_output(test_conditions, output, profiler)
+
+
+def fully_factorial_strip_plot(row_design_dictionary, column_design_dictionary, randomized=True,
+                               run_values="values", random_seed=RANDOM_SEED, output="list", randomization="shuffle",
+                               profiler=None):
+    """Given a row_design_dictionary and column_design_dictionary in the form
+    {'factor_name_1':{factor_level_1:factor_level_value_1}, ...} returns a strip plot run sheet, every row run is
+    crossed with all the column runs and the column runs are in the same randomized order for every row. Optional
+    parameters are the same as fully_factorial_nested."""
+    return fully_factorial_nested([row_design_dictionary, column_design_dictionary],
+                                  randomized=randomized,
+                                  run_values=run_values,
+                                  random_seed=random_seed,
+                                  output=output,
+                                  randomization=randomization,
+                                  shared_randomization=[False, True],
+                                  profiler=profiler)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class DesignView(object):
+    """Base class for lazy, read-only run sheets. A child class sets number_runs and defines run(index), which
+    returns the run dictionary at a non-negative index. The view then supports len(), view[i], slicing (which
+    returns another lazy view), iteration and to_list() without building the full list of runs. For designs with
+    more than sys.maxsize runs len() raises an OverflowError, use the number_runs attribute instead."""
+    number_runs = 0
+    profiler = None
+
+    def run(self, index):
+        """Returns the run dictionary at the non-negative index"""
+        raise NotImplementedError
+
+    def factor_names(self):
+        """Returns the list of factor names of the run sheet without generating it"""
+        return list(self.run(0).keys()) if self.number_runs else []
+
+    def child_views(self):
+        """Returns the views this view is built from"""
+        return []
+
+    def set_profiler(self, profiler):
+        """Sets the design_planning.GenerationProfiler (or None) that this view and the views it is built from
+        report their stage timings to"""
+        self.profiler = profiler
+        for child_view in self.child_views():
+            child_view.set_profiler(profiler)
+
+    def _stage(self, stage):
+        """Returns the context that times stage with the profiler, it does nothing without one"""
+        return _NO_STAGE if self.profiler is None else self.profiler.stage(stage)
+
+    def __len__(self):
+        return self.number_runs
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SlicedDesignView(self, range(self.number_runs)[index])
+        index = operator.index(index)
+        if index < 0:
+            index += self.number_runs
+        if index < 0 or index >= self.number_runs:
+            raise IndexError("design index out of range")
+        return self.run(index)
+
+    def __iter__(self):
+        index = 0
+        while index < self.number_runs:
+            yield self.run(index)
+            index += 1
+
+    def to_list(self):
+        """Returns the run sheet as a list of dictionaries"""
+        return list(self)
+
+    def to_design(self):
+        """Returns the run sheet as a columnar_designs.Design"""
+        return self.design_range(0, self.number_runs)
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a columnar_designs.Design"""
+        from experimental_design.columnar_designs import Design
+        return Design.from_runs(self[start:stop])
+
+    def design_take(self, run_indices):
+        """Returns the runs at the non-negative run_indices, in that order, as a columnar_designs.Design"""
+        from experimental_design.columnar_designs import Design
+        return Design.from_runs(self.run(index) for index in np.asarray(run_indices).tolist())
+
+    def design_chunks(self, chunk_size=CHUNK_SIZE):
+        """Yields the run sheet as columnar_designs.Design objects of chunk_size runs, so a design of any size
+        can be written out in bounded memory."""
+        for chunk_start in range(0, self.number_runs, chunk_size):
+            yield self.design_range(chunk_start, min(chunk_start + chunk_size, self.number_runs))
+
+    def __repr__(self):
+        return "{0}(number_runs={1})".format(self.__class__.__name__, self.number_runs)
+
+
+class SlicedDesignView(DesignView):
+    """A lazy slice of another DesignView, index_range is a range of indices into the parent view."""
+    def __init__(self, parent_view, index_range):
+        self.parent_view = parent_view
+        self.index_range = index_range
+        if index_range.step > 0:
+            self.number_runs = max(0, (index_range.stop - index_range.start + index_range.step - 1) // index_range.step)
+        else:
+            self.number_runs = max(0, (index_range.start - index_range.stop - index_range.step - 1) // -index_range.step)
+
+    def run(self, index):
+        return self.parent_view.run(self.index_range[index])
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a columnar_designs.Design, a slice with a step of one is a range of
+        the parent view"""
+        index_range = self.index_range[start:stop]
+        if index_range.step == 1:
+            return self.parent_view.design_range(index_range.start, max(index_range.stop, index_range.start))
+        return self.parent_view.design_take(index_array(index_range))
+
+    def design_take(self, run_indices):
+        index_range = self.index_range
+        run_indices = index_array(run_indices)
+        if max(abs(index_range.start), abs(index_range.stop)) > INDEX_LIMIT:
+            run_indices = run_indices.astype(object)
+        return self.parent_view.design_take(index_range.start + run_indices * index_range.step)
+
+    def factor_names(self):
+        return self.parent_view.factor_names()
+
+    def child_views(self):
+        return [self.parent_view]
+
+
+class SeededPermutation(object):
+    """A seeded bijective permutation of range(number_items) that is never stored. Indices are encrypted with a
+    keyed Feistel network over the smallest power of two that holds number_items, and values that land outside
+    the range are encrypted again (cycle walking) until they fall inside it. permutation[k] and
+    permutation.inverse(value) take O(1) expected time and memory, and the same random_seed always gives the same
+    order. The round keys come from a private random.Random(random_seed), so the global random state is untouched."""
+    def __init__(self, number_items, random_seed=RANDOM_SEED, rounds=PERMUTATION_ROUNDS):
+        self.number_items = number_items
+        self.random_seed = random_seed
+        self.rounds = rounds
+        domain_bits = max(2, (number_items - 1).bit_length())
+        self.left_bits = domain_bits // 2
+        self.right_bits = domain_bits - self.left_bits
+        self.left_mask = (1 << self.left_bits) - 1
+        self.right_mask = (1 << self.right_bits) - 1
+        key_generator = random.Random(random_seed)
+        self.round_keys = [key_generator.getrandbits(64) for round_index in range(rounds)]
+
+    def _round_function(self, round_index, value, width):
+        """Keyed pseudo random function used by each Feistel round, returns an integer of width bits"""
+        key = self.round_keys[round_index]
+        if width <= 64:
+            # splitmix64 finalizer
+            z = (value + key) & 0xFFFFFFFFFFFFFFFF
+            z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+            z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+            return (z ^ (z >> 31)) & ((1 << width) - 1)
+        digest = hashlib.shake_256(key.to_bytes(8, "little") +
+                                   value.to_bytes((value.bit_length() + 7) // 8 + 1, "little"))
+        return int.from_bytes(digest.digest((width + 7) // 8), "little") & ((1 << width) - 1)
+
+    def _encrypt(self, value):
+        left = value >> self.right_bits
+        right = value & self.right_mask
+        for round_index in range(self.rounds):
+            if round_index % 2 == 0:
+                left ^= self._round_function(round_index, right, self.left_bits)
+            else:
+                right ^= self._round_function(round_index, left, self.right_bits)
+        return (left << self.right_bits) | right
+
+    def _decrypt(self, value):
+        left = value >> self.right_bits
+        right = value & self.right_mask
+        for round_index in range(self.rounds - 1, -1, -1):
+            if round_index % 2 == 0:
+                left ^= self._round_function(round_index, right, self.left_bits)
+            else:
+                right ^= self._round_function(round_index, left, self.right_bits)
+        return (left << self.right_bits) | right
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.number_items
+        if index < 0 or index >= self.number_items:
+            raise IndexError("permutation index out of range")
+        value = self._encrypt(index)
+        while value >= self.number_items:
+            value = self._encrypt(value)
+        return value
+
+    def permute_array(self, indices):
+        """Returns numpy array of permutation[index] for each index in indices, computed vectorized. It gives
+        the same values as indexing one at a time, permutations of more than 2**63 items fall back to the scalar
+        path and return an object array of Python integers."""
+        if self.left_bits + self.right_bits > 63:
+            indices = np.asarray(indices, dtype=object)
+            return np.array([self[int(index)] for index in indices.ravel()], dtype=object).reshape(indices.shape)
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size == 0:
+            return indices.copy()
+        values = self._encrypt_array(indices.astype(np.uint64))
+        outside = values >= self.number_items
+        while outside.any():
+            values[outside] = self._encrypt_array(values[outside])
+            outside = values >= self.number_items
+        return values.astype(np.int64)
+
+    def _encrypt_array(self, values):
+        """Vectorized _encrypt for numpy uint64 values, valid when the Feistel domain fits in 63 bits"""
+        with np.errstate(over="ignore"):
+            left = values >> np.uint64(self.right_bits)
+            right = values & np.uint64(self.right_mask)
+            for round_index in range(self.rounds):
+                if round_index % 2 == 0:
+                    z = right + np.uint64(self.round_keys[round_index])
+                else:
+                    z = left + np.uint64(self.round_keys[round_index])
+                z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+                z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+                z = z ^ (z >> np.uint64(31))
+                if round_index % 2 == 0:
+                    left = left ^ (z & np.uint64(self.left_mask))
+                else:
+                    right = right ^ (z & np.uint64(self.right_mask))
+        return (left << np.uint64(self.right_bits)) | right
+
+    def inverse(self, value):
+        """Returns the index k such that permutation[k] == value"""
+        if value < 0 or value >= self.number_items:
+            raise ValueError("{0} is not in the permuted range".format(value))
+        index = self._decrypt(value)
+        while index >= self.number_items:
+            index = self._decrypt(index)
+        return index
+
+    def __len__(self):
+        return self.number_items
+
+    def __iter__(self):
+        index = 0
+        while index < self.number_items:
+            yield self[index]
+            index += 1
+
+    def __repr__(self):
+        return "SeededPermutation(number_items={0}, random_seed={1!r})".format(self.number_items, self.random_seed)
+
+
+class FullyFactorialView(DesignView):
+    """A lazy fully factorial run sheet. Run N is found by decoding N as a mixed-radix number over the number of
+    levels of each factor, with the last factor changing fastest (the itertools.product order). When randomized
+    with randomization="shuffle", the run order is the same as random.seed(random_seed) followed by
+    random.shuffle of the full list, it is built on first use and costs one integer per run. With
+    randomization="permutation" the order comes from a SeededPermutation and nothing is stored."""
+    def __init__(self, design_dictionary, randomized=True, run_values="values", random_seed=RANDOM_SEED,
+                 randomization="shuffle"):
+        if randomization not in RANDOMIZATION_METHODS:
+            raise ValueError("randomization must be one of {0}, not {1!r}".format(RANDOMIZATION_METHODS,
+                                                                                 randomization))
+        self.factors = list(design_dictionary.keys())
+        self.factor_values = []
+        for factor in self.factors:
+            factor_values_row = list(design_dictionary[factor].__getattribute__(run_values)())
+            self.factor_values.append(factor_values_row)
+        self.radices = [len(factor_values_row) for factor_values_row in self.factor_values]
+        self.number_runs = math.prod(self.radices)
+        self.randomized = randomized
+        self.run_values = run_values
+        self.random_seed = random_seed
+        self.randomization = randomization
+        self._run_order = None
+        self.permutation = None
+        if randomized and randomization == "permutation":
+            self.permutation = SeededPermutation(self.number_runs, random_seed=random_seed)
+
+    def decode(self, design_index):
+        """Returns the list of level positions for the run at design_index in the unrandomized order."""
+        positions = [0] * len(self.radices)
+        for factor_index in range(len(self.radices) - 1, -1, -1):
+            design_index, positions[factor_index] = divmod(design_index, self.radices[factor_index])
+        return positions
+
+    def run_order(self):
+        """Returns the list of unrandomized design indices in run order."""
+        if self._run_order is None:
+            with self._stage("shuffle"):
+                if self.permutation is not None:
+                    self._run_order = list(self.permutation)
+                else:
+                    run_order = list(range(self.number_runs))
+                    if self.randomized:
+                        random.Random(self.random_seed).shuffle(run_order)
+                    self._run_order = run_order
+        return self._run_order
+
+    def design_index(self, index):
+        """Returns the unrandomized design index of the run at index."""
+        if self.permutation is not None:
+            return self.permutation[index]
+        elif self.randomized:
+            return self.run_order()[index]
+        return index
+
+    def run_index(self, design_index):
+        """Returns the position in run order of the run at design_index in the unrandomized order."""
+        if self.permutation is not None:
+            return self.permutation.inverse(design_index)
+        elif self.randomized:
+            return self.run_order().index(design_index)
+        return design_index
+
+    def run_from_design_index(self, design_index):
+        """Returns the run dictionary at design_index in the unrandomized order."""
+        positions = self.decode(design_index)
+        return {factor: self.factor_values[factor_index][position]
+                for factor_index, (factor, position) in enumerate(zip(self.factors, positions))}
+
+    def run(self, index):
+        return self.run_from_design_index(self.design_index(index))
+
+    def design_indices(self, start=0, stop=None):
+        """Returns a numpy array of the unrandomized design index of the runs start to stop (every run by
+        default), in run order."""
+        if stop is None:
+            stop = self.number_runs
+        if self.permutation is not None:
+            return self.permutation.permute_array(index_array(range(start, stop)))
+        elif self.randomized:
+            return np.array(self.run_order()[start:stop], dtype=np.int64)
+        return index_array(range(start, stop))
+
+    def decode_array(self, design_indices):
+        """Returns {factor_name: code array} for an array of design indices, the vectorized form of decode. Design
+        indices of more than 63 bits (an object array) are divided as Python integers."""
+        codes = {}
+        if np.asarray(design_indices).dtype == object:
+            for factor_index in range(len(self.radices) - 1, -1, -1):
+                radix = self.radices[factor_index]
+                codes[self.factors[factor_index]] = (design_indices % radix).astype(np.int64)
+                design_indices = design_indices // radix
+            return {factor: codes[factor] for factor in self.factors}
+        for factor_index in range(len(self.radices) - 1, -1, -1):
+            design_indices, codes[self.factors[factor_index]] = np.divmod(design_indices,
+                                                                           self.radices[factor_index])
+        return {factor: codes[factor] for factor in self.factors}
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a columnar_designs.Design, the codes are decoded vectorized from the
+        design indices."""
+        from experimental_design.columnar_designs import Design
+        with self._stage("shuffle"):
+            design_indices = self.design_indices(start, stop)
+        with self._stage("product"):
+            return Design.from_codes(self.decode_array(design_indices), dict(zip(self.factors, self.factor_values)))
+
+    def design_take(self, run_indices):
+        """Returns the runs at run_indices as a columnar_designs.Design, decoded vectorized"""
+        from experimental_design.columnar_designs import Design
+        run_indices = index_array(run_indices)
+        with self._stage("shuffle"):
+            if self.permutation is not None:
+                design_indices = self.permutation.permute_array(run_indices)
+            elif self.randomized:
+                run_order = self.run_order()
+                design_indices = np.fromiter(map(run_order.__getitem__, run_indices.tolist()), dtype=np.int64,
+                                             count=len(run_indices))
+            else:
+                design_indices = run_indices
+        with self._stage("product"):
+            return Design.from_codes(self.decode_array(design_indices), dict(zip(self.factors, self.factor_values)))
+
+    def factor_names(self):
+        return list(self.factors)
+
+    def to_design(self):
+        """Returns the run sheet as a columnar_designs.Design"""
+        return self.design_range(0, self.number_runs)
+
+    def __iter__(self):
+        if self.permutation is not None:
+            for design_index in self.permutation:
+                yield self.run_from_design_index(design_index)
+        elif self.randomized:
+            for design_index in self.run_order():
+                yield self.run_from_design_index(design_index)
         else:
-            interleaved_test_conditions.append(test_condition)
-    return interleaved_test_conditions
+            for state in itertools.product(*self.factor_values):
+                yield dict(zip(self.factors, state))
+
+
+class InsertedDesignView(DesignView):
+    """A lazy run sheet that inserts a block of runs before every modulo-th run of base_view. The block inserted
+    before base run test_index is insert_factory(test_index), which must always have insert_length runs. This is
+    how default (control) states and interleaved designs are added. insert_stage is the stage name the inserting
+    is timed under by a profiler."""
+    def __init__(self, base_view, insert_factory, modulo, insert_length, insert_stage="default insertion"):
+        self.base_view = base_view
+        self.insert_factory = insert_factory
+        self.modulo = modulo
+        self.insert_length = insert_length
+        self.insert_stage = insert_stage
+        number_inserts = (base_view.number_runs + modulo - 1) // modulo
+        self.number_runs = base_view.number_runs + number_inserts * insert_length
+
+    def run(self, index):
+        block_index, block_offset = divmod(index, self.modulo + self.insert_length)
+        if block_offset < self.insert_length:
+            return dict(self.insert_factory(block_index * self.modulo)[block_offset])
+        return self.base_view.run(block_index * self.modulo + block_offset - self.insert_length)
+
+    def factor_names(self):
+        factor_names = self.base_view.factor_names()
+        if self.base_view.number_runs:
+            insert_block = self.insert_factory(0)
+            insert_names = insert_block.factor_names() if hasattr(insert_block, "factor_names") else \
+                [factor for insert_state in insert_block for factor in insert_state]
+            factor_names += [factor for factor in insert_names if factor not in factor_names]
+        return list(dict.fromkeys(factor_names))
+
+    def child_views(self):
+        child_views = [self.base_view]
+        if self.base_view.number_runs and isinstance(self.insert_factory(0), DesignView):
+            child_views.append(self.insert_factory(0))
+        return child_views
+
+    def __iter__(self):
+        for test_index, test_condition in enumerate(self.base_view):
+            if test_index % self.modulo == 0:
+                # the block is made inside the stage, so the time the caller takes between runs is not counted
+                with self._stage(self.insert_stage):
+                    insert_states = [dict(insert_state) for insert_state in self.insert_factory(test_index)]
+                yield from insert_states
+            yield test_condition
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a columnar_designs.Design. The base runs are taken as one range of
+        base_view, each distinct inserted block is converted once and the runs are put in order with one vectorized
+        take. An inserted block of more than SUB_DESIGN_LIMIT runs is not converted whole, only the range of its
+        runs that falls between start and stop."""
+        with self._stage(self.insert_stage):
+            return self._design_indices(index_array(range(start, stop)), base_range=True)
+
+    def design_take(self, run_indices):
+        """Returns the runs at run_indices as a columnar_designs.Design, decoded as in design_range except that
+        the base runs are taken at their indices, so a strided slice does not decode the base runs in between"""
+        with self._stage(self.insert_stage):
+            return self._design_indices(index_array(run_indices), base_range=False)
+
+    def _design_indices(self, indices, base_range):
+        from experimental_design.columnar_designs import Design
+        # indices of more than 63 bits are an object array, the rows into the pieces always fit in an int64
+        if self.number_runs > INDEX_LIMIT:
+            indices = indices.astype(object)
+        block_index, block_offset = indices // (self.modulo + self.insert_length), \
+                                    indices % (self.modulo + self.insert_length)
+        is_insert = (block_offset < self.insert_length).astype(bool)
+        run_rows = block_index * self.modulo + block_offset - self.insert_length
+        pieces = []
+        next_row = 0
+        if not is_insert.all() and base_range:
+            base_start = int(run_rows[~is_insert].min())
+            base_stop = int(run_rows[~is_insert].max()) + 1
+            pieces.append(self.base_view.design_range(base_start, base_stop))
+            run_rows = run_rows - base_start
+            next_row = base_stop - base_start
+        elif not is_insert.all():
+            pieces.append(self.base_view.design_take(run_rows[~is_insert]))
+            run_rows = run_rows.copy()
+            next_row = int((~is_insert).sum())
+            run_rows[~is_insert] = np.arange(next_row)
+        insert_blocks = []
+        insert_rows = {}
+        insert_starts = {}
+        for insert_block_index in np.unique(block_index[is_insert]).tolist():
+            insert_block = self.insert_factory(insert_block_index * self.modulo)
+            if self.insert_length > SUB_DESIGN_LIMIT:
+                block_offsets = block_offset[is_insert & (block_index == insert_block_index)]
+                first_offset, last_offset = int(block_offsets.min()), int(block_offsets.max()) + 1
+                if hasattr(insert_block, "design_range"):
+                    pieces.append(insert_block.design_range(first_offset, last_offset))
+                else:
+                    pieces.append(Design.from_runs(insert_block[first_offset:last_offset]))
+                insert_starts[insert_block_index] = next_row - first_offset
+                next_row += last_offset - first_offset
+                continue
+            if id(insert_block) not in insert_rows:
+                # keep a reference so the id is not reused
+                insert_blocks.append(insert_block)
+                insert_rows[id(insert_block)] = next_row
+                if hasattr(insert_block, "to_design"):
+                    pieces.append(insert_block.to_design())
+                else:
+                    pieces.append(Design.from_runs(insert_block))
+                next_row += self.insert_length
+            insert_starts[insert_block_index] = insert_rows[id(insert_block)]
+        if insert_starts:
+            insert_block_indices = np.array(sorted(insert_starts.keys()), dtype=block_index.dtype)
+            insert_start_rows = np.array([insert_starts[index] for index in insert_block_indices.tolist()],
+                                         dtype=indices.dtype)
+            run_rows[is_insert] = insert_start_rows[np.searchsorted(insert_block_indices, block_index[is_insert])] + \
+                                  block_offset[is_insert]
+        return Design.concatenate(pieces).take(run_rows.astype(np.int64))
+
+    def to_design(self):
+        """Returns the run sheet as a columnar_designs.Design"""
+        return self.design_range(0, self.number_runs)
+
+    def inserted_runs(self):
+        """Returns a boolean array that is True for the inserted (default or interleaved) runs"""
+        block_offset = np.arange(self.number_runs, dtype=np.int64) % (self.modulo + self.insert_length)
+        return block_offset < self.insert_length
+
+
+class NestedBlockView(DesignView):
+    """A lazy run sheet of nested blocks. Every run of stage_views[0] (the whole plots) is merged with every run of
+    stage_views[1] (the split plots), each of those with every run of stage_views[2] and so on, the later stages
+    taking precedence for shared factor names. The stage views are unrandomized sub-designs that are built once and
+    shared by all blocks, a run is the tuple of its stage design indices and each block is randomized with a
+    seeded order of its stage indices. Block b of stage s (b counts the runs of the earlier stages in run order)
+    uses random_seeds[s] + b, or random_seeds[s] for every block if shared_randomization[s] is True."""
+    def __init__(self, stage_views, randomized=True, random_seeds=None, randomization="shuffle",
+                 shared_randomization=None):
+        if randomization not in RANDOMIZATION_METHODS:
+            raise ValueError("randomization must be one of {0}, not {1!r}".format(RANDOMIZATION_METHODS,
+                                                                                 randomization))
+        self.stage_views = list(stage_views)
+        self.stage_sizes = [stage_view.number_runs for stage_view in self.stage_views]
+        self.number_runs = math.prod(self.stage_sizes)
+        # block_sizes[s] is the number of runs that follow one run of stage s
+        self.block_sizes = [math.prod(self.stage_sizes[stage_index + 1:])
+                            for stage_index in range(len(self.stage_views))]
+        self.randomized = randomized
+        self.randomization = randomization
+        if random_seeds is None:
+            random_seeds = NestedBlockView.consecutive_seeds(self.stage_views, RANDOM_SEED)
+        self.random_seeds = list(random_seeds)
+        if shared_randomization is None:
+            shared_randomization = [False] * len(self.stage_views)
+        self.shared_randomization = list(shared_randomization)
+        self._orders = {}
+        self._stage_designs = [None] * len(self.stage_views)
+
+    @staticmethod
+    def consecutive_seeds(stage_views, random_seed):
+        """Returns random_seeds that give every block of every stage its own seed, counting up from random_seed"""
+        random_seeds = []
+        number_blocks = 1
+        next_seed = random_seed
+        for stage_view in stage_views:
+            random_seeds.append(next_seed)
+            next_seed += number_blocks
+            number_blocks *= stage_view.number_runs
+        return random_seeds
+
+    def factor_names(self):
+        factor_names = []
+        for stage_view in self.stage_views:
+            factor_names += stage_view.factor_names()
+        return list(dict.fromkeys(factor_names))
+
+    def child_views(self):
+        return list(self.stage_views)
+
+    def reseeded(self, random_seeds):
+        """Returns a view of the same blocks with other random_seeds. The stage designs and the cache of block
+        orders are shared, not rebuilt."""
+        view = copy.copy(self)
+        view.random_seeds = list(random_seeds)
+        return view
+
+    def block_seed(self, stage_index, block_index):
+        """Returns the random seed of block block_index of stage stage_index"""
+        if self.shared_randomization[stage_index]:
+            return self.random_seeds[stage_index]
+        return self.random_seeds[stage_index] + block_index
+
+    def block_order(self, stage_index, block_index):
+        """Returns the run order of a block as a list or SeededPermutation of stage design indices, or None when
+        the design is not randomized. The orders are cached by seed."""
+        if not self.randomized:
+            return None
+        cache_key = (stage_index, self.block_seed(stage_index, block_index))
+        order = self._orders.get(cache_key)
+        if order is None:
+            if len(self._orders) >= ORDER_CACHE_SIZE:
+                self._orders.clear()
+            if self.randomization == "permutation":
+                order = SeededPermutation(self.stage_sizes[stage_index], random_seed=cache_key[1])
+            else:
+                order = list(range(self.stage_sizes[stage_index]))
+                random.Random(cache_key[1]).shuffle(order)
+            self._orders[cache_key] = order
+        return order
+
+    def block_indices(self, index):
+        """Returns the tuple of stage design indices of the run at index, one unrandomized index per stage"""
+        stage_design_indices = []
+        for stage_index, (stage_size, block_size) in enumerate(zip(self.stage_sizes, self.block_sizes)):
+            block_index, position = divmod(index // block_size, stage_size)
+            order = self.block_order(stage_index, block_index)
+            stage_design_indices.append(position if order is None else order[position])
+        return tuple(stage_design_indices)
+
+    def run(self, index):
+        new_row = {}
+        for stage_view, stage_design_index in zip(self.stage_views, self.block_indices(index)):
+            new_row.update(stage_view.run(stage_design_index))
+        return new_row
+
+    def __iter__(self):
+        if not self.stage_views:
+            return iter([{}])
+        stage_runs = [list(stage_view) for stage_view in self.stage_views]
+        return self._iterate_block(stage_runs, 0, 0, {})
+
+    def _iterate_block(self, stage_runs, stage_index, block_index, parent_row):
+        order = self.block_order(stage_index, block_index)
+        if order is None:
+            order = range(self.stage_sizes[stage_index])
+        last_stage = stage_index == len(self.stage_views) - 1
+        for position, stage_design_index in enumerate(order):
+            new_row = dict(parent_row)
+            new_row.update(stage_runs[stage_index][stage_design_index])
+            if last_stage:
+                yield new_row
+            else:
+                yield from self._iterate_block(stage_runs, stage_index + 1,
+                                               block_index * self.stage_sizes[stage_index] + position, new_row)
+
+    def stage_design(self, stage_index):
+        """Returns the columnar_designs.Design of a stage view, built on first use"""
+        if self._stage_designs[stage_index] is None:
+            self._stage_designs[stage_index] = self.stage_views[stage_index].to_design()
+        return self._stage_designs[stage_index]
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a columnar_designs.Design, each stage design is taken once with the
+        stage design indices of the runs"""
+        return self.design_take(index_array(range(start, stop)))
+
+    def design_take(self, run_indices):
+        """Returns the runs at run_indices as a columnar_designs.Design. Indices of more than 63 bits are divided
+        as Python integers, and a stage of more than SUB_DESIGN_LIMIT runs is decoded from its view at the stage
+        design indices instead of being built whole."""
+        from experimental_design.columnar_designs import Design
+        run_indices = index_array(run_indices)
+        if not self.stage_views:
+            return Design({}, {}, number_runs=len(run_indices))
+        if self.number_runs > INDEX_LIMIT:
+            run_indices = run_indices.astype(object)
+        design = None
+        for stage_index, (stage_size, block_size) in enumerate(zip(self.stage_sizes, self.block_sizes)):
+            block_indices = run_indices // block_size
+            block_indices, positions = block_indices // stage_size, index_array(block_indices % stage_size)
+            if self.randomized:
+                with self._stage("shuffle"):
+                    if self.shared_randomization[stage_index]:
+                        block_indices = np.zeros(len(block_indices), dtype=np.int64)
+                    # the runs of each block are permuted together, one block after the other
+                    used_blocks, block_rows = np.unique(block_indices, return_inverse=True)
+                    block_rows = block_rows.reshape(-1)
+                    by_block = np.argsort(block_rows, kind="stable")
+                    block_bounds = np.searchsorted(block_rows[by_block], np.arange(len(used_blocks) + 1))
+                    positions = positions.astype(object) if stage_size > INDEX_LIMIT else positions.copy()
+                    for block_row, block_index in enumerate(used_blocks.tolist()):
+                        rows = by_block[block_bounds[block_row]:block_bounds[block_row + 1]]
+                        order = self.block_order(stage_index, block_index)
+                        if isinstance(order, SeededPermutation):
+                            positions[rows] = order.permute_array(positions[rows])
+                        else:
+                            positions[rows] = [order[position] for position in positions[rows].tolist()]
+            with self._stage("product"):
+                if stage_size > SUB_DESIGN_LIMIT:
+                    stage_design = self.stage_views[stage_index].design_take(positions)
+                else:
+                    stage_design = self.stage_design(stage_index).take(positions)
+                design = stage_design if design is None else design.combine_columns(stage_design)
+        return design
+
+    def to_design(self):
+        """Returns the run sheet as a columnar_designs.Design"""
+        return self.design_range(0, self.number_runs)
 
 #-----------------------------------------------------------------------------
 # Module Scripts
 def test_fully_factorial():
     """Tests the fully_factorial design"""
+    import yaml
+    import pandas as pd
     test_design = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}, 'two': {0: 'FAST', 1: 'SLOW'}, 'three': {0: 'ON'}}
     print("*"*80)
     print("Testing the fully_factorial function")
@@ -246,6 +1065,8 @@ def test_fully_factorial():
 
 def test_fully_factorial_default():
     """Tests the fully_factorial_default design"""
+    import yaml
+    import pandas as pd
     test_design = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}, 'two': {0: 'FAST', 1: 'SLOW'}, 'three': {0: 'ON'}}
     default = {'one': {-1: 'default'}, 'two': {-1: 'MEDIUM'}, 'three': {-1: 'OFF'}}
     print("*"*80)
@@ -267,6 +1088,8 @@ def test_fully_factorial_default():
 
 def test_fully_factorial_split_plot():
     """Tests the fully_factorial_split_plot_default design"""
+    import yaml
+    import pandas as pd
     test_design = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}, 'two': {0: 'FAST', 1: 'SLOW'}, 'three': {0: 'ON'}}
     wp = {'whole_plot_1': {-1: "in my shoe", 0: 'In my Head'}, 'whole_plot_2': {0: 'WP OFF', 1: "WP ON"}}
     print("*"*80)
@@ -297,6 +1120,8 @@ def test_fully_factorial_split_plot():
 
 def test_fully_factorial_split_plot_default():
     """Tests the fully_factorial_split_plot_default design"""
+    import yaml
+    import pandas as pd
 
     test_design = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}, 'two': {0: 'FAST', 1: 'SLOW'}, 'three': {0: 'ON'}}
     wp = {'whole_plot_1': {-1: "in my shoe", 0: 'In my Head'}, 'whole_plot_2': {0: 'WP OFF', 1: "WP ON"}}
@@ -333,6 +1158,8 @@ def test_fully_factorial_split_plot_default():
 
 def test_fully_factorial_split_plot_interleave():
     """Tests the fully_factorial_split_plot_default design"""
+    import yaml
+    import pandas as pd
     sp = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}, 'two': {0: 'FAST', 1: 'SLOW'}, 'three': {0: 'ON'}}
     wp = {'whole_plot_1': {-1: "in my shoe", 0: 'In my Head'}, 'whole_plot_2': {0: 'WP OFF', 1: "WP ON"}}
     wp_2 = {'whole_plot_1': {3: "default"}, 'whole_plot_2': {0: 'wp_2 default'}}
@@ -372,6 +1199,57 @@ def test_fully_factorial_split_plot_interleave():
     print(random_test_condtions)
     print("*" * 80)
 
+def test_fully_factorial_nested():
+    """Tests the fully_factorial_nested and fully_factorial_strip_plot designs"""
+    import pandas as pd
+    wp = {'whole_plot_1': {-1: "in my shoe", 0: 'In my Head'}}
+    sp = {'two': {0: 'FAST', 1: 'SLOW'}}
+    ssp = {'one': {0: 'LOW', 1: 'HIGH', 2: 'zest'}}
+    print("*"*80)
+    print("Testing the fully_factorial_nested function with a split-split plot")
+    print(pd.DataFrame(fully_factorial_nested([wp, sp, ssp], randomized=True)))
+    print("*" * 80)
+    print("Testing the fully_factorial_strip_plot function, every row has the same column order")
+    print(pd.DataFrame(fully_factorial_strip_plot(sp, ssp, randomized=True)))
+    print("*" * 80)
+
+def test_lazy_fully_factorial(n_factors=6000):
+    """Tests the lazy output of fully_factorial_default on a design that is too large to build as a list"""
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors + 1)}
+    default = {f"F{i}": {0: "Default"} for i in range(1, n_factors + 1)}
+    print("*"*80)
+    print("Testing the lazy output of fully_factorial_default")
+    lazy_design = fully_factorial_default(design_dictionary=design, default_state=default,
+                                          randomized=False, run_values="values", output="lazy")
+    print(f"The design has {n_factors} factors and a run count with {len(str(lazy_design.number_runs))} digits")
+    print("The first 5 runs of the last 5 factors are:")
+    for run in lazy_design[0:5]:
+        print({factor: run[factor] for factor in list(run.keys())[-5:]})
+    start = 2**70 + 1
+    chunk = lazy_design[start:start + 4].to_design()
+    print(f"Runs 2**70 + 1 to 2**70 + 4 as a Design match the lazy runs: "
+          f"{chunk.to_list() == [lazy_design[index] for index in range(start, start + 4)]}")
+    split_plot = fully_factorial_split_plot({"temperature": {0: 20, 1: 40}}, design, output="lazy",
+                                            randomization="permutation")
+    chunk = split_plot[start:start + 4].to_design()
+    print(f"The same runs of a permuted split plot match: "
+          f"{chunk.to_list() == [split_plot[index] for index in range(start, start + 4)]}")
+    print("*" * 80)
+
+def test_permutation_randomization(n_factors=40, start_run=10**9):
+    """Tests randomization="permutation" by resuming a randomized campaign at start_run"""
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors + 1)}
+    print("*"*80)
+    print("Testing randomization='permutation' for fully_factorial")
+    lazy_design = fully_factorial(design, randomized=True, random_seed=42, output="lazy",
+                                  randomization="permutation")
+    print(f"The design has {lazy_design.number_runs} runs, resuming at run {start_run}")
+    for run_index in range(start_run, start_run + 3):
+        design_index = lazy_design.design_index(run_index)
+        print(f"Run {run_index} is design index {design_index}, "
+              f"which maps back to run {lazy_design.run_index(design_index)}")
+    print("*" * 80)
+
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
@@ -379,4 +1257,7 @@ if __name__ == '__main__':
     test_fully_factorial_default()
     test_fully_factorial_split_plot()
     test_fully_factorial_split_plot_interleave()
+    test_fully_factorial_nested()
+    test_lazy_fully_factorial()
+    test_permutation_randomization()
  
\ No newline at end of file
@@ -0,0 +1,450 @@
+#-----------------------------------------------------------------------------
+# Name:        fractional_factorials
+# Purpose:    To make two level fractional factorial (2^(k-p)) designs.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""fractional_factorials makes two level fractional factorial (2^(k-p)) designs from the same design dictionaries
+that fully_factorial uses. A design is given by generator strings such as "E=ABCD" (or "F5=F1*F2*F3" with factor
+names), or by a target resolution and/or number of runs, in which case minimum aberration generators are found
+with a pruned beam search. Runs are built with bitwise operations on the run index, and the defining relation,
+word length pattern and alias structure are computed with bitmask arithmetic (bit i of a word is factor i).
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import math
+import itertools
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (FullyFactorialView, DesignView, SeededPermutation,
+                                                      RANDOM_SEED)
+
+#-----------------------------------------------------------------------------
+# Module Constants
+FACTOR_LETTERS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+"Letters used to label factors in generators and alias tables, I is left out because it is the identity"
+BEAM_WIDTH = 8
+"Number of partial designs kept at each step of the minimum aberration search"
+MAXIMUM_FACTORS = 62
+"Largest number of factors, words are stored as bitmasks in 64 bit integers"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def popcount(values):
+    """Returns the number of set bits of each element of an integer array"""
+    values = np.asarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((values * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def factor_labels(factors):
+    """Returns the label of each factor, the letters A, B, C ... (without I) when there are 25 factors or less and
+    the factor names otherwise."""
+    factors = list(factors)
+    if len(factors) <= len(FACTOR_LETTERS):
+        return list(FACTOR_LETTERS[:len(factors)])
+    return [str(factor) for factor in factors]
+
+
+def word_label(mask, labels):
+    """Returns the label of the effect or word with bitmask mask, for example "ABD" or "F1*F2*F4" """
+    names = [labels[factor_index] for factor_index in range(len(labels)) if (mask >> factor_index) & 1]
+    if all(name in FACTOR_LETTERS and len(name) == 1 for name in names):
+        return "".join(names)
+    return "*".join(names)
+
+
+def minimum_runs_bound(number_factors, resolution):
+    """Returns the smallest number of base factors m for which a 2^(k-p) design with 2^m runs and the given
+    resolution can exist: 2^m > k for resolution III, 2^m >= 2k for IV and 2^m > 1 + k + k(k-1)/2 for V and
+    higher, where every two factor interaction must be estimable."""
+    if resolution <= 3:
+        required_runs = number_factors + 1
+    elif resolution == 4:
+        required_runs = 2 * number_factors
+    else:
+        required_runs = 1 + number_factors + number_factors * (number_factors - 1) // 2
+    return max(1, math.ceil(math.log2(required_runs)))
+
+
+def candidate_columns(number_base, minimum_resolution, number_factors):
+    """Returns the lists of candidate generator columns (bitmasks over the base factors) to search, in order.
+    Every interaction of two or more base factors is a candidate, highest order first. For resolution IV the odd
+    order interactions are also tried on their own, since any set of them gives resolution IV, and they are the
+    only choice when k > 5N/16 (every such resolution IV design is a projection of them)."""
+    all_columns = sorted([mask for mask in range(1, 2 ** number_base) if bin(mask).count("1") >= 2],
+                         key=lambda mask: (-bin(mask).count("1"), mask))
+    odd_columns = [mask for mask in all_columns if bin(mask).count("1") % 2 == 1]
+    if minimum_resolution != 4:
+        return [all_columns]
+    if 16 * number_factors > 5 * 2 ** number_base:
+        return [odd_columns]
+    return [all_columns, odd_columns]
+
+
+def minimum_aberration_generators(factors, number_runs=None, resolution=None, beam_width=BEAM_WIDTH,
+                                  aberration_depth=None):
+    """Given factors (a list of factor names or the number of factors) returns a list of generator strings for a
+    minimum aberration 2^(k-p) design. If number_runs is None the smallest design with at least resolution
+    (default 3) is found. If number_runs is given without a resolution the highest resolution (up to V) that fits
+    is used. The search adds one generator column at a time, scores every candidate column at once with
+    vectorized popcounts and keeps the beam_width best partial designs, comparing the word length pattern
+    A_resolution ... A_(resolution+aberration_depth). Only combinations of at most that many generators can make
+    such short words, so the full defining relation is never enumerated. Raises a ValueError if no design with the
+    requested resolution is found."""
+    if isinstance(factors, int):
+        factors = factor_labels(range(factors))
+    factors = list(factors)
+    labels = factor_labels(factors)
+    number_factors = len(factors)
+    if aberration_depth is None:
+        aberration_depth = 2 if resolution is None else 1
+    if number_runs is not None:
+        number_base = int(number_runs).bit_length() - 1
+        if 2 ** number_base != number_runs:
+            raise ValueError("number_runs must be a power of 2, not {0}".format(number_runs))
+        if resolution is None:
+            resolutions = [target for target in (5, 4, 3) if minimum_runs_bound(number_factors, target) <= number_base]
+        else:
+            resolutions = [resolution]
+        searches = [(number_base, target) for target in resolutions]
+    else:
+        minimum_resolution = 3 if resolution is None else resolution
+        searches = [(number_base, minimum_resolution)
+                    for number_base in range(minimum_runs_bound(number_factors, minimum_resolution),
+                                             number_factors + 1)]
+    for number_base, minimum_resolution in searches:
+        if number_base >= number_factors:
+            return []
+        for candidates in candidate_columns(number_base, minimum_resolution, number_factors):
+            columns = _beam_search(number_factors, number_base, minimum_resolution,
+                                   minimum_resolution + aberration_depth, beam_width, candidates)
+            if columns is not None:
+                generators = []
+                for generated_index, column in enumerate(columns):
+                    rhs = word_label(column, labels[:number_base])
+                    generators.append("{0}={1}".format(labels[number_base + generated_index], rhs))
+                return generators
+    raise ValueError("No 2^(k-p) design with {0} factors, resolution >= {1} and {2} runs was found".format(
+        number_factors, 3 if resolution is None else resolution,
+        number_runs if number_runs is not None else "any number of"))
+
+
+def _beam_search(number_factors, number_base, minimum_resolution, maximum_length, beam_width, candidates):
+    """Returns the list of base factor bitmasks (one per generated factor) of the best design found among the
+    candidate columns, or None. Each partial design keeps a bitmap of the columns it forbids: a column d is
+    forbidden when some combination (B, G) of G chosen generators with base part B makes a word with d shorter
+    than minimum_resolution, that is when d is within Hamming distance minimum_resolution - G - 2 of B. Partial
+    designs with fewer allowed columns left than generators still to choose are dropped."""
+    number_generated = number_factors - number_base
+    if len(candidates) < number_generated:
+        return None
+    number_columns = 2 ** number_base
+    candidates = np.array(candidates, dtype=np.int64)
+    # position of each column in the candidate order, -1 for columns that are not candidates
+    candidate_position = np.full(number_columns, -1, dtype=np.int64)
+    candidate_position[candidates] = np.arange(len(candidates))
+    all_columns = np.arange(number_columns, dtype=np.int64)
+    column_weights = popcount(all_columns)
+    balls = [all_columns[column_weights <= radius] for radius in range(minimum_resolution)]
+    lengths_tracked = np.arange(minimum_resolution, maximum_length + 1)
+    initial_forbidden = column_weights <= minimum_resolution - 2
+    # a state is (word length pattern, chosen candidate positions, combination masks, combination sizes,
+    # forbidden column bitmap)
+    beam = [(np.zeros(len(lengths_tracked), dtype=np.int64), [], np.zeros(1, dtype=np.int64),
+             np.zeros(1, dtype=np.int64), initial_forbidden)]
+    for step in range(number_generated):
+        remaining = number_generated - step - 1
+        proposals = []
+        for state_index, (pattern, chosen, combination_masks, combination_sizes, forbidden) in enumerate(beam):
+            start = chosen[-1] + 1 if chosen else 0
+            stop = len(candidates) - remaining
+            offsets = np.flatnonzero(~forbidden[candidates[start:stop]]) + start
+            if len(offsets) == 0:
+                continue
+            candidate_masks = candidates[offsets]
+            word_lengths = popcount(combination_masks[:, None] ^ candidate_masks[None, :]) + \
+                combination_sizes[:, None] + 1
+            counts = (word_lengths[:, :, None] == lengths_tracked[None, None, :]).sum(axis=0)
+            # columns newly forbidden by each candidate, from the combinations that include it
+            new_points = [(combination_mask ^ candidate_masks[:, None]) ^
+                          balls[minimum_resolution - combination_size - 3][None, :]
+                          for combination_mask, combination_size in zip(combination_masks, combination_sizes)
+                          if combination_size <= minimum_resolution - 3]
+            allowed_later = (~forbidden) & (candidate_position >= 0)
+            number_allowed = np.array([np.count_nonzero(allowed_later[candidates[offset + 1:]])
+                                       for offset in offsets])
+            if new_points:
+                new_points = np.concatenate(new_points, axis=1)
+                newly_forbidden = allowed_later[new_points] & (candidate_position[new_points] > offsets[:, None])
+                new_points = np.where(newly_forbidden, new_points, -1)
+                new_points.sort(axis=1)
+                distinct = (np.diff(new_points, axis=1) != 0) & (new_points[:, 1:] >= 0)
+                number_allowed -= distinct.sum(axis=1) + (new_points[:, 0] >= 0)
+            for position in np.flatnonzero(number_allowed >= remaining):
+                proposals.append((tuple(pattern + counts[position]), -int(number_allowed[position]),
+                                  state_index, int(offsets[position])))
+        if not proposals:
+            return None
+        proposals.sort()
+        new_beam = []
+        for new_pattern, number_allowed, state_index, candidate_index in proposals[:beam_width]:
+            pattern, chosen, combination_masks, combination_sizes, forbidden = beam[state_index]
+            candidate_mask = candidates[candidate_index]
+            forbidden = forbidden.copy()
+            for combination_mask, combination_size in zip(combination_masks, combination_sizes):
+                if combination_size <= minimum_resolution - 3:
+                    forbidden[(combination_mask ^ candidate_mask) ^
+                              balls[minimum_resolution - combination_size - 3]] = True
+            extendable = combination_sizes <= maximum_length - 2
+            new_beam.append((np.array(new_pattern, dtype=np.int64), chosen + [candidate_index],
+                             np.concatenate([combination_masks, combination_masks[extendable] ^ candidate_mask]),
+                             np.concatenate([combination_sizes, combination_sizes[extendable] + 1]),
+                             forbidden))
+        beam = new_beam
+    return [int(candidates[candidate_index]) for candidate_index in beam[0][1]]
+
+
+def fractional_factorial(design_dictionary, generators=None, resolution=None, number_runs=None,
+                         randomized=True, run_values="values", random_seed=RANDOM_SEED, output="list",
+                         randomization="shuffle", profiler=None):
+    """Given a design_dictionary of two level factors in the form {'factor_name_1':{low_level:low_value,
+    high_level:high_value}, ...} returns a 2^(k-p) fractional factorial run sheet. The fraction is given by
+    generators, a list like ["E=ABCD", "F=-ABC"] using factor names or the letters of factor_labels, or is found
+    as a minimum aberration design from resolution and/or number_runs. Optional parameters randomized, run_values,
+    random_seed, output, randomization and profiler are the same as fully_factorial. The alias structure is
+    available from the lazy output, fractional_factorial(..., output="lazy").structure.alias_structure()."""
+    from experimental_design.experimental_designs import _design_output
+    if generators is None:
+        generators = minimum_aberration_generators(list(design_dictionary.keys()), number_runs=number_runs,
+                                                   resolution=resolution)
+    test_conditions = FractionalFactorialView(design_dictionary, generators,
+                                              randomized=randomized,
+                                              run_values=run_values,
+                                              random_seed=random_seed,
+                                              randomization=randomization)
+    return _design_output(test_conditions, output, profiler)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class FractionalFactorialStructure(object):
+    """The generators of a 2^(k-p) design and everything derived from them. Each generated factor is stored as
+    (factor_index, base_mask, sign), where base_mask has bit i set for every factor i in its generator and sign is
+    +1 or -1. Words and effects are bitmasks over all factors."""
+    def __init__(self, factors, generators):
+        self.factors = list(factors)
+        if len(self.factors) > MAXIMUM_FACTORS:
+            raise ValueError("At most {0} factors are supported".format(MAXIMUM_FACTORS))
+        self.labels = factor_labels(self.factors)
+        self.generated = {}
+        for generator in generators:
+            factor_index, base_mask, sign = self.parse_generator(generator)
+            if factor_index in self.generated:
+                raise ValueError("{0} is generated twice".format(self.factors[factor_index]))
+            self.generated[factor_index] = (base_mask, sign)
+        self.base_factors = [factor_index for factor_index in range(len(self.factors))
+                             if factor_index not in self.generated]
+        for factor_index, (base_mask, sign) in self.generated.items():
+            if any((base_mask >> generated_index) & 1 for generated_index in self.generated.keys()):
+                raise ValueError("The generator of {0} uses a generated factor, write it in terms of the base "
+                                 "factors".format(self.factors[factor_index]))
+        self.number_runs = 2 ** len(self.base_factors)
+
+    def factor_index(self, token):
+        """Returns the index of the factor named or labeled token"""
+        if token in self.factors:
+            return self.factors.index(token)
+        if token in self.labels:
+            return self.labels.index(token)
+        raise ValueError("{0!r} is not a factor name or label".format(token))
+
+    def parse_generator(self, generator):
+        """Returns (factor_index, base_mask, sign) for a generator string like "E=ABCD", "E=-ABCD" or
+        "F5=F1*F2*F3" """
+        lhs, rhs = [part.strip() for part in generator.split("=")]
+        sign = 1
+        if rhs.startswith("-") or rhs.startswith("+"):
+            sign = -1 if rhs[0] == "-" else 1
+            rhs = rhs[1:].strip()
+        if "*" in rhs:
+            tokens = [token.strip() for token in rhs.split("*")]
+        elif rhs in self.factors:
+            tokens = [rhs]
+        else:
+            tokens = list(rhs)
+        base_mask = 0
+        for token in tokens:
+            base_mask ^= 1 << self.factor_index(token)
+        factor_index = self.factor_index(lhs)
+        if bin(base_mask).count("1") < 1 or (base_mask >> factor_index) & 1:
+            raise ValueError("{0!r} is not a valid generator".format(generator))
+        return factor_index, base_mask, sign
+
+    def generator_strings(self):
+        """Returns the generators as strings like "E=ABCD" """
+        return ["{0}={1}{2}".format(self.labels[factor_index], "-" if sign < 0 else "",
+                                    word_label(base_mask, self.labels))
+                for factor_index, (base_mask, sign) in self.generated.items()]
+
+    def defining_words(self, max_generators=None):
+        """Returns (masks, signs) for the words of the defining relation, made from at most max_generators
+        generators (all of them if None). Every word made of g generators has length at least g, so
+        max_generators=L gives every word of length L or less."""
+        masks = np.zeros(1, dtype=np.uint64)
+        signs = np.ones(1, dtype=np.int8)
+        sizes = np.zeros(1, dtype=np.int64)
+        for factor_index, (base_mask, sign) in self.generated.items():
+            word = np.uint64(base_mask | (1 << factor_index))
+            extendable = sizes < max_generators if max_generators is not None else np.ones(len(sizes), dtype=bool)
+            masks = np.concatenate([masks, masks[extendable] ^ word])
+            signs = np.concatenate([signs, signs[extendable] * np.int8(sign)])
+            sizes = np.concatenate([sizes, sizes[extendable] + 1])
+        return masks[1:], signs[1:]
+
+    def defining_relation(self):
+        """Returns the defining relation as a string like "I = ABCE = ..." """
+        masks, signs = self.defining_words()
+        order = np.lexsort([masks, popcount(masks)])
+        words = ["{0}{1}".format("-" if signs[index] < 0 else "", word_label(int(masks[index]), self.labels))
+                 for index in order]
+        return " = ".join(["I"] + words)
+
+    def word_length_pattern(self, max_length=None):
+        """Returns [A_1, A_2, ..., A_max_length], the number of words of each length in the defining relation.
+        max_length defaults to the number of factors."""
+        if max_length is None:
+            max_length = len(self.factors)
+        masks, signs = self.defining_words(max_generators=max_length)
+        counts = np.bincount(popcount(masks), minlength=max_length + 1)
+        return [int(count) for count in counts[1:max_length + 1]]
+
+    def resolution(self):
+        """Returns the resolution, the length of the shortest word (the number of factors + 1 for a full
+        factorial)"""
+        for length in range(1, len(self.factors) + 1):
+            # every word of this length or shorter is made of at most length generators
+            masks, signs = self.defining_words(max_generators=length)
+            word_lengths = popcount(masks)
+            if (word_lengths <= length).any():
+                return int(word_lengths.min())
+        return len(self.factors) + 1
+
+    def alias_structure(self, max_order=2):
+        """Returns {effect_label: [aliased effect labels]} for every effect of order max_order or less, listing
+        the aliases of order max_order or less. A leading "-" marks an alias with the opposite sign."""
+        masks, signs = self.defining_words(max_generators=2 * max_order)
+        short_words = popcount(masks) <= 2 * max_order
+        masks, signs = masks[short_words], signs[short_words]
+        effects = [sum(1 << factor_index for factor_index in combination)
+                   for order in range(1, max_order + 1)
+                   for combination in itertools.combinations(range(len(self.factors)), order)]
+        aliases = {}
+        for effect in effects:
+            aliased = masks ^ np.uint64(effect)
+            keep = popcount(aliased) <= max_order
+            aliases[word_label(effect, self.labels)] = ["{0}{1}".format("-" if sign < 0 else "",
+                                                                        word_label(int(mask), self.labels))
+                                                        for mask, sign in zip(aliased[keep], signs[keep])]
+        return aliases
+
+    def __repr__(self):
+        return "FractionalFactorialStructure(factors={0}, generators={1})".format(self.factors,
+                                                                                  self.generator_strings())
+
+
+class FractionalFactorialView(FullyFactorialView):
+    """A lazy 2^(k-p) run sheet. Bit j (counting from the most significant) of the design index is the level of
+    base factor j, so the base factors follow the fully_factorial order, and each generated factor is the parity
+    of its generator bits. Randomization works as in FullyFactorialView."""
+    def __init__(self, design_dictionary, generators, randomized=True, run_values="values",
+                 random_seed=RANDOM_SEED, randomization="shuffle"):
+        FullyFactorialView.__init__(self, design_dictionary, randomized=randomized, run_values=run_values,
+                                    random_seed=random_seed, randomization=randomization)
+        for factor, radix in zip(self.factors, self.radices):
+            if radix != 2:
+                raise ValueError("Fractional factorials need two level factors, {0} has {1}".format(factor, radix))
+        if not isinstance(generators, FractionalFactorialStructure):
+            generators = FractionalFactorialStructure(self.factors, generators)
+        self.structure = generators
+        self.number_runs = self.structure.number_runs
+        number_base = len(self.structure.base_factors)
+        # the bit of the design index that holds each base factor
+        self.index_bits = {factor_index: number_base - 1 - base_position
+                           for base_position, factor_index in enumerate(self.structure.base_factors)}
+        self.generator_index_masks = {}
+        for factor_index, (base_mask, sign) in self.structure.generated.items():
+            index_mask = 0
+            for base_index in range(len(self.factors)):
+                if (base_mask >> base_index) & 1:
+                    index_mask |= 1 << self.index_bits[base_index]
+            # in -1/+1 coding the product is +1 when an even number of the generator factors are low
+            offset = (bin(base_mask).count("1") + (1 if sign < 0 else 0) + 1) % 2
+            self.generator_index_masks[factor_index] = (index_mask, offset)
+        if self.permutation is not None:
+            self.permutation = SeededPermutation(self.number_runs, random_seed=random_seed)
+
+    def decode(self, design_index):
+        """Returns the list of level positions (0 low, 1 high) for the run at design_index."""
+        positions = [0] * len(self.factors)
+        for factor_index, bit in self.index_bits.items():
+            positions[factor_index] = (design_index >> bit) & 1
+        for factor_index, (index_mask, offset) in self.generator_index_masks.items():
+            positions[factor_index] = (bin(design_index & index_mask).count("1") + offset) % 2
+        return positions
+
+    def __iter__(self):
+        if self.randomized:
+            return FullyFactorialView.__iter__(self)
+        return DesignView.__iter__(self)
+
+    def decode_array(self, design_indices):
+        """Returns {factor_name: code array} for an array of design indices, found with vectorized bit
+        operations"""
+        design_indices = np.asarray(design_indices).astype(np.uint64)
+        codes = {}
+        for factor_index, bit in self.index_bits.items():
+            codes[self.factors[factor_index]] = (design_indices >> np.uint64(bit)) & np.uint64(1)
+        for factor_index, (index_mask, offset) in self.generator_index_masks.items():
+            codes[self.factors[factor_index]] = (popcount(design_indices & np.uint64(index_mask)) + offset) % 2
+        return {factor: codes[factor] for factor in self.factors}
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_fractional_factorial():
+    """Tests the fractional_factorial function with generators and with a target resolution"""
+    from experimental_design.design_planning import GenerationProfiler
+    design = {factor: {"-": -1, "+": 1} for factor in ["temperature", "humidity", "pressure", "flow", "voltage"]}
+    print("*"*80)
+    print("Testing the fractional_factorial function")
+    lazy_design = fractional_factorial(design, generators=["E=ABCD"], randomized=False, output="lazy")
+    print(f"The generators are {lazy_design.structure.generator_strings()}, "
+          f"the defining relation is {lazy_design.structure.defining_relation()}")
+    print(f"The resolution is {lazy_design.structure.resolution()}")
+    for run in lazy_design[0:4]:
+        print(run)
+    print(f"The keys of the first run are {fractional_factorial(design, ['E=ABCD'], randomized=False, run_values='keys')[0]}")
+    profiler = GenerationProfiler()
+    fractional_factorial(design, generators=["E=ABCD"], output="design", profiler=profiler)
+    print(f"The profiled fractional factorial timed the stages {sorted(profiler.stage_times)}")
+    print("*" * 80)
+    many_factors = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 31)}
+    generators = minimum_aberration_generators(list(many_factors.keys()), resolution=4)
+    structure = FractionalFactorialStructure(list(many_factors.keys()), generators)
+    print(f"A resolution IV design for 30 factors needs {structure.number_runs} runs, "
+          f"its word length pattern starts {structure.word_length_pattern(6)}")
+    print(f"The aliases of F1*F2 are {structure.alias_structure(max_order=2)['F1*F2']}")
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_fractional_factorial()
@@ -0,0 +1,437 @@
+#-----------------------------------------------------------------------------
+# Name:        optimal_designs
+# Purpose:    To make D- and I-optimal designs with a given number of runs.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""optimal_designs chooses number_runs runs from the candidate space of a design dictionary (optionally without the
+runs disallowed by exclusions in the filter_rows form) that maximize the determinant of the information matrix
+(D-optimal) or minimize the average prediction variance (I-optimal) of a main effects, two factor interaction or
+quadratic model. The search is a coordinate exchange (or a Fedorov exchange over the enumerated candidates), every
+trial swap is scored with Sherman-Morrison updates of the inverse information matrix and random starts run in a
+process pool, each with its own seed spawned from random_seed, so the result does not depend on the number of
+processes.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import itertools
+import numbers
+import contextlib
+import concurrent.futures
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (FullyFactorialView, DesignView, SeededPermutation,
+                                                      RANDOM_SEED, _design_output)
+from experimental_design.columnar_designs import unique_levels
+from experimental_design.design_constraints import ExclusionConstraints, ConstrainedFactorialView
+
+#-----------------------------------------------------------------------------
+# Module Constants
+MODEL_TYPES = ["main", "interactions", "quadratic"]
+"Models an optimal design can be made for, interactions adds all two factor interactions and quadratic adds the " \
+    "squares of numeric factors with three or more levels to that"
+OPTIMALITY_CRITERIA = ["D", "I"]
+"D maximizes det(X'X), I minimizes the prediction variance averaged over the candidate space"
+EXCHANGE_ALGORITHMS = ["coordinate", "fedorov"]
+"coordinate changes one factor of one run at a time, fedorov swaps whole runs with the enumerated candidates"
+NUMBER_STARTS = 8
+"Number of random starts of the exchange search"
+MAXIMUM_PASSES = 100
+"Largest number of passes over the runs in one start of the exchange search"
+MAXIMUM_CANDIDATES = 2 ** 20
+"Largest candidate space the fedorov algorithm enumerates"
+RIDGE = 1e-6
+"Added to the diagonal of the information matrix so a singular starting design can still be improved"
+LEVERAGE_TOLERANCE = 1e-12
+"A run whose leverage is within this of 1 is the only run in some direction and is left in place for that pass"
+EXCHANGE_TOLERANCE = 1e-9
+"Smallest relative improvement that counts as a better run"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def _factor_coding(factor, values):
+    """Returns [(label, vector over the levels), ...], the model columns of a factor's main effect. A numeric
+    factor is one linear column scaled to [-1, 1], any other factor gets effects coded columns, one less than its
+    number of distinct levels, a two level factor is -1 at its first level. A factor with a single level has no
+    columns."""
+    levels, code_map = unique_levels(values)
+    if len(levels) < 2:
+        return []
+    if all(isinstance(value, numbers.Real) and not isinstance(value, bool) for value in levels):
+        numeric_values = np.array(values, dtype=float)
+        center = (numeric_values.max() + numeric_values.min()) / 2
+        half_range = (numeric_values.max() - numeric_values.min()) / 2
+        return [(str(factor), (numeric_values - center) / half_range)]
+    if len(levels) == 2:
+        return [(str(factor), np.where(code_map == 0, -1.0, 1.0))]
+    last_level = len(levels) - 1
+    return [("{0}[{1}]".format(factor, levels[level]),
+             np.where(code_map == level, 1.0, np.where(code_map == last_level, -1.0, 0.0)))
+            for level in range(last_level)]
+
+
+def optimal_design(design_dictionary, number_runs, model="main", criterion="D", exclusions=None,
+                   algorithm="coordinate", number_starts=NUMBER_STARTS, processes=None, randomized=True,
+                   run_values="values", random_seed=RANDOM_SEED, output="list", randomization="shuffle",
+                   profiler=None):
+    """Given a design_dictionary in the form {'factor_name_1':{factor_level_1:factor_level_value_1}, ...} returns a
+    run sheet of number_runs runs that is D-optimal (criterion="D") or I-optimal (criterion="I") for model, one of
+    MODEL_TYPES. exclusions in the filter_rows form remove runs from the candidate space. algorithm="coordinate"
+    never enumerates the candidate space, algorithm="fedorov" does and is limited to MAXIMUM_CANDIDATES runs.
+    number_starts random starts are spread over processes worker processes (the number of CPUs if None, 1 runs
+    them in this process) and the best design is kept. Optional parameters randomized, run_values, random_seed,
+    output, randomization and profiler are the same as fully_factorial, random_seed also seeds the starts and the
+    profiler also times the "exchange search" stage. The lazy output has the model and the criterion value,
+    optimal_design(..., output="lazy").d_efficiency()."""
+    from experimental_design.design_planning import as_profiler
+    profiler = as_profiler(profiler)
+    search = ExchangeSearch(design_dictionary, number_runs, model=model, criterion=criterion,
+                            exclusions=exclusions, algorithm=algorithm, run_values=run_values)
+    start_seeds = np.random.SeedSequence(random_seed).spawn(number_starts)
+    if processes is None:
+        processes = min(number_starts, os.cpu_count() or 1)
+    with profiler.stage("exchange search") if profiler is not None else contextlib.nullcontext():
+        if processes <= 1:
+            results = [search.run(start_seed) for start_seed in start_seeds]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(search.run, start_seeds))
+    # ties go to the earliest start, so the answer is the same for any number of processes
+    best_start = min(range(len(results)), key=lambda start_index: (results[start_index][0], start_index))
+    if results[best_start][0] == float("inf"):
+        raise ValueError("The {0} model can not be estimated from the allowed runs".format(model))
+    test_conditions = OptimalDesignView(design_dictionary, results[best_start][1],
+                                        model=search.model,
+                                        criterion=criterion,
+                                        randomized=randomized,
+                                        run_values=run_values,
+                                        random_seed=random_seed,
+                                        randomization=randomization)
+    return _design_output(test_conditions, output, profiler)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class DesignModel(object):
+    """A linear model over the factors of a design. Every model column is a product of one vector over the levels
+    of each factor it uses, so level_tables[factor_index] is a (number of levels, number of parameters) array that
+    is 1 in the columns that do not use the factor, and the model matrix of runs with level codes C is the product
+    of level_tables[j][C[:, j]] over the factors j."""
+    def __init__(self, factors, factor_values, model="main"):
+        if model not in MODEL_TYPES:
+            raise ValueError("model must be one of {0}, not {1!r}".format(MODEL_TYPES, model))
+        self.factors = list(factors)
+        self.factor_values = [list(values) for values in factor_values]
+        self.model = model
+        main_columns = [_factor_coding(factor, values) for factor, values in zip(self.factors, self.factor_values)]
+        columns = [("Intercept", {})]
+        for factor_index, factor_columns in enumerate(main_columns):
+            columns.extend((label, {factor_index: vector}) for label, vector in factor_columns)
+        if model in ["interactions", "quadratic"]:
+            for first_index, second_index in itertools.combinations(range(len(self.factors)), 2):
+                for (first_label, first_vector), (second_label, second_vector) in itertools.product(
+                        main_columns[first_index], main_columns[second_index]):
+                    columns.append(("{0}*{1}".format(first_label, second_label),
+                                    {first_index: first_vector, second_index: second_vector}))
+        if model == "quadratic":
+            for factor_index, factor_columns in enumerate(main_columns):
+                # only a numeric factor has a single column that takes three or more values
+                if len(factor_columns) == 1 and len(set(factor_columns[0][1])) >= 3:
+                    # centering the square keeps the information matrix well conditioned
+                    squared = factor_columns[0][1] ** 2
+                    columns.append(("{0}^2".format(factor_columns[0][0]), {factor_index: squared - squared.mean()}))
+        self.labels = [label for label, vectors in columns]
+        self.number_parameters = len(columns)
+        self.level_tables = [np.ones((len(values), self.number_parameters)) for values in self.factor_values]
+        for column_index, (label, vectors) in enumerate(columns):
+            for factor_index, vector in vectors.items():
+                self.level_tables[factor_index][:, column_index] = vector
+
+    def rows(self, code_matrix):
+        """Returns the model matrix of the runs with level codes code_matrix, one row per run"""
+        code_matrix = np.asarray(code_matrix)
+        model_matrix = np.ones((len(code_matrix), self.number_parameters))
+        for factor_index, level_table in enumerate(self.level_tables):
+            model_matrix *= level_table[code_matrix[:, factor_index]]
+        return model_matrix
+
+    def moment_matrix(self, candidate_codes=None):
+        """Returns the moment matrix W, the average of f(x)f(x)' over the candidate space. Without candidate_codes
+        the candidate space is the full factorial and W is the elementwise product of one small matrix per factor,
+        so it is found without enumerating any runs."""
+        if candidate_codes is not None:
+            candidate_rows = self.rows(candidate_codes)
+            return candidate_rows.T @ candidate_rows / len(candidate_rows)
+        moments = np.ones((self.number_parameters, self.number_parameters))
+        for level_table in self.level_tables:
+            moments *= level_table.T @ level_table / len(level_table)
+        return moments
+
+    def d_efficiency(self, code_matrix):
+        """Returns det(X'X / N) ** (1 / p), which is 1 for an orthogonal two level design"""
+        model_matrix = self.rows(code_matrix)
+        sign, log_determinant = np.linalg.slogdet(model_matrix.T @ model_matrix / len(model_matrix))
+        if sign <= 0:
+            return 0.0
+        return float(np.exp(log_determinant / self.number_parameters))
+
+    def average_variance(self, code_matrix, candidate_codes=None):
+        """Returns the prediction variance (in units of the error variance) averaged over the candidate space,
+        trace(W (X'X)^-1), or inf if the model can not be estimated from the runs"""
+        model_matrix = self.rows(code_matrix)
+        information = model_matrix.T @ model_matrix
+        if np.linalg.matrix_rank(information) < self.number_parameters:
+            return float("inf")
+        return float(np.trace(np.linalg.solve(information, self.moment_matrix(candidate_codes))))
+
+    def __repr__(self):
+        return "DesignModel(model={0!r}, factors={1}, number_parameters={2})".format(self.model, self.factors,
+                                                                                    self.number_parameters)
+
+
+class ExchangeSearch(object):
+    """One optimal design problem. run(random_seed) makes one random start and improves it by exchanges until a
+    pass over the runs changes nothing. The inverse of the information matrix without the current run is found
+    with one Sherman-Morrison downdate, every trial replacement y is then scored from it (y'M^-1y for D, the drop
+    in trace(W M^-1) for I) and the chosen run is added back with one rank one update. The inverse is refactored
+    once per pass to keep rounding errors from building up."""
+    def __init__(self, design_dictionary, number_runs, model="main", criterion="D", exclusions=None,
+                 algorithm="coordinate", run_values="values"):
+        if criterion not in OPTIMALITY_CRITERIA:
+            raise ValueError("criterion must be one of {0}, not {1!r}".format(OPTIMALITY_CRITERIA, criterion))
+        if algorithm not in EXCHANGE_ALGORITHMS:
+            raise ValueError("algorithm must be one of {0}, not {1!r}".format(EXCHANGE_ALGORITHMS, algorithm))
+        self.factors = list(design_dictionary.keys())
+        self.factor_values = [list(design_dictionary[factor].__getattribute__(run_values)())
+                              for factor in self.factors]
+        self.radices = [len(values) for values in self.factor_values]
+        self.model = DesignModel(self.factors, self.factor_values, model=model)
+        self.number_runs = number_runs
+        self.criterion = criterion
+        self.algorithm = algorithm
+        if number_runs < self.model.number_parameters:
+            raise ValueError("The {0} model has {1} parameters, it needs at least that many runs, not {2}".format(
+                model, self.model.number_parameters, number_runs))
+        self.constraints = ExclusionConstraints(exclusions or [])
+        level_tables = dict(zip(self.factors, self.factor_values))
+        # exclusions_by_factor[j] holds the {factor_index: level mask} of every exclusion that names factor j
+        self.exclusions_by_factor = [[] for factor in self.factors]
+        for masks in self.constraints.level_masks(level_tables):
+            indexed_masks = {self.factors.index(factor): mask for factor, mask in masks.items()}
+            for factor_index in indexed_masks.keys():
+                self.exclusions_by_factor[factor_index].append(indexed_masks)
+        constrained, self.feasible = self.constraints.feasible_codes(self.factors, level_tables)
+        self.constrained_indices = [self.factors.index(factor) for factor in constrained]
+        if len(self.feasible) == 0:
+            raise ValueError("Every run is excluded")
+        self.candidate_codes = None
+        if algorithm == "fedorov":
+            candidates = ConstrainedFactorialView(design_dictionary, exclusions or [], randomized=False,
+                                                  run_values=run_values)
+            if candidates.number_runs > MAXIMUM_CANDIDATES:
+                raise ValueError("The candidate space has {0} runs, use algorithm='coordinate' for more than "
+                                 "{1}".format(candidates.number_runs, MAXIMUM_CANDIDATES))
+            allowed_codes = candidates.decode_array(np.arange(candidates.number_runs, dtype=np.int64))
+            self.candidate_codes = np.column_stack([allowed_codes[factor] for factor in self.factors]).astype(np.int64)
+            self.candidate_rows = self.model.rows(self.candidate_codes)
+        self.stacked_level_tables = np.vstack(self.model.level_tables)
+        # the scores of the levels of factor j are at level_offsets[j]:level_offsets[j + 1]
+        self.level_offsets = np.concatenate([[0], np.cumsum(self.radices)]).astype(np.int64)
+        self.excluded_factors = [factor_index for factor_index in range(len(self.factors))
+                                 if self.exclusions_by_factor[factor_index]]
+        self.moments = None
+        if criterion == "I":
+            self.moments = self.model.moment_matrix(self.candidate_codes)
+
+    def initial_codes(self, random_generator):
+        """Returns the level codes of number_runs random allowed runs"""
+        if self.candidate_codes is not None:
+            return self.candidate_codes[random_generator.integers(len(self.candidate_codes),
+                                                                  size=self.number_runs)].copy()
+        code_matrix = np.column_stack([random_generator.integers(radix, size=self.number_runs)
+                                       for radix in self.radices]).astype(np.int64)
+        if self.constrained_indices:
+            feasible_rows = random_generator.integers(len(self.feasible), size=self.number_runs)
+            code_matrix[:, self.constrained_indices] = self.feasible[feasible_rows]
+        return code_matrix
+
+    def scores(self, candidate_rows, inverse):
+        """Returns the score of adding each of candidate_rows to the design whose inverse information matrix is
+        inverse, higher is better: y'M^-1y for D and the drop in trace(W M^-1) for I."""
+        projected = candidate_rows @ inverse
+        variances = np.einsum("ij,ij->i", projected, candidate_rows)
+        if self.criterion == "D":
+            scores = variances
+        else:
+            scores = np.einsum("ij,ij->i", projected @ self.moments, projected) / (1 + variances)
+        # rounding in a nearly singular inverse can give NaN, which must never look like an improvement
+        return np.where(np.isnan(scores), -np.inf, scores)
+
+    def allowed_levels(self, run_codes, factor_index):
+        """Returns a boolean array over the levels of factor_index that is False for the levels that would make
+        the run with level codes run_codes excluded, or None if every level is allowed."""
+        allowed = None
+        for masks in self.exclusions_by_factor[factor_index]:
+            if all(mask[run_codes[other_index]] for other_index, mask in masks.items() if other_index != factor_index):
+                if allowed is None:
+                    allowed = np.ones(self.radices[factor_index], dtype=bool)
+                allowed &= ~masks[factor_index]
+        return allowed
+
+    def coordinate_exchange(self, run_codes, inverse):
+        """Changes the levels of run_codes in place, one factor at a time to the best allowed level, and returns
+        (changed, model row of the new run). Every level of every factor is scored at once: the model rows of the
+        single factor changes are the level tables times the product of the tables of the other factors, kept as
+        prefix and suffix products. The best change is made and the run is scored again until no change helps."""
+        changed = False
+        while True:
+            factor_rows = np.array([level_table[code] for level_table, code in zip(self.model.level_tables,
+                                                                                  run_codes)])
+            ones = np.ones((1, self.model.number_parameters))
+            prefixes = np.cumprod(np.vstack([ones, factor_rows[:-1]]), axis=0)
+            suffixes = np.cumprod(np.vstack([ones, factor_rows[:0:-1]]), axis=0)[::-1]
+            other_factors = prefixes * suffixes
+            scores = self.scores(np.repeat(other_factors, self.radices, axis=0) * self.stacked_level_tables, inverse)
+            current_score = scores[self.level_offsets[0] + run_codes[0]]
+            for factor_index in self.excluded_factors:
+                allowed = self.allowed_levels(run_codes, factor_index)
+                if allowed is not None:
+                    level_scores = scores[self.level_offsets[factor_index]:self.level_offsets[factor_index + 1]]
+                    level_scores[~allowed] = -np.inf
+            best_change = int(np.argmax(scores))
+            if scores[best_change] - current_score <= EXCHANGE_TOLERANCE * max(1.0, abs(current_score)):
+                return changed, other_factors[0] * factor_rows[0]
+            factor_index = int(np.searchsorted(self.level_offsets, best_change, side="right")) - 1
+            run_codes[factor_index] = best_change - self.level_offsets[factor_index]
+            changed = True
+
+    def fedorov_exchange(self, run_codes, run_row, inverse):
+        """Replaces run_codes in place by the best candidate run and returns (changed, model row of the new run)"""
+        scores = self.scores(self.candidate_rows, inverse)
+        best_candidate = int(np.argmax(scores))
+        current_score = self.scores(run_row[None, :], inverse)[0]
+        if scores[best_candidate] - current_score > EXCHANGE_TOLERANCE * max(1.0, abs(current_score)):
+            run_codes[:] = self.candidate_codes[best_candidate]
+            return True, self.candidate_rows[best_candidate]
+        return False, run_row
+
+    def loss(self, model_matrix):
+        """Returns -log(det(X'X)) for D and trace(W (X'X)^-1) for I, lower is better"""
+        information = model_matrix.T @ model_matrix
+        if np.linalg.matrix_rank(information) < self.model.number_parameters:
+            return float("inf")
+        sign, log_determinant = np.linalg.slogdet(information)
+        if self.criterion == "D":
+            return float(-log_determinant)
+        return float(np.trace(np.linalg.solve(information, self.moments)))
+
+    def run(self, random_seed):
+        """Returns (loss, level codes of the runs) for one random start, random_seed is anything
+        numpy.random.default_rng accepts."""
+        random_generator = np.random.default_rng(random_seed)
+        code_matrix = self.initial_codes(random_generator)
+        model_matrix = self.model.rows(code_matrix)
+        identity = np.eye(self.model.number_parameters)
+        for pass_index in range(MAXIMUM_PASSES):
+            inverse = np.linalg.inv(model_matrix.T @ model_matrix + RIDGE * identity)
+            improved = False
+            for run_index in range(self.number_runs):
+                run_row = model_matrix[run_index]
+                projected = inverse @ run_row
+                if 1 - run_row @ projected < LEVERAGE_TOLERANCE:
+                    continue
+                inverse_without = inverse + np.outer(projected, projected) / (1 - run_row @ projected)
+                if self.algorithm == "coordinate":
+                    changed, new_row = self.coordinate_exchange(code_matrix[run_index], inverse_without)
+                else:
+                    changed, new_row = self.fedorov_exchange(code_matrix[run_index], run_row, inverse_without)
+                if changed:
+                    improved = True
+                    model_matrix[run_index] = new_row
+                    run_row = new_row
+                projected = inverse_without @ run_row
+                inverse = inverse_without - np.outer(projected, projected) / (1 + run_row @ projected)
+            if not improved:
+                break
+        return self.loss(model_matrix), code_matrix
+
+    def __repr__(self):
+        return "ExchangeSearch(number_runs={0}, criterion={1!r}, algorithm={2!r}, model={3!r})".format(
+            self.number_runs, self.criterion, self.algorithm, self.model)
+
+
+class OptimalDesignView(FullyFactorialView):
+    """A lazy run sheet of the runs with level codes code_matrix (one row per run, one column per factor). The
+    unrandomized order sorts the runs like fully_factorial and randomization works as in FullyFactorialView."""
+    def __init__(self, design_dictionary, code_matrix, model=None, criterion="D", randomized=True,
+                 run_values="values", random_seed=RANDOM_SEED, randomization="shuffle"):
+        FullyFactorialView.__init__(self, design_dictionary, randomized=randomized, run_values=run_values,
+                                    random_seed=random_seed, randomization=randomization)
+        code_matrix = np.asarray(code_matrix, dtype=np.int64).reshape(-1, len(self.factors))
+        self.code_matrix = code_matrix[np.lexsort(code_matrix.T[::-1])] if len(self.factors) else code_matrix
+        self.number_runs = len(self.code_matrix)
+        self.model = model if model is not None else DesignModel(self.factors, self.factor_values)
+        self.criterion = criterion
+        if self.permutation is not None:
+            self.permutation = SeededPermutation(self.number_runs, random_seed=random_seed)
+
+    def decode(self, design_index):
+        """Returns the list of level positions for the run at design_index in the unrandomized order."""
+        return [int(code) for code in self.code_matrix[design_index]]
+
+    def __iter__(self):
+        if self.randomized:
+            return FullyFactorialView.__iter__(self)
+        return DesignView.__iter__(self)
+
+    def d_efficiency(self):
+        """Returns det(X'X / N) ** (1 / p) of the design for its model"""
+        return self.model.d_efficiency(self.code_matrix)
+
+    def average_variance(self):
+        """Returns the prediction variance of the model averaged over the full factorial"""
+        return self.model.average_variance(self.code_matrix)
+
+    def decode_array(self, design_indices):
+        """Returns {factor_name: code array} for an array of design indices"""
+        return {factor: self.code_matrix[design_indices, factor_index]
+                for factor_index, factor in enumerate(self.factors)}
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_optimal_design():
+    """Tests optimal_design for a screening design and a constrained response surface design"""
+    import time
+    from experimental_design.design_planning import GenerationProfiler
+    print("*"*80)
+    print("Testing the optimal_design function")
+    screening = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 21)}
+    start = time.time()
+    design = optimal_design(screening, 24, model="main", output="lazy")
+    print(f"A 24 run D-optimal main effects design for 20 factors has D-efficiency {design.d_efficiency():.4f}, "
+          f"it took {time.time() - start:.2f} s")
+    surface = {"temperature": {0: 20, 1: 40, 2: 60}, "pressure": {0: 1, 1: 2, 2: 3},
+               "catalyst": {0: "A", 1: "B"}}
+    exclusions = [{"temperature": 60, "pressure": 3}]
+    for criterion in OPTIMALITY_CRITERIA:
+        design = optimal_design(surface, 16, model="quadratic", criterion=criterion, exclusions=exclusions,
+                                algorithm="fedorov", processes=1, randomized=False, output="lazy")
+        print(f"The {criterion}-optimal quadratic design with {design.model.number_parameters} parameters has "
+              f"D-efficiency {design.d_efficiency():.4f} and average variance {design.average_variance():.4f}")
+    for run in design[0:4]:
+        print(run)
+    profiler = GenerationProfiler()
+    optimal_design(surface, 16, model="quadratic", exclusions=exclusions, processes=1, output="design",
+                   profiler=profiler)
+    print(f"The profiled optimal design timed the stages {sorted(profiler.stage_times)}")
+    assert "exchange search" in profiler.stage_times
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_optimal_design()
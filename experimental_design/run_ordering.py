@@ -0,0 +1,360 @@
+#-----------------------------------------------------------------------------
+# Name:        run_ordering
+# Purpose:    To order runs so that slow factor changes happen as rarely as possible.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""run_ordering finds an order of the runs of a design that keeps the total time spent changing factors small,
+given the time it takes to change each factor, or to go from one level of a factor to another. Runs are compared
+by their level codes. A full factorial is put in mixed radix Gray code order (one factor changes between runs,
+the costly factors change least often) and any other design starts from the Gray code rank order of its runs or
+from a nearest neighbour tour, which is then improved with 2-opt moves over a sliding window. Blocks, such as the
+whole plots of a split plot design, can be kept together with the randomized order inside each block unchanged.
+The result reports the transition time and the estimated wall clock time of the campaign.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import itertools
+import numbers
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.columnar_designs import Design
+
+#-----------------------------------------------------------------------------
+# Module Constants
+ORDERING_METHODS = ["auto", "gray", "nearest_neighbour"]
+"auto keeps the better of the gray and nearest_neighbour starts"
+NEAREST_NEIGHBOUR_LIMIT = 4096
+"Largest number of distinct runs (or blocks) auto starts a nearest neighbour tour from"
+TWO_OPT_WINDOW = 32
+"Longest stretch of runs (or blocks) a 2-opt move reverses"
+TWO_OPT_PASSES = 25
+"Largest number of 2-opt passes over the order"
+LEVEL_PATH_PERMUTATIONS = 7
+"Factors with at most this many levels get their best level order by trying every permutation"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def _as_design(design):
+    """Returns design (a Design, a lazy view or a list of runs) as a columnar Design"""
+    if hasattr(design, "factor_table"):
+        return design
+    if hasattr(design, "to_design"):
+        return design.to_design()
+    return Design.from_runs(design)
+
+
+def estimate_campaign_time(design, change_costs, run_time=0.0):
+    """Returns the time to run design in its current order, run_time for every run plus the time spent changing
+    factors between runs. change_costs is in the form order_runs uses."""
+    design = _as_design(design)
+    costs = TransitionCosts(design, change_costs)
+    return design.number_runs * run_time + costs.order_cost(np.arange(design.number_runs))
+
+
+def order_runs(design, change_costs, method="auto", blocks=None, run_time=0.0, two_opt=True):
+    """Given a design (the output of any generator) and change_costs, a dictionary {factor_name: cost} with the
+    time of one change of the factor or {factor_name: {(from_value, to_value): cost, ...}} with the time of each
+    level change, returns a RunOrder with the run order that keeps the total change time small. A level pair that
+    is not listed costs the same as the reverse pair, or nothing if that is not listed either, and factors that are
+    not in change_costs cost nothing. method is "gray" (Gray code rank order), "nearest_neighbour" or "auto" (the
+    better of the two). blocks keeps groups of runs together in their current order, it is a number of
+    consecutive runs per block (the split plot size of a split plot design) or a list with a block label per run.
+    run_time is the time of one run and is only used for the campaign time. The order given is kept if nothing
+    cheaper is found."""
+    if method not in ORDERING_METHODS:
+        raise ValueError("method must be one of {0}, not {1!r}".format(ORDERING_METHODS, method))
+    design = _as_design(design)
+    costs = TransitionCosts(design, change_costs)
+    initial_order = np.arange(design.number_runs)
+    if design.number_runs < 2:
+        return RunOrder(initial_order, costs, run_time=run_time, method=method)
+    nodes = RunNodes(costs, blocks=blocks)
+    starts = []
+    if blocks is not None:
+        # the blocks in the order given are a start too, the block order of a split plot is often already good
+        starts.append(("given", np.arange(nodes.number_nodes)))
+    if method in ["auto", "gray"]:
+        starts.append(("gray", nodes.gray_order()))
+    if method == "nearest_neighbour" or (method == "auto" and nodes.number_nodes <= NEAREST_NEIGHBOUR_LIMIT):
+        starts.append(("nearest_neighbour", nodes.nearest_neighbour_order(start=starts[-1][1][0] if starts else 0)))
+    best = None
+    for start_method, node_order in starts:
+        if two_opt:
+            node_order = nodes.two_opt(node_order)
+        run_order = nodes.run_order(node_order)
+        cost = costs.order_cost(run_order)
+        if best is None or cost < best[0]:
+            best = (cost, start_method, run_order)
+    if best[0] > costs.order_cost(initial_order):
+        best = (None, "given", initial_order)
+    return RunOrder(best[2], costs, run_time=run_time, method=best[1])
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class TransitionCosts(object):
+    """The change costs of a Design compiled to one (levels + 1) x (levels + 1) matrix per costed factor,
+    matrices[factor][i, j] is the time to go from level code i to level code j. The last row and column are for
+    runs where the factor is not set and cost nothing."""
+    def __init__(self, design, change_costs):
+        self.design = design
+        self.factors = []
+        self.matrices = {}
+        self.codes = {}
+        for factor, factor_costs in change_costs.items():
+            if factor not in design.levels:
+                raise KeyError("The factor {0!r} with a change cost is not in the design".format(factor))
+            levels = design.levels[factor]
+            matrix = np.zeros((len(levels) + 1, len(levels) + 1))
+            if isinstance(factor_costs, numbers.Real):
+                matrix[:-1, :-1] = factor_costs * (1 - np.eye(len(levels)))
+            else:
+                for from_index, to_index in itertools.permutations(range(len(levels)), 2):
+                    pair = (levels[from_index], levels[to_index])
+                    matrix[from_index, to_index] = factor_costs.get(pair, factor_costs.get(pair[::-1], 0))
+            if not matrix.any():
+                continue
+            self.factors.append(factor)
+            self.matrices[factor] = matrix
+            # the MISSING_CODE of -1 becomes the last row of the matrix
+            self.codes[factor] = design.codes[factor].astype(np.int64) % (len(levels) + 1)
+
+    def between(self, from_runs, to_runs):
+        """Returns the cost of going from each run in from_runs to the matching run in to_runs"""
+        total = np.zeros(len(from_runs))
+        for factor in self.factors:
+            codes = self.codes[factor]
+            total += self.matrices[factor][codes[from_runs], codes[to_runs]]
+        return total
+
+    def order_cost(self, run_order):
+        """Returns the total change cost of running the runs in run_order"""
+        run_order = np.asarray(run_order)
+        return float(self.between(run_order[:-1], run_order[1:]).sum())
+
+    def level_path(self, factor):
+        """Returns the order of the level codes of factor that makes a sweep up and back down the levels cheapest,
+        found by trying every order for up to LEVEL_PATH_PERMUTATIONS levels and by nearest neighbour paths
+        otherwise."""
+        matrix = self.matrices[factor][:-1, :-1]
+        number_levels = len(matrix)
+        round_trip = matrix + matrix.T
+        if number_levels <= LEVEL_PATH_PERMUTATIONS:
+            paths = itertools.permutations(range(number_levels))
+        else:
+            paths = []
+            for start in range(number_levels):
+                path = [start]
+                remaining = set(range(number_levels)) - {start}
+                while remaining:
+                    path.append(min(remaining, key=lambda level: round_trip[path[-1], level]))
+                    remaining.remove(path[-1])
+                paths.append(path)
+        return list(min(paths, key=lambda path: sum(round_trip[path[index], path[index + 1]]
+                                                    for index in range(number_levels - 1))))
+
+    def factor_priority(self, factor):
+        """Returns the sort key that puts a factor further out in a Gray code order, the mean change cost times
+        levels / (levels - 1). Ordering by it minimizes the total cost of a Gray code with constant costs."""
+        matrix = self.matrices[factor][:-1, :-1]
+        number_levels = len(matrix)
+        if number_levels < 2:
+            return 0.0
+        mean_cost = matrix.sum() / (number_levels * (number_levels - 1))
+        return mean_cost * number_levels / (number_levels - 1)
+
+    def __repr__(self):
+        return "TransitionCosts(factors={0})".format(self.factors)
+
+
+class RunNodes(object):
+    """The runs of a design grouped into the nodes that an ordering moves around. Without blocks a node is a set of
+    identical runs (they cost nothing to run back to back), with blocks a node is a block of runs in its current
+    order. Each node is entered at its first run and left from its last run."""
+    def __init__(self, costs, blocks=None):
+        self.costs = costs
+        number_runs = costs.design.number_runs
+        if blocks is None:
+            if costs.factors:
+                code_matrix = np.column_stack([costs.codes[factor] for factor in costs.factors])
+                unique_rows, node_labels = np.unique(code_matrix, axis=0, return_inverse=True)
+                node_labels = node_labels.reshape(-1)
+            else:
+                node_labels = np.zeros(number_runs, dtype=np.int64)
+        elif isinstance(blocks, numbers.Integral):
+            node_labels = np.arange(number_runs) // blocks
+        else:
+            if len(blocks) != number_runs:
+                raise ValueError("blocks has {0} labels for {1} runs".format(len(blocks), number_runs))
+            first_seen = {}
+            node_labels = np.array([first_seen.setdefault(label, len(first_seen)) for label in blocks])
+        # members lists the runs node by node, each node in its current run order
+        self.members = np.argsort(node_labels, kind="stable")
+        node_sizes = np.bincount(node_labels)
+        self.number_nodes = len(node_sizes)
+        self.node_starts = np.concatenate([[0], np.cumsum(node_sizes)])
+        self.entry_runs = self.members[self.node_starts[:-1]]
+        self.exit_runs = self.members[self.node_starts[1:] - 1]
+
+    def edge_costs(self, from_nodes, to_nodes):
+        """Returns the cost of going from the last run of each of from_nodes to the first run of to_nodes"""
+        return self.costs.between(self.exit_runs[from_nodes], self.entry_runs[to_nodes])
+
+    def run_order(self, node_order):
+        """Returns the run order of a node order"""
+        return np.concatenate([self.members[self.node_starts[node]:self.node_starts[node + 1]]
+                               for node in node_order])
+
+    def gray_order(self):
+        """Returns the nodes sorted by the mixed radix Gray code rank of their entry runs. The costly factors are
+        the outer digits and each factor sweeps its levels in its cheapest order, so for a full factorial this is a
+        Gray code: one factor changes between runs. Only the parity of the outer digits is needed for the rank, so
+        any number of factors works."""
+        factors = sorted(self.costs.factors, key=self.costs.factor_priority, reverse=True)
+        digit_columns = []
+        parity = np.zeros(self.number_nodes, dtype=np.int64)
+        for factor in factors:
+            level_path = self.costs.level_path(factor)
+            radix = len(level_path) + 1
+            # position of each level code in the path, the unset code goes last
+            positions = np.empty(radix, dtype=np.int64)
+            positions[level_path] = np.arange(len(level_path))
+            positions[-1] = len(level_path)
+            digits = positions[self.costs.codes[factor][self.entry_runs]]
+            digits = np.where(parity == 1, radix - 1 - digits, digits)
+            digit_columns.append(digits)
+            parity = (parity * (radix % 2) + digits) % 2
+        if not digit_columns:
+            return np.arange(self.number_nodes)
+        return np.lexsort(digit_columns[::-1])
+
+    def nearest_neighbour_order(self, start=0):
+        """Returns a nearest neighbour tour of the nodes from start, O(nodes^2) vectorized"""
+        visited = np.zeros(self.number_nodes, dtype=bool)
+        all_nodes = np.arange(self.number_nodes)
+        node_order = [start]
+        visited[start] = True
+        for step in range(self.number_nodes - 1):
+            step_costs = self.edge_costs(np.full(self.number_nodes, node_order[-1]), all_nodes)
+            step_costs[visited] = np.inf
+            next_node = int(np.argmin(step_costs))
+            node_order.append(next_node)
+            visited[next_node] = True
+        return np.array(node_order)
+
+    def two_opt(self, node_order, window=TWO_OPT_WINDOW, passes=TWO_OPT_PASSES):
+        """Improves node_order with 2-opt moves that reverse up to window consecutive nodes. Every move of a pass is
+        scored at once with prefix sums of the forward and backward edge costs (the costs do not have to be
+        symmetric), then the best moves that do not share an edge are made together."""
+        node_order = np.array(node_order)
+        number_nodes = len(node_order)
+        for pass_index in range(passes):
+            forward = self.edge_costs(node_order[:-1], node_order[1:])
+            backward = self.edge_costs(node_order[1:], node_order[:-1])
+            forward_sums = np.concatenate([[0], np.cumsum(forward)])
+            backward_sums = np.concatenate([[0], np.cumsum(backward)])
+            moves = []
+            for width in range(1, min(window, number_nodes - 1) + 1):
+                starts = np.arange(number_nodes - width)
+                stops = starts + width
+                # reversing starts..stops turns the inner edges around and replaces the two edges at the ends
+                deltas = (backward_sums[stops] - backward_sums[starts]) - (forward_sums[stops] - forward_sums[starts])
+                left = starts >= 1
+                deltas[left] += self.edge_costs(node_order[starts[left] - 1], node_order[stops[left]]) - \
+                    forward[starts[left] - 1]
+                right = stops <= number_nodes - 2
+                deltas[right] += self.edge_costs(node_order[starts[right]], node_order[stops[right] + 1]) - \
+                    forward[stops[right]]
+                improving = deltas < -1e-9
+                moves.append((deltas[improving], starts[improving], stops[improving]))
+            deltas = np.concatenate([move[0] for move in moves])
+            if len(deltas) == 0:
+                break
+            move_starts = np.concatenate([move[1] for move in moves])
+            move_stops = np.concatenate([move[2] for move in moves])
+            used_edges = np.zeros(number_nodes, dtype=bool)
+            for move in np.argsort(deltas, kind="stable").tolist():
+                first_edge = max(int(move_starts[move]) - 1, 0)
+                last_edge = min(int(move_stops[move]), number_nodes - 2)
+                if used_edges[first_edge:last_edge + 1].any():
+                    continue
+                used_edges[first_edge:last_edge + 1] = True
+                node_order[move_starts[move]:move_stops[move] + 1] = \
+                    node_order[move_starts[move]:move_stops[move] + 1][::-1]
+        return node_order
+
+    def __repr__(self):
+        return "RunNodes(number_nodes={0})".format(self.number_nodes)
+
+
+class RunOrder(object):
+    """The result of order_runs. order holds the indices of the runs of the design in the new order,
+    transition_cost is its total change time and campaign_time adds run_time for every run. The initial_ values are
+    for the design in the order it was given."""
+    def __init__(self, order, costs, run_time=0.0, method="auto"):
+        self.order = np.asarray(order)
+        self.number_runs = len(self.order)
+        self.run_time = run_time
+        self.method = method
+        self.transition_cost = costs.order_cost(self.order)
+        self.initial_transition_cost = costs.order_cost(np.arange(self.number_runs))
+        self.number_changes = {factor: int(np.count_nonzero(np.diff(costs.codes[factor][self.order])))
+                               for factor in costs.factors}
+
+    @property
+    def campaign_time(self):
+        """Estimated wall clock time of the campaign in the new order"""
+        return self.number_runs * self.run_time + self.transition_cost
+
+    @property
+    def initial_campaign_time(self):
+        """Estimated wall clock time of the campaign in the order it was given"""
+        return self.number_runs * self.run_time + self.initial_transition_cost
+
+    def reorder(self, design):
+        """Returns design in the new order, a Design stays a Design and anything else becomes a list of runs"""
+        if hasattr(design, "factor_table"):
+            return design.take(self.order)
+        return [dict(design[int(index)]) for index in self.order]
+
+    def __repr__(self):
+        return ("RunOrder(number_runs={0}, method={1!r}, transition_cost={2:g}, initial_transition_cost={3:g}, "
+                "campaign_time={4:g})").format(self.number_runs, self.method, self.transition_cost,
+                                               self.initial_transition_cost, self.campaign_time)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_order_runs():
+    """Tests order_runs on a randomized fully factorial design and a split plot design"""
+    import time
+    from experimental_design.experimental_designs import fully_factorial, fully_factorial_split_plot
+    design = {"temperature": {0: 20, 1: 40, 2: 60, 3: 80}, "fixture": {0: "A", 1: "B", 2: "C"},
+              "voltage": {0: 1, 1: 2, 2: 3, 3: 4, 4: 5}, "frequency": {i: i for i in range(10)}}
+    change_costs = {"temperature": {(20, 40): 300, (40, 60): 300, (60, 80): 300, (20, 60): 600, (40, 80): 600,
+                                    (20, 80): 900},
+                    "fixture": 600, "voltage": 5, "frequency": 1}
+    print("*"*80)
+    print("Testing order_runs")
+    test_conditions = fully_factorial(design, randomized=True)
+    start = time.time()
+    run_order = order_runs(test_conditions, change_costs, run_time=30)
+    print(f"{run_order} found in {time.time() - start:.2f} s")
+    print(f"The number of changes of each factor is {run_order.number_changes}")
+    for run in run_order.reorder(test_conditions)[0:3]:
+        print(run)
+    whole_plot = {"temperature": design["temperature"], "fixture": design["fixture"]}
+    split_plot = {"voltage": design["voltage"], "frequency": design["frequency"]}
+    test_conditions = fully_factorial_split_plot(whole_plot, split_plot, randomized=True)
+    run_order = order_runs(test_conditions, change_costs, blocks=50, run_time=30)
+    print(f"Keeping the randomized split plots together: {run_order}")
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_order_runs()
@@ -0,0 +1,657 @@
+#-----------------------------------------------------------------------------
+# Name:        run_sheet_io
+# Purpose:    To write run sheets to disk in chunks and read them back with random access.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""run_sheet_io streams the output of any generator (a list, a lazy design view or a columnar Design) to a Parquet
+file (one row group per chunk), an Arrow IPC file (one record batch per chunk) or a CSV file, chunk_size runs at a
+time, so the full list of runs is never built. Arrow factor columns are dictionary arrays with the level values as
+the dictionary, Parquet dictionary encodes the values of each row group itself. Levels of mixed types are stored
+as JSON strings and read back as the values. read_run_sheet memory maps a run sheet back as a lazy view, opening it only reads the file
+metadata, and run k is found by decoding the one chunk that holds it. Parquet and Arrow need the optional pyarrow
+package, CSV does not.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import csv
+import io
+import mmap
+import json
+import itertools
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import DesignView, InsertedDesignView, CHUNK_SIZE
+from experimental_design.columnar_designs import Design, MISSING_CODE, code_dtype, level_key, unique_levels
+
+#-----------------------------------------------------------------------------
+# Module Constants
+RUN_SHEET_FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow", ".csv": "csv"}
+"File extensions and the run sheet format they select when file_format is None"
+JSON_LEVEL_TYPES = (type(None), bool, int, float, str)
+"Python types of the levels that parquet and arrow run sheets can hold in a column of mixed types"
+CSV_SCAN_BYTES = 2**22
+"Number of bytes of a CSV run sheet scanned for line breaks at a time when it is opened"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def _import_pyarrow():
+    """Returns the pyarrow module or raises an ImportError that says how to get it"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Writing and reading parquet or arrow run sheets needs pyarrow, pip install pyarrow "
+                          "or use a .csv file")
+    return pyarrow
+
+
+def run_sheet_format(path, file_format=None):
+    """Returns the run sheet format ("parquet", "arrow" or "csv") of path, from file_format or the extension"""
+    if file_format is None:
+        extension = os.path.splitext(str(path))[1].lower()
+        if extension not in RUN_SHEET_FORMATS:
+            raise ValueError("Can not tell the run sheet format of {0}, give file_format as one of {1}".format(
+                path, sorted(set(RUN_SHEET_FORMATS.values()))))
+        return RUN_SHEET_FORMATS[extension]
+    if file_format not in RUN_SHEET_FORMATS.values():
+        raise ValueError("file_format must be one of {0}, not {1!r}".format(sorted(set(RUN_SHEET_FORMATS.values())),
+                                                                          file_format))
+    return file_format
+
+
+def _python_type(value):
+    """Returns the Python type of a level value, numpy scalars count as the Python type they hold"""
+    return type(value.item()) if isinstance(value, np.generic) else type(value)
+
+
+def _python_value(value):
+    """Returns a level value with numpy scalars turned into Python values"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def merge_level_tables(level_tables):
+    """Returns one {factor_name: list of levels} with the levels of all level_tables, in the order they first
+    appear"""
+    merged = {}
+    for tables in level_tables:
+        for factor, levels in tables.items():
+            merged.setdefault(factor, []).extend(levels)
+    return {factor: unique_levels(levels)[0] for factor, levels in merged.items()}
+
+
+def design_level_tables(design):
+    """Returns {factor_name: list of levels} of every run of design (a Design, a list of run dictionaries or a
+    lazy view) without making the runs of a lazy view, or None when the levels are not known before the runs are
+    made, as for an iterator of runs."""
+    if isinstance(design, Design):
+        return design.levels
+    if isinstance(design, list):
+        return Design.from_runs(design).levels
+    if hasattr(design, "level_tables"):
+        return design.level_tables()
+    if not isinstance(design, DesignView):
+        return None
+    if hasattr(design, "factor_values"):
+        return {factor: unique_levels(list(factor_values))[0]
+                for factor, factor_values in zip(design.factors, design.factor_values)}
+    child_views = design.child_views()
+    level_tables = [design_level_tables(child_view) for child_view in child_views]
+    if isinstance(design, InsertedDesignView) and design.base_view.number_runs:
+        insert_block = design.insert_factory(0)
+        if not isinstance(insert_block, DesignView):
+            level_tables.append(design_level_tables(list(insert_block)))
+    if not child_views or any(tables is None for tables in level_tables):
+        return None
+    return merge_level_tables(level_tables)
+
+
+def design_chunks(design, chunk_size=CHUNK_SIZE):
+    """Yields design (a Design, a lazy design view or any iterable of run dictionaries) as columnar Designs of at
+    most chunk_size runs."""
+    if hasattr(design, "design_chunks"):
+        yield from design.design_chunks(chunk_size)
+        return
+    runs = iter(design)
+    while True:
+        chunk = list(itertools.islice(runs, chunk_size))
+        if not chunk:
+            return
+        yield Design.from_runs(chunk)
+
+
+def write_run_sheet(design, path, file_format=None, chunk_size=CHUNK_SIZE, header=True):
+    """Writes design (the output of any generator, a list, a lazy view from output="lazy" or a Design from
+    output="design") to path as a run sheet, chunk_size runs at a time. The format is "parquet", "arrow" or "csv",
+    from the extension of path if file_format is None. header=False leaves out the header line of a CSV file, for
+    parts that are appended to another file. The levels of a list, a lazy view or a Design are found before the
+    first chunk is written (see design_level_tables). Returns the number of runs written."""
+    with RunSheetWriter(path, file_format=file_format, header=header,
+                        level_tables=design_level_tables(design)) as writer:
+        for chunk in design_chunks(design, chunk_size):
+            writer.write_design(chunk)
+    return writer.number_runs
+
+
+def read_run_sheet(path, file_format=None):
+    """Opens the run sheet at path as a lazy RunSheetView, the file is memory mapped and nothing else is read
+    until a run is asked for."""
+    return RunSheetView(path, file_format=file_format)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class RunSheetWriter(object):
+    """Writes columnar Designs one after the other to a run sheet file. The factors and their order come from the
+    first Design, a factor that is missing from a later Design is written as missing. level_tables
+    ({factor_name: list of levels}, see design_level_tables) gives the levels of the whole run sheet before it is
+    written, the dictionaries start with them in that order and their value types are checked before the first
+    write. Levels that are not in level_tables are added as the Designs bring them. Arrow dictionary indices use
+    the smallest integer type that holds the levels in level_tables, int32 for a factor without them. The levels
+    of a factor are written with their arrow type when they all have one Python type, otherwise (such as -1, 1 and
+    "Default") they are written as JSON strings, marked in the field metadata, that read_run_sheet turns back into
+    the values. header=False leaves out the header line of a CSV file. If writing fails the file is removed."""
+    def __init__(self, path, file_format=None, header=True, level_tables=None):
+        self.path = path
+        self.file_format = run_sheet_format(path, file_format)
+        self.header = header
+        self.level_tables = level_tables or {}
+        self.factors = None
+        self.levels = {}
+        self.level_codes = {}
+        self.number_runs = 0
+        self._writer = None
+        self._file = None
+        self._schema = None
+        self.index_dtypes = {}
+        self.encodings = {}
+        self.value_types = {}
+        self._arrow_levels = {}
+
+    def global_codes(self, design):
+        """Returns {factor_name: array of codes into self.levels} for design, adding its new levels. New levels
+        are checked against the value type of the factor before anything is written."""
+        codes = {}
+        for factor in self.factors:
+            index_dtype = self.index_dtypes[factor]
+            if factor not in design.codes:
+                codes[factor] = np.full(design.number_runs, MISSING_CODE, dtype=index_dtype)
+                continue
+            factor_levels = self.levels[factor]
+            factor_level_codes = self.level_codes[factor]
+            new_levels = [value for value in design.levels[factor] if level_key(value) not in factor_level_codes]
+            if new_levels:
+                self.check_levels(factor, new_levels)
+                if len(factor_levels) + len(new_levels) > np.iinfo(index_dtype).max:
+                    raise ValueError("{0} has more levels than its {1} dictionary index holds, give write_run_sheet "
+                                     "a Design, a list or a lazy view so the levels are known".format(
+                                         factor, index_dtype.name))
+                for value in new_levels:
+                    factor_level_codes[level_key(value)] = len(factor_levels)
+                    factor_levels.append(value)
+            # the appended MISSING_CODE is what a code of -1 selects
+            lookup = [factor_level_codes[level_key(value)] for value in design.levels[factor]] + [MISSING_CODE]
+            codes[factor] = np.array(lookup, dtype=index_dtype)[design.codes[factor]]
+        return codes
+
+    def start(self, design):
+        """Opens the file and writes the header or schema from the first design and the level tables"""
+        self.factors = list(design.factors)
+        for factor in self.factors:
+            known_levels = self.level_tables.get(factor)
+            self.levels[factor] = []
+            self.level_codes[factor] = {}
+            if self.file_format == "csv":
+                self.index_dtypes[factor] = np.dtype(np.int64)
+            elif known_levels is not None:
+                self.index_dtypes[factor] = code_dtype(len(unique_levels(list(known_levels))[0]))
+            else:
+                self.index_dtypes[factor] = np.dtype(np.int32)
+            for value in list(known_levels or []):
+                if level_key(value) not in self.level_codes[factor]:
+                    self.level_codes[factor][level_key(value)] = len(self.levels[factor])
+                    self.levels[factor].append(value)
+        if self.file_format == "csv":
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            if self.header:
+                self._writer.writerow(self.factors)
+            return
+        pyarrow = _import_pyarrow()
+        fields = []
+        for factor in self.factors:
+            first_levels = self.levels[factor] + [value for value in design.levels[factor]
+                                                  if level_key(value) not in self.level_codes[factor]]
+            self.encodings[factor], self.value_types[factor], value_type = self.value_type(first_levels)
+            metadata = {b"encoding": b"json"} if self.encodings[factor] == "json" else None
+            if self.file_format == "parquet":
+                # parquet dictionary encodes the values itself, in the order they appear in each row group
+                field_type = value_type
+            else:
+                field_type = pyarrow.dictionary(pyarrow.from_numpy_dtype(self.index_dtypes[factor]), value_type)
+            fields.append(pyarrow.field(str(factor), field_type, metadata=metadata))
+        self._open_arrow_writer(pyarrow.schema(fields))
+
+    def _open_arrow_writer(self, schema):
+        """Opens the parquet or arrow file with schema"""
+        pyarrow = _import_pyarrow()
+        self._schema = schema
+        if self.file_format == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema, use_dictionary=True)
+        else:
+            self._writer = pyarrow.ipc.new_file(self.path, self._schema,
+                                                options=pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    @staticmethod
+    def value_type(levels):
+        """Returns (encoding, python_types, arrow_type) for a list of level values. Levels of one Python type that
+        arrow stores as a flat type have the "native" encoding, the others are written as JSON strings, which
+        holds None, bool, int, float and str values of mixed types. Any other mix raises a ValueError."""
+        pyarrow = _import_pyarrow()
+        python_types = {_python_type(value) for value in levels}
+        if len(python_types) <= 1:
+            try:
+                arrow_type = pyarrow.array([_python_value(value) for value in levels]).type
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, OverflowError):
+                arrow_type = None
+            if arrow_type is not None and pyarrow.types.is_null(arrow_type) and not levels:
+                arrow_type = pyarrow.string()
+            if arrow_type is not None and not (pyarrow.types.is_nested(arrow_type) or
+                                               pyarrow.types.is_null(arrow_type)):
+                return "native", python_types, arrow_type
+        bad_types = sorted(python_type.__name__ for python_type in python_types - set(JSON_LEVEL_TYPES))
+        if bad_types:
+            raise ValueError("Levels of type {0} can not be written to a parquet or arrow run sheet with levels of "
+                             "other types, use a csv file".format(bad_types))
+        return "json", set(JSON_LEVEL_TYPES), pyarrow.string()
+
+    def check_levels(self, factor, levels):
+        """Raises a ValueError if levels can not be written in the value type of factor"""
+        if self.file_format == "csv":
+            return
+        bad_levels = [value for value in levels if _python_type(value) not in self.value_types[factor]]
+        if bad_levels:
+            raise ValueError("{0} has the levels {1!r} that do not have the type of its first levels {2}, give "
+                             "write_run_sheet a Design, a list or a lazy view so the levels are known".format(
+                                 factor, bad_levels[:5], sorted(value_type.__name__
+                                                                for value_type in self.value_types[factor])))
+        if self.encodings[factor] == "native":
+            pyarrow = _import_pyarrow()
+            value_type = self._schema.field(str(factor)).type
+            value_type = getattr(value_type, "value_type", value_type)
+            try:
+                pyarrow.array([_python_value(value) for value in levels], type=value_type)
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, OverflowError) as error:
+                raise ValueError("The levels of {0} do not fit its {1} column: {2}".format(factor, value_type,
+                                                                                         error))
+
+    def arrow_levels(self, factor, value_type):
+        """Returns the level values of factor as an arrow array of value_type, JSON encoded for the "json"
+        encoding. The array is only built again when levels were added."""
+        pyarrow = _import_pyarrow()
+        levels = self.levels[factor]
+        cached = self._arrow_levels.get(factor)
+        if cached is not None and cached[0] == len(levels):
+            return cached[1]
+        if self.encodings[factor] == "json":
+            values = [json.dumps(_python_value(value)) for value in levels]
+        else:
+            values = [_python_value(value) for value in levels]
+        array = pyarrow.array(values, type=value_type)
+        self._arrow_levels[factor] = (len(levels), array)
+        return array
+
+    def write_design(self, design):
+        """Writes the runs of a columnar Design after the runs already written"""
+        if self.factors is None:
+            self.start(design)
+        extra_factors = [factor for factor in design.factors if factor not in self.levels]
+        if extra_factors:
+            raise ValueError("The factors {0} are not in the first chunk of the run sheet".format(extra_factors))
+        codes = self.global_codes(design)
+        if self.file_format == "csv":
+            value_columns = []
+            for factor in self.factors:
+                level_values = self.levels[factor] + [""]
+                value_columns.append([level_values[code] for code in codes[factor].tolist()])
+            self._writer.writerows(zip(*value_columns))
+        else:
+            pyarrow = _import_pyarrow()
+            columns = []
+            for factor, field in zip(self.factors, self._schema):
+                missing = codes[factor] < 0
+                index_type = pyarrow.from_numpy_dtype(self.index_dtypes[factor])
+                value_type = getattr(field.type, "value_type", field.type)
+                indices = pyarrow.array(codes[factor], type=index_type, mask=missing if missing.any() else None)
+                column = pyarrow.DictionaryArray.from_arrays(indices, self.arrow_levels(factor, value_type))
+                columns.append(column.dictionary_decode() if self.file_format == "parquet" else column)
+            batch = pyarrow.record_batch(columns, schema=self._schema)
+            if self.file_format == "parquet":
+                self._writer.write_table(pyarrow.Table.from_batches([batch]), row_group_size=design.number_runs)
+            else:
+                self._writer.write_batch(batch)
+        self.number_runs += design.number_runs
+
+    def write_table(self, table):
+        """Writes a pyarrow Table of runs read from a parquet or arrow run sheet (see RunSheetView.arrow_range) as
+        one chunk, without decoding it into a Design. The first table gives the schema, a writer is used with
+        write_table or write_design, not both."""
+        if self.file_format == "csv":
+            raise ValueError("write_table writes parquet or arrow run sheets, not csv")
+        if self.factors is None:
+            self.factors = list(table.schema.names)
+            self._open_arrow_writer(table.schema)
+        if table.num_rows == 0:
+            return
+        table = table.combine_chunks()
+        if self.file_format == "parquet":
+            self._writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            for batch in table.to_batches():
+                self._writer.write_batch(batch)
+        self.number_runs += table.num_rows
+
+    def close(self):
+        """Finishes the file, a run sheet with no runs and no factors is written as an empty file"""
+        if self.factors is None:
+            open(self.path, "w").close()
+            return
+        if self._file is not None:
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if exception_type is None:
+            self.close()
+            return
+        # a run sheet that could not be written in full is not left behind
+        try:
+            self.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class RunSheetView(DesignView):
+    """A lazy, read-only run sheet backed by a memory mapped file written by write_run_sheet. Opening reads only
+    the metadata, the row group or record batch sizes, or for CSV the byte offset of every chunk_size-th line,
+    found by scanning the mapped bytes CSV_SCAN_BYTES at a time, so opening a CSV file holds one offset per chunk
+    and not one per line. view[k] decodes the chunk that holds run k (the last chunk used is cached), for CSV it
+    finds the line breaks of that chunk and parses line k on its own. Parquet and Arrow run sheets give back the
+    level values that were written, a CSV run sheet gives strings and assumes no value contains a line break."""
+    def __init__(self, path, file_format=None, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.file_format = run_sheet_format(path, file_format)
+        self._chunk_cache = (None, None)
+        self._map = None
+        self._schema = None
+        self._json_factors = None
+        self._line_cache = (None, None)
+        self._arrow_cache = (None, None)
+        if os.path.getsize(path) == 0:
+            self.factors = []
+            self.chunk_starts = np.zeros(1, dtype=np.int64)
+        elif self.file_format == "csv":
+            with open(path, "rb") as run_sheet_file:
+                self._map = mmap.mmap(run_sheet_file.fileno(), 0, access=mmap.ACCESS_READ)
+            # line break n (counting from 1) ends the header for n = 1 and starts run n - 1 after it, the runs
+            # chunk_size apart start the chunks
+            line_breaks = 0
+            chunk_offsets = []
+            for block_start in range(0, len(self._map), CSV_SCAN_BYTES):
+                block = np.frombuffer(self._map[block_start:block_start + CSV_SCAN_BYTES], dtype=np.uint8)
+                block_breaks = np.flatnonzero(block == ord("\n"))
+                chunk_breaks = np.flatnonzero((line_breaks + np.arange(len(block_breaks))) % chunk_size == 0)
+                chunk_offsets.extend((block_start + block_breaks[chunk_breaks] + 1).tolist())
+                line_breaks += len(block_breaks)
+            number_lines = line_breaks + (self._map[-1:] != b"\n")
+            header_end = self._map.find(b"\n")
+            self.factors = next(csv.reader(io.StringIO(
+                self._map[:header_end if header_end >= 0 else len(self._map)].decode("utf-8"))))
+            number_runs = max(number_lines - 1, 0)
+            self.chunk_starts = np.append(np.arange(0, number_runs, chunk_size), number_runs).astype(np.int64)
+            self.chunk_offsets = np.array(chunk_offsets[:len(self.chunk_starts) - 1] + [len(self._map)],
+                                          dtype=np.int64)
+        else:
+            pyarrow = _import_pyarrow()
+            if self.file_format == "parquet":
+                self._reader = pyarrow.parquet.ParquetFile(path, memory_map=True)
+                chunk_lengths = [self._reader.metadata.row_group(row_group).num_rows
+                                 for row_group in range(self._reader.num_row_groups)]
+                schema = self._reader.schema_arrow
+            else:
+                self._map = pyarrow.memory_map(str(path), "r")
+                self._reader = pyarrow.ipc.open_file(self._map)
+                chunk_lengths = [self._reader.get_batch(batch).num_rows
+                                 for batch in range(self._reader.num_record_batches)]
+                schema = self._reader.schema
+            self._schema = schema
+            self.factors = list(schema.names)
+            self.chunk_starts = np.concatenate([[0], np.cumsum(chunk_lengths)]).astype(np.int64)
+        self.number_runs = int(self.chunk_starts[-1])
+
+    def _chunk_text(self, chunk_index):
+        """Returns the text of the lines of CSV chunk chunk_index"""
+        return self._map[self.chunk_offsets[chunk_index]:self.chunk_offsets[chunk_index + 1]].decode("utf-8")
+
+    def _line_offsets(self, chunk_index):
+        """Returns the byte offsets of the lines of CSV chunk chunk_index followed by the end of the chunk. The
+        offsets of the last chunk used are cached."""
+        if self._line_cache[0] != chunk_index:
+            chunk_start, chunk_stop = int(self.chunk_offsets[chunk_index]), int(self.chunk_offsets[chunk_index + 1])
+            line_breaks = np.flatnonzero(np.frombuffer(self._map[chunk_start:chunk_stop], dtype=np.uint8) ==
+                                         ord("\n"))
+            number_lines = int(self.chunk_starts[chunk_index + 1] - self.chunk_starts[chunk_index])
+            line_offsets = np.append(chunk_start + np.append(0, line_breaks + 1)[:number_lines], chunk_stop)
+            self._line_cache = (chunk_index, line_offsets.tolist())
+        return self._line_cache[1]
+
+    def _line_text(self, index):
+        """Returns the text of the CSV line of run index"""
+        chunk_index = int(np.searchsorted(self.chunk_starts, index, side="right")) - 1
+        line_offsets = self._line_offsets(chunk_index)
+        line = index - int(self.chunk_starts[chunk_index])
+        return self._map[line_offsets[line]:line_offsets[line + 1]].decode("utf-8")
+
+    def header_line(self):
+        """Returns the bytes of the header line of a CSV run sheet, with its line break"""
+        header_end = self._map.find(b"\n")
+        return self._map[:header_end + 1 if header_end >= 0 else len(self._map)]
+
+    def line_range(self, start, stop):
+        """Returns the list of the bytes of the CSV lines of the runs start to stop, each with its line break, so
+        lines can be copied to another CSV file without parsing them"""
+        lines = []
+        first_chunk = max(0, int(np.searchsorted(self.chunk_starts, start, side="right")) - 1)
+        for chunk_index in range(first_chunk, len(self.chunk_starts) - 1):
+            chunk_start = int(self.chunk_starts[chunk_index])
+            if chunk_start >= stop:
+                break
+            line_offsets = self._line_offsets(chunk_index)
+            for line in range(max(start - chunk_start, 0), min(stop, int(self.chunk_starts[chunk_index + 1])) -
+                              chunk_start):
+                lines.append(self._map[line_offsets[line]:line_offsets[line + 1]])
+        return lines
+
+    def arrow_chunk(self, chunk_index):
+        """Returns chunk chunk_index of a parquet or arrow run sheet as the pyarrow Table that was written, without
+        decoding it. The last chunk used is cached."""
+        if self._arrow_cache[0] != chunk_index:
+            if self.file_format == "parquet":
+                table = self._reader.read_row_group(chunk_index)
+            else:
+                pyarrow = _import_pyarrow()
+                table = pyarrow.Table.from_batches([self._reader.get_batch(chunk_index)])
+            self._arrow_cache = (chunk_index, table)
+        return self._arrow_cache[1]
+
+    def arrow_range(self, start, stop):
+        """Returns the runs start to stop of a parquet or arrow run sheet as a pyarrow Table with the schema of the
+        file, sliced from the chunks that hold them"""
+        pyarrow = _import_pyarrow()
+        first_chunk = max(0, int(np.searchsorted(self.chunk_starts, start, side="right")) - 1)
+        pieces = []
+        for chunk_index in range(first_chunk, len(self.chunk_starts) - 1):
+            chunk_start = int(self.chunk_starts[chunk_index])
+            if chunk_start >= stop:
+                break
+            offset = max(start - chunk_start, 0)
+            pieces.append(self.arrow_chunk(chunk_index).slice(offset, stop - chunk_start - offset))
+        if not pieces:
+            return self._schema.empty_table()
+        return pyarrow.concat_tables(pieces)
+
+    def read_chunk(self, chunk_index):
+        """Returns chunk chunk_index of the file as a columnar Design"""
+        if self.file_format == "csv":
+            rows = csv.reader(io.StringIO(self._chunk_text(chunk_index)))
+            value_columns = list(zip(*rows)) or [()] * len(self.factors)
+            codes = {}
+            levels = {}
+            for factor, values in zip(self.factors, value_columns):
+                # an empty field is a factor that is not set in the run
+                level_codes = {"": MISSING_CODE}
+                codes[factor] = np.array([level_codes.setdefault(value, len(level_codes) - 1) for value in values],
+                                         dtype=np.int64)
+                levels[factor] = list(level_codes.keys())[1:]
+            return Design(codes, levels, number_runs=len(value_columns[0]) if value_columns else 0)
+        if self.file_format == "parquet":
+            table = self._reader.read_row_group(chunk_index)
+            columns = [table.column(factor).combine_chunks() for factor in self.factors]
+        else:
+            batch = self._reader.get_batch(chunk_index)
+            columns = [batch.column(factor) for factor in self.factors]
+        codes = {}
+        levels = {}
+        for factor, column in zip(self.factors, columns):
+            if not hasattr(column, "indices"):
+                # parquet columns hold the values, they are dictionary encoded again
+                column = column.dictionary_encode()
+            codes[factor] = column.indices.fill_null(MISSING_CODE).to_numpy(zero_copy_only=False)
+            levels[factor] = self._decode_levels(factor, column.dictionary.to_pylist())
+        return Design(codes, levels, number_runs=len(columns[0]) if columns else 0)
+
+    def _decode_levels(self, factor, levels):
+        """Returns the level values of a dictionary read from factor, JSON encoded levels are decoded"""
+        if self._json_factors is None:
+            self._json_factors = {field.name for field in self._schema
+                                  if field.metadata and field.metadata.get(b"encoding") == b"json"}
+        if factor in self._json_factors:
+            return [json.loads(value) for value in levels]
+        return levels
+
+    def level_tables(self):
+        """Returns {factor_name: list of levels} of a parquet or arrow run sheet. An arrow run sheet gives the
+        dictionaries of its last record batch, which hold every level in the order they were written, a parquet
+        run sheet is streamed one record batch at a time and gives the distinct values in the order they appear.
+        A CSV run sheet returns None."""
+        if self.file_format == "csv" or self.number_runs == 0:
+            return None
+        if self.file_format == "arrow":
+            batch = self._reader.get_batch(self._reader.num_record_batches - 1)
+            return {factor: self._decode_levels(factor, batch.column(factor).dictionary.to_pylist())
+                    for factor in self.factors}
+        level_codes = {factor: {} for factor in self.factors}
+        for batch in self._reader.iter_batches(columns=self.factors):
+            for factor in self.factors:
+                for value in batch.column(factor).unique().drop_null().to_pylist():
+                    level_codes[factor].setdefault(level_key(value), value)
+        return {factor: self._decode_levels(factor, list(level_codes[factor].values())) for factor in self.factors}
+
+    def chunk(self, chunk_index):
+        """Returns chunk chunk_index as a columnar Design, the last chunk read is cached"""
+        if self._chunk_cache[0] != chunk_index:
+            self._chunk_cache = (chunk_index, self.read_chunk(chunk_index))
+        return self._chunk_cache[1]
+
+    def run(self, index):
+        if self.file_format == "csv":
+            row = next(csv.reader(io.StringIO(self._line_text(index))))
+            return {factor: value for factor, value in zip(self.factors, row) if value != ""}
+        chunk_index = int(np.searchsorted(self.chunk_starts, index, side="right")) - 1
+        return self.chunk(chunk_index).run(index - int(self.chunk_starts[chunk_index]))
+
+    def __iter__(self):
+        for chunk_index in range(len(self.chunk_starts) - 1):
+            yield from self.read_chunk(chunk_index)
+
+    def design_range(self, start, stop):
+        """Returns the runs start to stop as a columnar Design, read from the chunks that hold them"""
+        first_chunk = max(0, int(np.searchsorted(self.chunk_starts, start, side="right")) - 1)
+        pieces = []
+        for chunk_index in range(first_chunk, len(self.chunk_starts) - 1):
+            chunk_start = int(self.chunk_starts[chunk_index])
+            if chunk_start >= stop:
+                break
+            pieces.append(self.chunk(chunk_index)[max(start - chunk_start, 0):stop - chunk_start])
+        if not pieces:
+            return Design({factor: [] for factor in self.factors}, {factor: [] for factor in self.factors})
+        return Design.concatenate(pieces)
+
+    def to_design(self):
+        """Returns the whole run sheet as a columnar Design"""
+        return self.design_range(0, self.number_runs)
+
+    def close(self):
+        """Releases the memory map of the file"""
+        self._chunk_cache = (None, None)
+        self._line_cache = (None, None)
+        self._arrow_cache = (None, None)
+        self._reader = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __repr__(self):
+        return "RunSheetView(path={0!r}, file_format={1!r}, number_runs={2})".format(self.path, self.file_format,
+                                                                                     self.number_runs)
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_write_run_sheet(n_factors=16):
+    """Tests write_run_sheet and read_run_sheet with a lazy fully_factorial_default design"""
+    import tempfile
+    import time
+    from experimental_design.experimental_designs import fully_factorial_default
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors + 1)}
+    default = {f"F{i}": {0: "Default"} for i in range(1, n_factors + 1)}
+    lazy_design = fully_factorial_default(design, default, randomized=True, randomization="permutation",
+                                          output="lazy")
+    print("*"*80)
+    print(f"Testing write_run_sheet and read_run_sheet with {lazy_design.number_runs} runs")
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in [".csv", ".parquet", ".arrow"]:
+            path = os.path.join(directory, "run_sheet" + extension)
+            try:
+                start = time.time()
+                write_run_sheet(lazy_design, path)
+                written = time.time() - start
+                start = time.time()
+                run_sheet = read_run_sheet(path)
+                run = run_sheet[run_sheet.number_runs // 2]
+                print(f"{extension}: wrote {os.path.getsize(path)} bytes in {written:.2f} s, opened and read the "
+                      f"middle run in {time.time() - start:.3f} s")
+                print(f"The middle run of the first 3 factors is {dict(list(run.items())[:3])}")
+                if extension != ".csv":
+                    round_trip = run_sheet.to_list() == lazy_design.to_list()
+                    print(f"The run sheet read back is the design: {round_trip}")
+                    assert round_trip
+                run_sheet.close()
+                run_sheet = None
+            except ImportError as error:
+                print(f"{extension}: {error}")
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_write_run_sheet()
@@ -0,0 +1,316 @@
+#-----------------------------------------------------------------------------
+# Name:        sharded_generation
+# Purpose:    To generate and write parts of a large design in parallel processes or on several machines.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""sharded_generation splits the run order of a design into num_shards disjoint shards, either contiguous ranges
+of runs (aligned to chunk_size so the chunks of a shard are the chunks of the whole design) or interleaved runs
+(shard i has runs i, i + num_shards, ...). A shard only depends on the generator arguments, shard and num_shards,
+so processes or machines can each make their own shard without talking to each other. generate_shards runs the
+shards in a process pool and writes each one as a part file, and merge_run_sheet_parts joins the parts into the
+file a single process would have written. Randomize with randomization="permutation" for large designs, a
+random.shuffle order has to be built in full by every shard.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import concurrent.futures
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import DesignView, SlicedDesignView, CHUNK_SIZE, _design_output
+from experimental_design.columnar_designs import Design
+from experimental_design.run_sheet_io import (RunSheetView, RunSheetWriter, write_run_sheet, run_sheet_format,
+                                              merge_level_tables, _import_pyarrow)
+
+#-----------------------------------------------------------------------------
+# Module Constants
+SHARD_LAYOUTS = ["contiguous", "interleaved"]
+"contiguous shards are ranges of runs, interleaved shards take every num_shards-th run"
+PART_TEMPLATE = "{stem}-part-{shard:05d}-of-{num_shards:05d}{extension}"
+"File name of a part written by generate_shards, from the stem and extension of the path"
+COPY_BYTES = 2**22
+"Number of bytes copied at a time when contiguous CSV parts are joined"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def shard_indices(number_runs, shard, num_shards, layout="contiguous", chunk_size=CHUNK_SIZE):
+    """Returns the range of run indices of shard (0 to num_shards - 1). Contiguous shards get whole chunks of
+    chunk_size runs, split as evenly as possible, so only the last run of the design can end a chunk early."""
+    if layout not in SHARD_LAYOUTS:
+        raise ValueError("layout must be one of {0}, not {1!r}".format(SHARD_LAYOUTS, layout))
+    if not 0 <= shard < num_shards:
+        raise ValueError("shard must be from 0 to {0}, not {1}".format(num_shards - 1, shard))
+    if layout == "interleaved":
+        return range(shard, number_runs, num_shards)
+    number_chunks = -(-number_runs // chunk_size)
+    start = min(number_runs, (shard * number_chunks // num_shards) * chunk_size)
+    stop = min(number_runs, ((shard + 1) * number_chunks // num_shards) * chunk_size)
+    return range(start, stop)
+
+
+def design_shard(design, shard, num_shards, layout="contiguous", chunk_size=CHUNK_SIZE):
+    """Returns shard of design, a lazy view of a lazy view, a Design of a Design or a list of a list"""
+    index_range = shard_indices(len(design) if not isinstance(design, DesignView) else design.number_runs,
+                                shard, num_shards, layout=layout, chunk_size=chunk_size)
+    if isinstance(design, DesignView):
+        return SlicedDesignView(design, index_range)
+    return design[index_range.start:index_range.stop:index_range.step]
+
+
+def generate_shard(generator, *arguments, shard=0, num_shards=1, layout="contiguous", output="list",
+                   chunk_size=CHUNK_SIZE, **keywords):
+    """Returns shard of generator(*arguments, **keywords) as output ("list", "lazy" or "design"). The generator
+    is called with output="lazy" and only the runs of the shard are made, for example
+    generate_shard(fully_factorial, design_dictionary, shard=3, num_shards=8, randomization="permutation")."""
+    keywords.pop("output", None)
+    design_view = generator(*arguments, output="lazy", **keywords)
+    return _design_output(design_shard(design_view, shard, num_shards, layout=layout, chunk_size=chunk_size), output)
+
+
+def part_path(path, shard, num_shards):
+    """Returns the path of the part file of shard, next to path"""
+    stem, extension = os.path.splitext(str(path))
+    return PART_TEMPLATE.format(stem=stem, shard=shard, num_shards=num_shards, extension=extension)
+
+
+def write_shard(generator, arguments, keywords, shard, num_shards, path, layout="contiguous", file_format=None,
+                chunk_size=CHUNK_SIZE):
+    """Writes shard of generator(*arguments, **keywords) to path, chunk_size runs at a time, and returns the
+    number of runs written. This is the work of one process or machine. Only the CSV part of a contiguous layout
+    that starts at run 0 has a header line (the parts before it are empty when there are fewer chunks than
+    shards), so the parts joined end to end are the CSV file of the whole design. Every part is written with the
+    level tables of the whole design."""
+    keywords = dict(keywords)
+    keywords.pop("output", None)
+    design_view = generator(*arguments, output="lazy", **keywords)
+    index_range = shard_indices(design_view.number_runs, shard, num_shards, layout=layout, chunk_size=chunk_size)
+    shard_view = design_shard(design_view, shard, num_shards, layout=layout, chunk_size=chunk_size)
+    header = layout == "interleaved" or (index_range.start == 0 and len(index_range) > 0)
+    return write_run_sheet(shard_view, path, file_format=file_format, chunk_size=chunk_size, header=header)
+
+
+def _generate_shard_task(generator, arguments, keywords, shard, num_shards, layout, output, chunk_size):
+    """Process pool task of generate_shards that returns a shard"""
+    return generate_shard(generator, *arguments, shard=shard, num_shards=num_shards, layout=layout, output=output,
+                          chunk_size=chunk_size, **keywords)
+
+
+def generate_shards(generator, *arguments, num_shards=None, path=None, processes=None, layout="contiguous",
+                    output="design", file_format=None, chunk_size=CHUNK_SIZE, **keywords):
+    """Makes the num_shards shards (os.cpu_count() by default) of generator(*arguments, **keywords) in a pool of
+    processes. If path is given every shard is written to its own part file (see part_path) and the list of part
+    paths is returned, merge_run_sheet_parts joins them. Otherwise the list of shards as output ("list" or
+    "design") is returned, merge_shards joins them. generator has to be a module level function so it can be sent
+    to the processes."""
+    num_shards = num_shards or os.cpu_count() or 1
+    keywords.pop("output", None)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        if path is not None:
+            part_paths = [part_path(path, shard, num_shards) for shard in range(num_shards)]
+            futures = [executor.submit(write_shard, generator, arguments, keywords, shard, num_shards,
+                                       part_paths[shard], layout, file_format, chunk_size)
+                       for shard in range(num_shards)]
+            for future in futures:
+                future.result()
+            return part_paths
+        futures = [executor.submit(_generate_shard_task, generator, arguments, keywords, shard, num_shards, layout,
+                                   output, chunk_size)
+                   for shard in range(num_shards)]
+        return [future.result() for future in futures]
+
+
+def _interleaved_ranges(shard_sizes, start, stop):
+    """Returns (part_ranges, positions) for the runs start to stop of the interleaved design made of shards of
+    shard_sizes. part_ranges holds the range of runs of every shard that they come from and positions the
+    position of each run in those ranges put end to end."""
+    num_shards = len(shard_sizes)
+    part_ranges = []
+    for shard, shard_size in enumerate(shard_sizes):
+        first = min(max(0, -(-(start - shard) // num_shards)), shard_size)
+        part_ranges.append(range(first, min(max(first, -(-(stop - shard) // num_shards)), shard_size)))
+    range_starts = np.concatenate([[0], np.cumsum([len(part_range) for part_range in part_ranges])[:-1]])
+    first_runs = np.array([part_range.start for part_range in part_ranges], dtype=np.int64)
+    run_indices = np.arange(start, stop, dtype=np.int64)
+    shards = run_indices % num_shards
+    return part_ranges, range_starts[shards] + run_indices // num_shards - first_runs[shards]
+
+
+def _same_arrow_data(parts):
+    """Returns True when parquet or arrow parts can be joined as arrow data without decoding their runs, they
+    have one schema and every record batch of the arrow parts has the same dictionaries, as when the level tables
+    of the design were known when the parts were written"""
+    parts = [part for part in parts if part.number_runs]
+    if not parts or parts[0].file_format == "csv":
+        return False
+    schema = parts[0].arrow_chunk(0).schema
+    dictionaries = None
+    for part in parts:
+        # the dictionaries of a part only grow, its first and last batches have all of them
+        for chunk_index in sorted({0, len(part.chunk_starts) - 2}):
+            table = part.arrow_chunk(chunk_index)
+            if not table.schema.equals(schema, check_metadata=True):
+                return False
+            if part.file_format == "arrow":
+                chunk_dictionaries = [column.chunk(0).dictionary for column in table.columns]
+                if dictionaries is None:
+                    dictionaries = chunk_dictionaries
+                elif not all(dictionary.equals(other) for dictionary, other in zip(dictionaries,
+                                                                                   chunk_dictionaries)):
+                    return False
+    return True
+
+
+def _interleave_order(shard_sizes):
+    """Returns the positions, in the shards put end to end, of the runs in interleaved order"""
+    shard_sizes = np.asarray(shard_sizes, dtype=np.int64)
+    shard_starts = np.concatenate([[0], np.cumsum(shard_sizes)[:-1]])
+    number_runs = int(shard_sizes.sum())
+    run_indices = np.arange(number_runs, dtype=np.int64)
+    num_shards = len(shard_sizes)
+    return shard_starts[run_indices % num_shards] + run_indices // num_shards
+
+
+def merge_shards(shards, layout="contiguous"):
+    """Joins the shards (lists or Designs, in shard order) into the whole design"""
+    shards = list(shards)
+    if shards and isinstance(shards[0], Design):
+        design = Design.concatenate(shards)
+        return design if layout == "contiguous" else design.take(_interleave_order([len(shard) for shard in shards]))
+    runs = [run for shard in shards for run in shard]
+    if layout == "contiguous":
+        return runs
+    return [runs[position] for position in _interleave_order([len(shard) for shard in shards]).tolist()]
+
+
+def merge_run_sheet_parts(part_paths, path, layout="contiguous", file_format=None, chunk_size=CHUNK_SIZE,
+                          remove_parts=False):
+    """Joins the part files written by generate_shards (in shard order) into the run sheet at path, giving the
+    same file as writing the whole design in one process with the same chunk_size. Contiguous CSV parts are copied
+    end to end and their lines counted on the way, interleaved CSV parts have their lines copied in run order.
+    Parquet and arrow parts are copied as arrow data chunk_size runs at a time, taken in run order for interleaved
+    parts, without decoding the runs. Parts that do not share a schema and dictionaries (their levels were not
+    known when they were written) are decoded and written again with the level tables of the parts. Returns the
+    number of runs."""
+    file_format = run_sheet_format(path, file_format)
+    number_runs = 0
+    if file_format == "csv" and layout == "contiguous":
+        line_breaks = 0
+        last_byte = b"\n"
+        with open(path, "wb") as run_sheet_file:
+            for part in part_paths:
+                with open(part, "rb") as part_file:
+                    for block in iter(lambda: part_file.read(COPY_BYTES), b""):
+                        run_sheet_file.write(block)
+                        line_breaks += block.count(b"\n")
+                        last_byte = block[-1:]
+        # the first line is the header, a last line without a line break is a run
+        number_runs = max(line_breaks + (last_byte != b"\n") - 1, 0)
+        if remove_parts:
+            for part in part_paths:
+                os.remove(part)
+        return number_runs
+    parts = [RunSheetView(part, file_format=file_format) for part in part_paths]
+    part_sizes = [part.number_runs for part in parts]
+    if file_format == "csv":
+        with open(path, "wb") as run_sheet_file:
+            run_sheet_file.write(parts[0].header_line() if parts and part_sizes[0] else b"")
+            for start in range(0, sum(part_sizes), chunk_size):
+                stop = min(start + chunk_size, sum(part_sizes))
+                part_ranges, positions = _interleaved_ranges(part_sizes, start, stop)
+                lines = [line for part, part_range in zip(parts, part_ranges)
+                         for line in part.line_range(part_range.start, part_range.stop)]
+                run_sheet_file.writelines([lines[position] for position in positions.tolist()])
+                number_runs = stop
+    elif _same_arrow_data(parts):
+        pyarrow = _import_pyarrow()
+        with RunSheetWriter(path, file_format=file_format) as writer:
+            if layout == "contiguous":
+                for part in parts:
+                    for start in range(0, part.number_runs, chunk_size):
+                        writer.write_table(part.arrow_range(start, min(start + chunk_size, part.number_runs)))
+            else:
+                for start in range(0, sum(part_sizes), chunk_size):
+                    part_ranges, positions = _interleaved_ranges(part_sizes, start, min(start + chunk_size,
+                                                                                        sum(part_sizes)))
+                    table = pyarrow.concat_tables([part.arrow_range(part_range.start, part_range.stop)
+                                                   for part, part_range in zip(parts, part_ranges)])
+                    writer.write_table(table.take(positions))
+        number_runs = writer.number_runs
+    else:
+        part_level_tables = [part.level_tables() for part in parts]
+        level_tables = merge_level_tables([tables for tables in part_level_tables if tables is not None])
+        with RunSheetWriter(path, file_format=file_format, level_tables=level_tables) as writer:
+            if layout == "contiguous":
+                for part in parts:
+                    for chunk in part.design_chunks(chunk_size):
+                        writer.write_design(chunk)
+            else:
+                for start in range(0, sum(part_sizes), chunk_size):
+                    part_ranges, positions = _interleaved_ranges(part_sizes, start, min(start + chunk_size,
+                                                                                        sum(part_sizes)))
+                    chunk = Design.concatenate([part.design_range(part_range.start, part_range.stop)
+                                                for part, part_range in zip(parts, part_ranges)])
+                    writer.write_design(chunk.take(positions))
+        number_runs = writer.number_runs
+    for part in parts:
+        part.close()
+    if remove_parts:
+        for part in part_paths:
+            os.remove(part)
+    return number_runs
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_generate_shards(n_factors=18, num_shards=4, file_chunk_size=2**11):
+    """Tests that the merged shards of a fully factorial and a split plot design are the single process design"""
+    import tempfile
+    import time
+    import filecmp
+    from experimental_design.experimental_designs import (fully_factorial, fully_factorial_split_plot,
+                                                          fully_factorial_split_plot_default)
+    design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors + 1)}
+    print("*"*80)
+    print(f"Testing generate_shards with {2**n_factors} runs and {num_shards} shards")
+    single = fully_factorial(design, randomization="permutation", output="design")
+    for layout in SHARD_LAYOUTS:
+        shards = generate_shards(fully_factorial, design, num_shards=num_shards, layout=layout,
+                                 randomization="permutation")
+        merged = merge_shards(shards, layout=layout)
+        print(f"{layout}: the merged shards are the single process design "
+              f"{all(np.array_equal(merged.codes[f], single.codes[f]) for f in single.factors)}")
+    whole_plot = {"temperature": {0: 20, 1: 40, 2: 60}}
+    default = {"temperature": {-1: "Default"}}
+    small_design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, 6)}
+    file_design = {f"F{i}": {"-": -1, "+": 1} for i in range(1, n_factors - 3)}
+    # the default design mixes numbers and strings, the small design has fewer chunks than shards
+    cases = [("split plot", fully_factorial_split_plot, (whole_plot, file_design)),
+             ("split plot default", fully_factorial_split_plot_default, (whole_plot, file_design, default)),
+             ("one chunk", fully_factorial_split_plot_default, (whole_plot, small_design, default))]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, generator, arguments in cases:
+            for extension in [".csv", ".parquet", ".arrow"]:
+                for layout in SHARD_LAYOUTS:
+                    path = os.path.join(directory, "run_sheet" + extension)
+                    single_path = os.path.join(directory, "single" + extension)
+                    start = time.time()
+                    write_run_sheet(generator(*arguments, output="lazy"), single_path, chunk_size=file_chunk_size)
+                    single_time = time.time() - start
+                    start = time.time()
+                    parts = generate_shards(generator, *arguments, num_shards=num_shards, path=path, layout=layout,
+                                            chunk_size=file_chunk_size)
+                    merge_run_sheet_parts(parts, path, layout=layout, chunk_size=file_chunk_size, remove_parts=True)
+                    identical = filecmp.cmp(path, single_path, shallow=False)
+                    print(f"{name} {layout} {extension}: one process {single_time:.2f} s, {num_shards} shards "
+                          f"{time.time() - start:.2f} s, the files are byte identical {identical}")
+                    assert identical
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_generate_shards()
@@ -0,0 +1,399 @@
+#-----------------------------------------------------------------------------
+# Name:        space_filling_designs
+# Purpose:    To make Latin hypercube, maximin and minimax space filling designs.
+# Authors:     aric.sanders@nist.gov
+# Created:     10/17/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""space_filling_designs makes Latin hypercube designs and optimizes them into maximin or minimax space filling
+designs. A factor is a (low, high) range, which gets one value in each of number_runs equal strata, or a
+{level: value} dictionary like fully_factorial uses, whose levels are used equally often. The search swaps two
+entries of one column, which keeps every column a Latin hypercube, and only updates the two rows of the squared
+distance matrix that change instead of recomputing it, so a batch of candidate swaps costs O(number_runs) each.
+maximin lowers the Morris-Mitchell phi_p criterion of the pairwise distances, minimax lowers the distance from
+reference points to their nearest run. Swaps are accepted with a threshold that falls to zero, and the best
+design seen is kept. The run sheet supports randomization and default runs like fully_factorial_default.
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import math
+import numbers
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import numpy as np
+from experimental_design.experimental_designs import (FullyFactorialView, DesignView, SeededPermutation,
+                                                      InsertedDesignView, RANDOM_SEED, _design_output)
+
+#-----------------------------------------------------------------------------
+# Module Constants
+SPACE_FILLING_CRITERIA = ["lhs", "maximin", "minimax"]
+"lhs is a random Latin hypercube, maximin spreads the runs apart and minimax leaves no region far from a run"
+SEARCH_ITERATIONS = 5000
+"Default number of swap batches of the maximin and minimax searches"
+SWAP_CANDIDATES = 32
+"Number of candidate swaps evaluated together in one batch of the maximin search"
+MAXIMIN_POWER = 50
+"Power p of the phi_p criterion, (sum of d^-p over the pairs of runs)^(1/p), which tends to 1 / minimum distance"
+MINIMAX_POWER = 20
+"Power of the nearest run distances of the reference points that the minimax search lowers"
+REFERENCE_POINTS = 2000
+"Default largest number of random reference points of the minimax search"
+INITIAL_THRESHOLD = 0.02
+"Relative worsening of the criterion a swap may cause at the start of the search, it falls linearly to zero"
+EXACT_UPDATE_INTERVAL = 500
+"Number of accepted swaps between exact recomputations of the criterion, which stops rounding drift"
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def is_factor_range(factor_specification):
+    """Returns True if factor_specification is a (low, high) range of numbers rather than a {level: value}
+    dictionary"""
+    return isinstance(factor_specification, (tuple, list)) and len(factor_specification) == 2 and \
+        all(isinstance(bound, numbers.Real) and not isinstance(bound, bool) for bound in factor_specification)
+
+
+def unit_levels(level_values):
+    """Returns the levels scaled to [0, 1], by value for numbers and by position otherwise"""
+    if len(level_values) < 2:
+        return np.zeros(len(level_values))
+    if all(isinstance(value, numbers.Real) and not isinstance(value, bool) for value in level_values):
+        values = np.array(level_values, dtype=float)
+        if values.max() > values.min():
+            return (values - values.min()) / (values.max() - values.min())
+    return np.arange(len(level_values)) / (len(level_values) - 1)
+
+
+def latin_hypercube_codes(number_runs, number_strata, random_generator):
+    """Returns a column of stratum codes, a random permutation of number_runs codes that uses each of the
+    number_strata strata as equally often as possible"""
+    return (random_generator.permutation(number_runs) * number_strata) // number_runs
+
+
+def space_filling_design(design_dictionary, number_runs, criterion="maximin", number_iterations=SEARCH_ITERATIONS,
+                         centered=False, decimals=None, default_state=None, default_modulo=2, randomized=True,
+                         run_values="values", random_seed=RANDOM_SEED, output="list", randomization="shuffle",
+                         profiler=None):
+    """Given a design_dictionary in the form {'factor_name_1': (low, high), 'factor_name_2': {factor_level:
+    factor_level_value}, ...} returns a number_runs run sheet that is a Latin hypercube (criterion="lhs") or is
+    optimized into a maximin or minimax design with number_iterations batches of column swaps. A range factor gets
+    a random value in each stratum, or the stratum centers if centered, rounded to decimals if given. random_seed
+    seeds the design and its randomization. default_state in the form {'factor_name_1': {'default_level':
+    default_value}, ...} adds a default run before every default_modulo runs as in fully_factorial_default.
+    Optional parameters randomized, run_values, output, randomization and profiler are the same as
+    fully_factorial. The lazy output has the criteria, space_filling_design(..., output="lazy").minimum_distance()"""
+    if criterion not in SPACE_FILLING_CRITERIA:
+        raise ValueError("criterion must be one of {0}, not {1!r}".format(SPACE_FILLING_CRITERIA, criterion))
+    search = SpaceFillingSearch(design_dictionary, number_runs, centered=centered, decimals=decimals,
+                                run_values=run_values)
+    random_generator = np.random.default_rng(random_seed)
+    code_matrix = search.initial_codes(random_generator)
+    if criterion == "maximin":
+        code_matrix = search.maximin(code_matrix, number_iterations, random_generator)
+    elif criterion == "minimax":
+        code_matrix = search.minimax(code_matrix, number_iterations, random_generator)
+    test_conditions = SpaceFillingView(search.level_dictionary(), code_matrix, search.unit_tables,
+                                       criterion=criterion,
+                                       randomized=randomized,
+                                       random_seed=random_seed,
+                                       randomization=randomization)
+    if default_state is not None:
+        default_condition = {}
+        for factor in test_conditions.factors:
+            default_condition[factor] = list(default_state[factor].__getattribute__(run_values)())[0]
+        default_conditions = [default_condition]
+        test_conditions = InsertedDesignView(test_conditions,
+                                             insert_factory=lambda test_index: default_conditions,
+                                             modulo=default_modulo,
+                                             insert_length=1)
+    return _design_output(test_conditions, output, profiler)
+
+
+def latin_hypercube(design_dictionary, number_runs, centered=False, decimals=None, default_state=None,
+                    default_modulo=2, randomized=True, run_values="values", random_seed=RANDOM_SEED, output="list",
+                    randomization="shuffle", profiler=None):
+    """Returns a random Latin hypercube run sheet, space_filling_design with criterion="lhs" """
+    return space_filling_design(design_dictionary, number_runs, criterion="lhs", centered=centered,
+                                decimals=decimals, default_state=default_state, default_modulo=default_modulo,
+                                randomized=randomized, run_values=run_values, random_seed=random_seed,
+                                output=output, randomization=randomization, profiler=profiler)
+
+
+def _threshold(iteration, number_iterations, scale):
+    """Returns the worsening of the criterion a swap may cause at iteration"""
+    return INITIAL_THRESHOLD * scale * max(0.0, 1.0 - iteration / max(number_iterations * 0.8, 1))
+
+
+def _squared_distances(points, other_points=None):
+    """Returns the matrix of squared distances between the rows of points and the rows of other_points"""
+    other_points = points if other_points is None else other_points
+    squared_distances = np.einsum("ij,ij->i", points, points)[:, np.newaxis] + \
+        np.einsum("ij,ij->i", other_points, other_points)[np.newaxis, :] - 2.0 * points @ other_points.T
+    return np.maximum(squared_distances, 0.0)
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class SpaceFillingSearch(object):
+    """The factors of a space filling design and its column swap searches. Runs are level codes, each factor has
+    a table of its level values (values) and of the levels scaled to [0, 1] (unit_tables), a range factor has
+    number_runs levels, one per stratum. Distances are measured between the scaled runs."""
+    def __init__(self, design_dictionary, number_runs, centered=False, decimals=None, run_values="values"):
+        if number_runs < 2:
+            raise ValueError("A space filling design needs at least 2 runs, not {0}".format(number_runs))
+        self.factors = list(design_dictionary.keys())
+        self.number_runs = number_runs
+        self.centered = centered
+        self.decimals = decimals
+        self.is_range = [is_factor_range(design_dictionary[factor]) for factor in self.factors]
+        self.level_names = []
+        self.values = []
+        self.unit_tables = []
+        for factor, is_range in zip(self.factors, self.is_range):
+            if is_range:
+                self.level_names.append(None)
+                self.values.append(None)
+                self.unit_tables.append(None)
+            else:
+                self.level_names.append(list(design_dictionary[factor].__getattribute__(run_values)()))
+                self.values.append(list(design_dictionary[factor].values()))
+                self.unit_tables.append(unit_levels(self.values[-1]))
+        self.ranges = [tuple(float(bound) for bound in design_dictionary[factor]) if is_range else None
+                       for factor, is_range in zip(self.factors, self.is_range)]
+
+    def initial_codes(self, random_generator):
+        """Returns the (number_runs, number_factors) level codes of a random Latin hypercube. The values of the
+        range factors are drawn here, one in each stratum, so the codes of a range factor are its strata."""
+        for factor_index, is_range in enumerate(self.is_range):
+            if is_range:
+                offsets = np.full(self.number_runs, 0.5) if self.centered else random_generator.random(self.number_runs)
+                unit_values = (np.arange(self.number_runs) + offsets) / self.number_runs
+                low, high = self.ranges[factor_index]
+                values = low + unit_values * (high - low)
+                if self.decimals is not None:
+                    values = np.round(values, self.decimals)
+                self.values[factor_index] = values.tolist()
+                self.level_names[factor_index] = values.tolist()
+                self.unit_tables[factor_index] = unit_values
+        radices = [len(unit_table) for unit_table in self.unit_tables]
+        return np.column_stack([latin_hypercube_codes(self.number_runs, radix, random_generator)
+                                for radix in radices]).astype(np.int64)
+
+    def level_dictionary(self):
+        """Returns {factor_name: {level_code: run value}} of the levels the codes index, the run value is the
+        level name with run_values="keys" and the level value otherwise"""
+        return {factor: dict(enumerate(level_names)) for factor, level_names in zip(self.factors, self.level_names)}
+
+    def unit_points(self, code_matrix):
+        """Returns the runs of code_matrix scaled to the unit cube"""
+        return np.column_stack([unit_table[code_matrix[:, factor_index]]
+                                for factor_index, unit_table in enumerate(self.unit_tables)])
+
+    def maximin(self, code_matrix, number_iterations, random_generator, power=MAXIMIN_POWER,
+                swap_candidates=SWAP_CANDIDATES):
+        """Returns code_matrix improved by column swaps that lower phi_p = (sum over pairs of (d / d0)^-p)^(1/p),
+        d0 the starting minimum distance. Each batch draws swap_candidates row pairs in one column, the change of
+        the sum for all of them comes from the two distance matrix rows of each pair in one vectorized step."""
+        code_matrix = code_matrix.copy()
+        points = self.unit_points(code_matrix)
+        squared_distances = _squared_distances(points)
+        np.fill_diagonal(squared_distances, np.inf)
+        scale = squared_distances.min()
+        if scale == 0:
+            scale = 1.0 / self.number_runs ** 2
+        exponent = -power / 2.0
+
+        def terms(values):
+            # exp(log) is faster than a float power, an infinite distance (the diagonal) gives 0
+            with np.errstate(divide="ignore", over="ignore"):
+                return np.exp(exponent * np.log(values / scale))
+
+        # the matrix of pair terms is kept up to date, so only the swapped rows are raised to the power
+        pair_terms = terms(squared_distances)
+        total = pair_terms.sum() / 2.0
+        best_total, best_codes = total, code_matrix.copy()
+        number_factors = len(self.factors)
+        candidate_rows = np.arange(swap_candidates)
+        accepted = 0
+        for iteration in range(number_iterations):
+            column = iteration % number_factors
+            first = random_generator.integers(self.number_runs, size=swap_candidates)
+            second = (first + random_generator.integers(1, self.number_runs, size=swap_candidates)) % \
+                self.number_runs
+            column_values = points[:, column]
+            # the squared distance from the first run of a pair to every run changes by change[j] after the swap
+            change = (column_values[second][:, np.newaxis] - column_values[np.newaxis, :]) ** 2 - \
+                (column_values[first][:, np.newaxis] - column_values[np.newaxis, :]) ** 2
+            change[candidate_rows, first] = 0.0
+            change[candidate_rows, second] = 0.0
+            with np.errstate(invalid="ignore"):
+                differences = (terms(squared_distances[first] + change) - pair_terms[first] +
+                               terms(squared_distances[second] - change) - pair_terms[second])
+            differences[~np.isfinite(differences)] = np.inf
+            differences = differences.sum(axis=1)
+            best_candidate = int(np.argmin(differences))
+            if differences[best_candidate] > _threshold(iteration, number_iterations, total):
+                continue
+            first_run, second_run = int(first[best_candidate]), int(second[best_candidate])
+            if code_matrix[first_run, column] == code_matrix[second_run, column]:
+                continue
+            change = change[best_candidate]
+            squared_distances[first_run] += change
+            squared_distances[second_run] -= change
+            squared_distances[:, first_run] = squared_distances[first_run]
+            squared_distances[:, second_run] = squared_distances[second_run]
+            pair_terms[first_run] = terms(squared_distances[first_run])
+            pair_terms[second_run] = terms(squared_distances[second_run])
+            pair_terms[:, first_run] = pair_terms[first_run]
+            pair_terms[:, second_run] = pair_terms[second_run]
+            code_matrix[[first_run, second_run], column] = code_matrix[[second_run, first_run], column]
+            points[[first_run, second_run], column] = points[[second_run, first_run], column]
+            total += differences[best_candidate]
+            accepted += 1
+            if accepted % EXACT_UPDATE_INTERVAL == 0:
+                squared_distances = _squared_distances(points)
+                np.fill_diagonal(squared_distances, np.inf)
+                pair_terms = terms(squared_distances)
+                total = pair_terms.sum() / 2.0
+            if total < best_total:
+                best_total, best_codes = total, code_matrix.copy()
+        return best_codes
+
+    def reference_points(self, number_points, random_generator):
+        """Returns number_points random points of the design space scaled to the unit cube, a range factor is
+        uniform and a level factor takes its scaled levels"""
+        columns = []
+        for factor_index, is_range in enumerate(self.is_range):
+            if is_range:
+                columns.append(random_generator.random(number_points))
+            else:
+                unit_table = self.unit_tables[factor_index]
+                columns.append(unit_table[random_generator.integers(len(unit_table), size=number_points)])
+        return np.column_stack(columns)
+
+    def minimax(self, code_matrix, number_iterations, random_generator, number_reference_points=None,
+                power=MINIMAX_POWER):
+        """Returns code_matrix improved by column swaps that lower the sum of (distance from a reference point to
+        its nearest run) ** power, which is dominated by the largest of those distances. A swap changes two runs,
+        so only two columns of the reference distance matrix are updated, and the nearest run is searched again
+        only for the reference points whose nearest run moved away."""
+        code_matrix = code_matrix.copy()
+        if number_reference_points is None:
+            number_reference_points = min(REFERENCE_POINTS, 20 * self.number_runs)
+        references = self.reference_points(number_reference_points, random_generator)
+        points = self.unit_points(code_matrix)
+        reference_distances = _squared_distances(references, points)
+        nearest_runs = reference_distances.argmin(axis=1)
+        nearest = reference_distances[np.arange(len(references)), nearest_runs]
+        exponent = power / 2.0
+        total = (nearest ** exponent).sum()
+        best_total, best_codes = total, code_matrix.copy()
+        number_factors = len(self.factors)
+        for iteration in range(number_iterations):
+            column = iteration % number_factors
+            first_run = int(random_generator.integers(self.number_runs))
+            second_run = int((first_run + random_generator.integers(1, self.number_runs)) % self.number_runs)
+            if code_matrix[first_run, column] == code_matrix[second_run, column]:
+                continue
+            change = (references[:, column] - points[second_run, column]) ** 2 - \
+                (references[:, column] - points[first_run, column]) ** 2
+            first_distances = reference_distances[:, first_run] + change
+            second_distances = reference_distances[:, second_run] - change
+            new_nearest = np.minimum(nearest, np.minimum(first_distances, second_distances))
+            new_nearest_runs = np.where(first_distances <= second_distances, first_run, second_run)
+            new_nearest_runs = np.where(new_nearest < nearest, new_nearest_runs, nearest_runs)
+            moved = np.flatnonzero((nearest_runs == first_run) | (nearest_runs == second_run))
+            if len(moved):
+                moved_distances = reference_distances[moved]
+                moved_distances[:, first_run] = first_distances[moved]
+                moved_distances[:, second_run] = second_distances[moved]
+                new_nearest_runs[moved] = moved_distances.argmin(axis=1)
+                new_nearest[moved] = moved_distances[np.arange(len(moved)), new_nearest_runs[moved]]
+            new_total = (new_nearest ** exponent).sum()
+            if new_total - total > _threshold(iteration, number_iterations, total):
+                continue
+            reference_distances[:, first_run] = first_distances
+            reference_distances[:, second_run] = second_distances
+            nearest, nearest_runs, total = new_nearest, new_nearest_runs, new_total
+            code_matrix[[first_run, second_run], column] = code_matrix[[second_run, first_run], column]
+            points[[first_run, second_run], column] = points[[second_run, first_run], column]
+            if total < best_total:
+                best_total, best_codes = total, code_matrix.copy()
+        return best_codes
+
+    def __repr__(self):
+        return "SpaceFillingSearch(number_runs={0}, factors={1})".format(self.number_runs, self.factors)
+
+
+class SpaceFillingView(FullyFactorialView):
+    """A lazy run sheet of the runs with level codes code_matrix of a space filling design, unit_tables holds the
+    levels of each factor scaled to [0, 1] for the distance criteria. The unrandomized order sorts the runs like
+    fully_factorial and randomization works as in FullyFactorialView."""
+    def __init__(self, design_dictionary, code_matrix, unit_tables, criterion="maximin", randomized=True,
+                 run_values="values", random_seed=RANDOM_SEED, randomization="shuffle"):
+        FullyFactorialView.__init__(self, design_dictionary, randomized=randomized, run_values=run_values,
+                                    random_seed=random_seed, randomization=randomization)
+        code_matrix = np.asarray(code_matrix, dtype=np.int64).reshape(-1, len(self.factors))
+        self.code_matrix = code_matrix[np.lexsort(code_matrix.T[::-1])] if len(self.factors) else code_matrix
+        self.number_runs = len(self.code_matrix)
+        self.unit_tables = [np.asarray(unit_table) for unit_table in unit_tables]
+        self.criterion = criterion
+        if self.permutation is not None:
+            self.permutation = SeededPermutation(self.number_runs, random_seed=random_seed)
+
+    def decode(self, design_index):
+        """Returns the list of level positions for the run at design_index in the unrandomized order."""
+        return [int(code) for code in self.code_matrix[design_index]]
+
+    def __iter__(self):
+        if self.randomized:
+            return FullyFactorialView.__iter__(self)
+        return DesignView.__iter__(self)
+
+    def decode_array(self, design_indices):
+        """Returns {factor_name: code array} for an array of design indices"""
+        return {factor: self.code_matrix[design_indices, factor_index]
+                for factor_index, factor in enumerate(self.factors)}
+
+    def unit_points(self):
+        """Returns the runs scaled to the unit cube, in the unrandomized order"""
+        return np.column_stack([unit_table[self.code_matrix[:, factor_index]]
+                                for factor_index, unit_table in enumerate(self.unit_tables)])
+
+    def minimum_distance(self):
+        """Returns the smallest distance between two runs in the unit cube, the maximin criterion"""
+        squared_distances = _squared_distances(self.unit_points())
+        np.fill_diagonal(squared_distances, np.inf)
+        return float(np.sqrt(squared_distances.min()))
+
+    def fill_distance(self, number_reference_points=REFERENCE_POINTS, random_seed=RANDOM_SEED):
+        """Returns the largest distance from number_reference_points random points of the unit cube to their
+        nearest run, an estimate of the minimax criterion"""
+        references = np.random.default_rng(random_seed).random((number_reference_points, len(self.factors)))
+        return float(np.sqrt(_squared_distances(references, self.unit_points()).min(axis=1).max()))
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_space_filling_design(number_runs=1000, number_factors=50):
+    """Tests the space filling designs of a continuous and a mixed design space"""
+    import time
+    print("*"*80)
+    print(f"Testing space_filling_design with {number_runs} runs and {number_factors} range factors")
+    design = {f"X{i}": (0.0, 10.0) for i in range(1, number_factors + 1)}
+    for criterion in SPACE_FILLING_CRITERIA:
+        start = time.time()
+        view = space_filling_design(design, number_runs, criterion=criterion, output="lazy")
+        print(f"{criterion}: {time.time() - start:.2f} s, minimum distance {view.minimum_distance():.4f}, "
+              f"fill distance {view.fill_distance():.4f}")
+    mixed = {"temperature": (20, 80), "pressure": (1, 5), "gas": {"N2": "nitrogen", "Ar": "argon"}}
+    default_state = {"temperature": {"room": 20}, "pressure": {"ambient": 1}, "gas": {"N2": "nitrogen"}}
+    runs = space_filling_design(mixed, 8, decimals=1, default_state=default_state, default_modulo=4)
+    for run in runs:
+        print(run)
+    print("*" * 80)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_space_filling_design()